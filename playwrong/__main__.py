@@ -1,15 +1,28 @@
+import sys
 import asyncio
 import logging
 import json
+from contextlib import contextmanager
 import pydantic
 import typer
 from rich import print as pprint
 from rich.progress import Progress
-from typing import Any, Dict, List, Annotated, Optional
-from .models import HeapSnapshot
-from .snapshot import find_node_ids_with_properties
-from .build_object import build_object_from_node_id
-from playwright.async_api import async_playwright
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Annotated, Optional
+from .cache import get_cache_path, hash_file, load_heap_snapshot, write_snapshot_cache
+from .compression import COMPRESSION_SUFFIXES, get_compression_for_path, open_compressed_writer, require_compression
+from .benchmark import run_benchmark, run_synthetic_benchmark
+from .stats import collect_stats
+from .diff import diff_snapshots
+from .summary import SUMMARY_SORT_KEYS, summarize_snapshot
+from .retainers import find_largest_retained_nodes, find_shortest_retainer_path, get_dominators, get_retainers, describe_node
+from .snapshot import find_node_ids_with_properties, get_snapshot_index
+from .query import afind_objects_with_properties, find_objects_for_queries, iter_objects_for_queries, iter_objects_with_properties, load_batch_queries
+from .output import write_ndjson
+from .predicates import Predicate, check_predicates, parse_predicates
+from .models import BuildBudget
+from .sharded import DEFAULT_MEMORY_FRACTION, ShardedHeapSnapshot, iter_sharded_objects_with_properties, load_sharded_snapshot, summarize_sharded_snapshot
+from .server import DEFAULT_HOST, DEFAULT_PORT, ServerError, iter_server_lines, request_server, serve as serve_snapshots
 
 log = logging.getLogger('heapsnapshot')
 log.setLevel(logging.DEBUG)
@@ -17,34 +30,19 @@ handler = logging.StreamHandler()
 log.addHandler(handler)
 
 HEAP_SNAPSHOT_TIMEOUT: int = 30000
-HEAP_SNAPSHOT_SIZE: int  = 0
-HEAP_SNAPSHOT_CHUNKS: List[str] = []
-
-HEAP_SNAPSHOT: HeapSnapshot = None
 
 app = typer.Typer()
 
-async def find_objects_with_properties(heap_snapshot: HeapSnapshot, properties: List[str], ignore_properties: List[str] = []):
-    log.debug(f"finding objects {properties=} {ignore_properties=}")
-    node_ids = await find_node_ids_with_properties(heap_snapshot, properties)
-    log.debug(f"{len(node_ids)} node(s) found, compiling object(s) {node_ids}")
-
-    if len(node_ids) > 5:
-        log.warning("more than 5 nodes found, this may be slow - to improve performance, increase the specifity of your query or ignore unwanted properties on the target object")
-
-    return await asyncio.gather(*[
-        build_object_from_node_id(heap_snapshot, node_id, lambda prop: prop not in ignore_properties)
-        for node_id in node_ids
-    ])
-
-async def add_snapshot_chunk_cb(chunk: Dict[Any, Any]) -> None:
-    global HEAP_SNAPSHOT_SIZE, HEAP_SNAPSHOT_CHUNKS
-    chunk = chunk['chunk']
+@contextmanager
+def stats_report(stats_file: Optional[typer.FileTextWrite]) -> Iterator[None]:
+    if stats_file is None:
+        yield
+        return
 
-    HEAP_SNAPSHOT_SIZE += len(chunk)
-    HEAP_SNAPSHOT_CHUNKS.append(chunk)
+    with collect_stats() as stats:
+        yield
 
-    #log.debug(f"heap snapshot chunk: size {len(chunk)}, total {HEAP_SNAPSHOT_SIZE}")
+    stats_file.write(json.dumps(stats.to_dict(), indent=2) + "\n")
 
 async def report_snapshot_progess_cb(progress: Dict[Any, Any]) -> None:
     done = progress['done']
@@ -53,83 +51,498 @@ async def report_snapshot_progess_cb(progress: Dict[Any, Any]) -> None:
 
     log.info(f'heap snapshot progress: {done}/{total}{f" finished: {finished}" if finished else ""}')
 
-async def afetch(url: str, properties: List[str], output_file: typer.FileTextWrite = None, ignore_properties: List[str] = []):
-    global HEAP_SNAPSHOT, HEAP_SNAPSHOT_CHUNKS
+def parse_where(where: Optional[List[str]]) -> List[Predicate]:
+    try:
+        return parse_predicates(where or [])
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+def check_where(heap_snapshot: Any, predicates: List[Predicate]) -> None:
+    try:
+        check_predicates(heap_snapshot, predicates)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+def get_build_budget(max_depth: Optional[int] = None, max_elements: Optional[int] = None, max_nodes: Optional[int] = None, max_bytes: Optional[int] = None, refs: bool = False) -> Optional[BuildBudget]:
+    if max_depth is None and max_elements is None and max_nodes is None and max_bytes is None and not refs:
+        return None
+
+    return BuildBudget(max_depth=max_depth, max_elements=max_elements, max_nodes=max_nodes, max_bytes=max_bytes, refs=refs)
+
+async def aoutput_objects(heap_snapshot: Any, properties: List[str], ignore_properties: List[str] = [], workers: int = 1, limit: Optional[int] = None, ndjson_file: Optional[typer.FileBinaryWrite] = None, url: Optional[str] = None, predicates: List[Predicate] = [], budget: Optional[BuildBudget] = None):
+    check_where(heap_snapshot, predicates)
+
+    if ndjson_file is None:
+        objects = await afind_objects_with_properties(heap_snapshot, properties, ignore_properties, workers, limit, predicates, budget)
+        pprint({url: objects} if url else objects)
+        return
+
+    documents = (
+        {**({'url': url} if url else {}), 'nodeId': node_id, 'value': built_object}
+        for node_id, built_object in iter_objects_with_properties(heap_snapshot, properties, ignore_properties, workers, limit, predicates, budget)
+    )
+    await asyncio.to_thread(write_ndjson, documents, ndjson_file)
+
+async def afetch(url: str, properties: List[str], output_file: typer.FileTextWrite = None, ignore_properties: List[str] = [], use_cache: bool = False, workers: int = 1, limit: Optional[int] = None, ndjson_file: Optional[typer.FileBinaryWrite] = None, compression: Optional[str] = None, predicates: List[Predicate] = [], budget: Optional[BuildBudget] = None):
+    # playwright takes a while to import, only pay for it when capturing
+    from playwright.async_api import async_playwright
+    from .capture import capture_heap_snapshot
+
+    # chunks are compressed into the output file as they arrive, closing the writer finishes the stream
+    capture_file = open_compressed_writer(output_file.buffer, compression) if output_file and compression else output_file
 
     async with async_playwright() as p:
         browser = await p.chromium.launch()
-        #context = await browser.new_context() #ignore_https_errors=True)
-
-        page = await browser.new_page()
-        await page.goto(url)
 
         with Progress() as progress_bar:
             snapshot_task = progress_bar.add_task("heap snapshot progress")
 
-            cdp_session = await page.context.new_cdp_session(page)
-            cdp_session.on("HeapProfiler.addHeapSnapshotChunk",  add_snapshot_chunk_cb)
-            cdp_session.on("HeapProfiler.reportHeapSnapshotProgress",  lambda progress: progress_bar.update(snapshot_task, total=progress['total'], completed=progress['done']))
-            cdp_session.on("error", lambda e: log.error(f"Error when capturing heap snapshot: {e}"))
-            cdp_session.on("close", lambda: log.error("CDP session closed prematurely"))
+            try:
+                heap_snapshot = await capture_heap_snapshot(
+                    browser,
+                    url,
+                    capture_file,
+                    lambda done, total: progress_bar.update(snapshot_task, total=total, completed=done),
+                    parse=bool(properties or predicates) or use_cache
+                )
+            except json.JSONDecodeError:
+                log.error("Error decoding heap snapshot")
+                return
+            except (pydantic.ValidationError, KeyError, ValueError):
+                log.error("Error parsing heap snapshot")
+                return
+            finally:
+                if capture_file is not output_file:
+                    capture_file.close()
 
-            await cdp_session.send("HeapProfiler.takeHeapSnapshot", {'reportProgress': True, 'captureNumericValue': True})
+    if output_file and use_cache:
+        output_file.flush()
+        write_snapshot_cache(heap_snapshot, get_cache_path(output_file.name), hash_file(output_file.name))
 
-        try:
-            json_snapshot = ''.join(HEAP_SNAPSHOT_CHUNKS)
-            HEAP_SNAPSHOT = HeapSnapshot.model_validate_json(json_snapshot)
-            if output_file:
-                json.dump(json_snapshot, output_file)
-
-        except json.JSONDecodeError:
-            log.error("Error decoding heap snapshot")
-        except pydantic.ValidationError:
-            log.error("Error parsing heap snapshot")
-        else:
-            pprint(await find_objects_with_properties(HEAP_SNAPSHOT, properties, ignore_properties))
+    if properties or predicates:
+        await aoutput_objects(heap_snapshot, properties, ignore_properties, workers, limit, ndjson_file, predicates=predicates, budget=budget)
+
+async def afetch_many(urls: List[str], properties: List[str], ignore_properties: List[str] = [], concurrency: int = 4, output_dir: Optional[Path] = None, workers: int = 1, limit: Optional[int] = None, ndjson_file: Optional[typer.FileBinaryWrite] = None, compression: Optional[str] = None, predicates: List[Predicate] = [], budget: Optional[BuildBudget] = None):
+    from .capture import capture_heap_snapshots
+
+    async for url, heap_snapshot in capture_heap_snapshots(urls, concurrency, output_dir, parse=bool(properties or predicates), compression=compression):
+        if heap_snapshot is None:
+            log.info(f"wrote heap snapshot for {url}")
+            continue
+
+        if isinstance(heap_snapshot, Exception):
+            continue
+
+        await aoutput_objects(heap_snapshot, properties, ignore_properties, workers, limit, ndjson_file, url, predicates, budget)
 
-        #await cdp_session.detach()
+def output_sharded_objects(heap_snapshot: ShardedHeapSnapshot, properties: List[str], ignore_properties: List[str] = [], limit: Optional[int] = None, ndjson_file: Optional[typer.FileBinaryWrite] = None, budget: Optional[BuildBudget] = None):
+    results = iter_sharded_objects_with_properties(heap_snapshot, properties, ignore_properties, limit, budget)
 
-async def aquery(snapshot_file: typer.FileText, properties: List[str], ignore_properties: List[str] = []):
-    global HEAP_SNAPSHOT
+    if ndjson_file is None:
+        pprint([built_object for _, built_object in results])
+        return
 
-    HEAP_SNAPSHOT = HeapSnapshot.model_validate_json(snapshot_file.read())
-    pprint(await find_objects_with_properties(HEAP_SNAPSHOT, properties, ignore_properties))
+    write_ndjson(({'nodeId': node_id, 'value': built_object} for node_id, built_object in results), ndjson_file)
+
+async def aquery(snapshot_path: Path, properties: List[str], ignore_properties: List[str] = [], use_cache: bool = False, workers: int = 1, limit: Optional[int] = None, ndjson_file: Optional[typer.FileBinaryWrite] = None, predicates: List[Predicate] = [], budget: Optional[BuildBudget] = None):
+    heap_snapshot = load_heap_snapshot(str(snapshot_path), use_cache)
+    get_snapshot_index(heap_snapshot)
+    await aoutput_objects(heap_snapshot, properties, ignore_properties, workers, limit, ndjson_file, predicates=predicates, budget=budget)
 
 @app.command()
 def fetch(
     url: Annotated[str, typer.Option("--url", "-u", help="URL to dump")],
-    properties: Annotated[str, typer.Option("--properties", "-p", help="Comma seperated properties to search for")],
+    properties: Annotated[Optional[str], typer.Option("--properties", "-p", help="Comma seperated properties to search for, the snapshot is only written to --output when omitted")] = None,
     output_file: Annotated[Optional[typer.FileTextWrite], typer.Option("-o", "--output", help="Output filepath")] = None,
-    ignore_properties: Annotated[Optional[str], typer.Option("--ignore-properties", "-i", help="Comma seperated properties of properties to ignore on object")] = None
+    compression: Annotated[Optional[str], typer.Option("--compress", help=f"Compress written snapshots as they are captured, one of {', '.join(COMPRESSION_SUFFIXES)}, defaults to the one matching the --output suffix (.gz, .zst)")] = None,
+    ignore_properties: Annotated[Optional[str], typer.Option("--ignore-properties", "-i", help="Comma seperated properties of properties to ignore on object")] = None,
+    where: Annotated[Optional[List[str]], typer.Option("--where", "-W", help="Only output objects matching a predicate, can be repeated: name, !name, name=value, name~regex, @constructor=Name, @type=type or @self_size>=bytes")] = None,
+    cache: Annotated[bool, typer.Option("--cache", help="Write a binary cache of the snapshot next to the output file for faster queries")] = False,
+    workers: Annotated[int, typer.Option("--workers", "-w", min=1, help="Number of processes used to build matching objects")] = 1,
+    limit: Annotated[Optional[int], typer.Option("--limit", "-l", min=1, help="Maximum number of matching objects to build")] = None,
+    ndjson_file: Annotated[Optional[typer.FileBinaryWrite], typer.Option("--ndjson", help="Write each matching object as a line of JSON as soon as it is built, to a file or '-' for stdout")] = None,
+    max_depth: Annotated[Optional[int], typer.Option("--max-depth", min=0, help="Objects and arrays nested deeper are replaced by a truncation marker")] = None,
+    max_elements: Annotated[Optional[int], typer.Option("--max-elements", min=0, help="Elements kept per array, a truncation marker follows them")] = None,
+    max_nodes: Annotated[Optional[int], typer.Option("--max-nodes", min=1, help="Nodes visited per object before building stops at a truncation marker")] = None,
+    max_bytes: Annotated[Optional[int], typer.Option("--max-bytes", min=1, help="Approximate JSON size per object before building stops at a truncation marker")] = None,
+    refs: Annotated[bool, typer.Option("--refs", help="Output objects and arrays already in the value as a $ref to their node id and first occurrence")] = False,
+    stats_file: Annotated[Optional[typer.FileTextWrite], typer.Option("--stats", help="Write per-stage timings and counters as JSON to a file, '-' for stdout")] = None
 ):
     """
     fetch a heap snapshot for a URL and/or write to a file then output the matching objects in JSON
     """
-    asyncio.run(
-        afetch(
-            url=url,
-            output_file=output_file,
-            properties=properties.split(','),
-            ignore_properties=ignore_properties.split(',') if ignore_properties else []
+    if not properties and not where and not output_file:
+        raise typer.BadParameter("Specify --properties or --where to query the snapshot and/or --output to write it")
+
+    predicates = parse_where(where)
+
+    compression = compression or (get_compression_for_path(output_file.name) if output_file else None)
+
+    try:
+        if compression:
+            require_compression(compression)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    with stats_report(stats_file):
+        asyncio.run(
+            afetch(
+                url=url,
+                output_file=output_file,
+                properties=properties.split(',') if properties else [],
+                ignore_properties=ignore_properties.split(',') if ignore_properties else [],
+                use_cache=cache,
+                workers=workers,
+                limit=limit,
+                ndjson_file=ndjson_file,
+                compression=compression,
+                predicates=predicates,
+                budget=get_build_budget(max_depth, max_elements, max_nodes, max_bytes, refs)
+            )
+        )
+
+@app.command("fetch-many")
+def fetch_many(
+    properties: Annotated[Optional[str], typer.Option("--properties", "-p", help="Comma seperated properties to search for, snapshots are only written to --output-dir when omitted")] = None,
+    urls: Annotated[Optional[List[str]], typer.Option("--url", "-u", help="URL to dump, can be repeated")] = None,
+    urls_file: Annotated[Optional[typer.FileText], typer.Option("--urls-file", help="File with one URL to dump per line")] = None,
+    output_dir: Annotated[Optional[Path], typer.Option("-o", "--output-dir", help="Directory to write each heap snapshot to", file_okay=False)] = None,
+    compression: Annotated[Optional[str], typer.Option("--compress", help=f"Compress written snapshots as they are captured, one of {', '.join(COMPRESSION_SUFFIXES)}")] = None,
+    ignore_properties: Annotated[Optional[str], typer.Option("--ignore-properties", "-i", help="Comma seperated properties of properties to ignore on object")] = None,
+    where: Annotated[Optional[List[str]], typer.Option("--where", "-W", help="Only output objects matching a predicate, can be repeated: name, !name, name=value, name~regex, @constructor=Name, @type=type or @self_size>=bytes")] = None,
+    concurrency: Annotated[int, typer.Option("--concurrency", "-c", min=1, help="Number of pages captured at the same time")] = 4,
+    workers: Annotated[int, typer.Option("--workers", "-w", min=1, help="Number of processes used to build matching objects")] = 1,
+    limit: Annotated[Optional[int], typer.Option("--limit", "-l", min=1, help="Maximum number of matching objects to build")] = None,
+    ndjson_file: Annotated[Optional[typer.FileBinaryWrite], typer.Option("--ndjson", help="Write each matching object as a line of JSON as soon as it is built, to a file or '-' for stdout")] = None,
+    max_depth: Annotated[Optional[int], typer.Option("--max-depth", min=0, help="Objects and arrays nested deeper are replaced by a truncation marker")] = None,
+    max_elements: Annotated[Optional[int], typer.Option("--max-elements", min=0, help="Elements kept per array, a truncation marker follows them")] = None,
+    max_nodes: Annotated[Optional[int], typer.Option("--max-nodes", min=1, help="Nodes visited per object before building stops at a truncation marker")] = None,
+    max_bytes: Annotated[Optional[int], typer.Option("--max-bytes", min=1, help="Approximate JSON size per object before building stops at a truncation marker")] = None,
+    refs: Annotated[bool, typer.Option("--refs", help="Output objects and arrays already in the value as a $ref to their node id and first occurrence")] = False,
+    stats_file: Annotated[Optional[typer.FileTextWrite], typer.Option("--stats", help="Write per-stage timings and counters as JSON to a file, '-' for stdout")] = None
+):
+    """
+    fetch heap snapshots for several URLs with a shared browser and output the matching objects in JSON for each URL as it completes
+    """
+    urls = [*(urls or []), *(line.strip() for line in urls_file or [] if line.strip())]
+
+    if not urls:
+        raise typer.BadParameter("Specify at least one URL with --url or --urls-file")
+
+    if not properties and not where and not output_dir:
+        raise typer.BadParameter("Specify --properties or --where to query the snapshots and/or --output-dir to write them")
+
+    predicates = parse_where(where)
+
+    try:
+        if compression:
+            require_compression(compression)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    if output_dir:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    with stats_report(stats_file):
+        asyncio.run(
+            afetch_many(
+                urls=urls,
+                properties=properties.split(',') if properties else [],
+                ignore_properties=ignore_properties.split(',') if ignore_properties else [],
+                concurrency=concurrency,
+                output_dir=output_dir,
+                workers=workers,
+                limit=limit,
+                ndjson_file=ndjson_file,
+                compression=compression,
+                predicates=predicates,
+                budget=get_build_budget(max_depth, max_elements, max_nodes, max_bytes, refs)
+            )
         )
-    )
 
 @app.command()
 def query(
-    file: Annotated[typer.FileText, typer.Option("--file", "-f", help="Snapshot file path")],
-    properties: Annotated[str, typer.Option("--properties", "-p", help="Comma seperated properties to search for")],
-    ignore_properties: Annotated[Optional[str], typer.Option("--ignore-properties", "-i", help="Comma seperated properties of properties to ignore on object")] = None
+    file: Annotated[Path, typer.Option("--file", "-f", help="Snapshot file path", exists=True, dir_okay=False)],
+    properties: Annotated[Optional[str], typer.Option("--properties", "-p", help="Comma seperated properties to search for")] = None,
+    ignore_properties: Annotated[Optional[str], typer.Option("--ignore-properties", "-i", help="Comma seperated properties of properties to ignore on object")] = None,
+    where: Annotated[Optional[List[str]], typer.Option("--where", "-W", help="Only output objects matching a predicate, can be repeated: name, !name, name=value, name~regex, @constructor=Name, @type=type or @self_size>=bytes")] = None,
+    cache: Annotated[bool, typer.Option("--cache", help="Load the snapshot from a binary cache next to the file, (re)building it when missing or stale")] = False,
+    workers: Annotated[int, typer.Option("--workers", "-w", min=1, help="Number of processes used to build matching objects")] = 1,
+    limit: Annotated[Optional[int], typer.Option("--limit", "-l", min=1, help="Maximum number of matching objects to build")] = None,
+    ndjson_file: Annotated[Optional[typer.FileBinaryWrite], typer.Option("--ndjson", help="Write each matching object as a line of JSON as soon as it is built, to a file or '-' for stdout")] = None,
+    max_depth: Annotated[Optional[int], typer.Option("--max-depth", min=0, help="Objects and arrays nested deeper are replaced by a truncation marker")] = None,
+    max_elements: Annotated[Optional[int], typer.Option("--max-elements", min=0, help="Elements kept per array, a truncation marker follows them")] = None,
+    max_nodes: Annotated[Optional[int], typer.Option("--max-nodes", min=1, help="Nodes visited per object before building stops at a truncation marker")] = None,
+    max_bytes: Annotated[Optional[int], typer.Option("--max-bytes", min=1, help="Approximate JSON size per object before building stops at a truncation marker")] = None,
+    refs: Annotated[bool, typer.Option("--refs", help="Output objects and arrays already in the value as a $ref to their node id and first occurrence")] = False,
+    out_of_core: Annotated[bool, typer.Option("--out-of-core", help="Stream the nodes and edges into memory-mapped shards on disk and process them shard by shard, for snapshots larger than memory")] = False,
+    scratch_dir: Annotated[Optional[Path], typer.Option("--scratch-dir", help="Directory for the shards of --out-of-core, defaults to <file>.shards next to the snapshot", file_okay=False)] = None,
+    memory_fraction: Annotated[float, typer.Option("--memory-fraction", min=0.001, max=1.0, help="Approximate memory used by --out-of-core as a fraction of the snapshot file size, sets the shard size")] = DEFAULT_MEMORY_FRACTION,
+    stats_file: Annotated[Optional[typer.FileTextWrite], typer.Option("--stats", help="Write per-stage timings and counters as JSON to a file, '-' for stdout")] = None
 ):
     """
     read a heap snapshot and output the matching objects in JSON
     """
-    asyncio.run(
-        aquery(
-            snapshot_file=file,
-            properties=properties.split(','),
-            ignore_properties=ignore_properties.split(',') if ignore_properties else []
+    if not properties and not where:
+        raise typer.BadParameter("Specify --properties and/or --where")
+
+    if out_of_core:
+        if where or cache or workers > 1:
+            raise typer.BadParameter("--out-of-core cannot be combined with --where, --cache or --workers")
+
+        with stats_report(stats_file):
+            output_sharded_objects(
+                load_sharded_snapshot(str(file), scratch_dir and str(scratch_dir), memory_fraction),
+                properties.split(','),
+                ignore_properties.split(',') if ignore_properties else [],
+                limit,
+                ndjson_file,
+                get_build_budget(max_depth, max_elements, max_nodes, max_bytes, refs)
+            )
+        return
+
+    predicates = parse_where(where)
+
+    with stats_report(stats_file):
+        asyncio.run(
+            aquery(
+                snapshot_path=file,
+                properties=properties.split(',') if properties else [],
+                ignore_properties=ignore_properties.split(',') if ignore_properties else [],
+                use_cache=cache,
+                workers=workers,
+                limit=limit,
+                ndjson_file=ndjson_file,
+                predicates=predicates,
+                budget=get_build_budget(max_depth, max_elements, max_nodes, max_bytes, refs)
+            )
         )
-    )
+
+@app.command()
+def batch(
+    file: Annotated[Path, typer.Option("--file", "-f", help="Snapshot file path", exists=True, dir_okay=False)],
+    queries_file: Annotated[Path, typer.Option("--queries", "-q", help="JSON or YAML file of named queries, each with properties and optional ignore_properties and where predicates", exists=True, dir_okay=False)],
+    cache: Annotated[bool, typer.Option("--cache", help="Load the snapshot from a binary cache next to the file, (re)building it when missing or stale")] = False,
+    workers: Annotated[int, typer.Option("--workers", "-w", min=1, help="Number of processes used to build matching objects")] = 1,
+    limit: Annotated[Optional[int], typer.Option("--limit", "-l", min=1, help="Maximum number of matching objects to build")] = None,
+    ndjson_file: Annotated[Optional[typer.FileBinaryWrite], typer.Option("--ndjson", help="Write each matching object as a line of JSON as soon as it is built, to a file or '-' for stdout")] = None,
+    max_depth: Annotated[Optional[int], typer.Option("--max-depth", min=0, help="Objects and arrays nested deeper are replaced by a truncation marker")] = None,
+    max_elements: Annotated[Optional[int], typer.Option("--max-elements", min=0, help="Elements kept per array, a truncation marker follows them")] = None,
+    max_nodes: Annotated[Optional[int], typer.Option("--max-nodes", min=1, help="Nodes visited per object before building stops at a truncation marker")] = None,
+    max_bytes: Annotated[Optional[int], typer.Option("--max-bytes", min=1, help="Approximate JSON size per object before building stops at a truncation marker")] = None,
+    refs: Annotated[bool, typer.Option("--refs", help="Output objects and arrays already in the value as a $ref to their node id and first occurrence")] = False,
+    stats_file: Annotated[Optional[typer.FileTextWrite], typer.Option("--stats", help="Write per-stage timings and counters as JSON to a file, '-' for stdout")] = None
+):
+    """
+    read a heap snapshot once, run every query in a file against it and output the matching objects in JSON keyed by query name
+    """
+    try:
+        queries = load_batch_queries(queries_file)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+
+    with stats_report(stats_file):
+        heap_snapshot = load_heap_snapshot(str(file), cache)
+        budget = get_build_budget(max_depth, max_elements, max_nodes, max_bytes, refs)
+
+        for query in queries:
+            check_where(heap_snapshot, parse_predicates(query.where))
+
+        if ndjson_file is None:
+            pprint(find_objects_for_queries(heap_snapshot, queries, workers, limit, budget))
+        else:
+            write_ndjson((
+                {'query': name, 'nodeId': node_id, 'value': built_object}
+                for name, node_id, built_object in iter_objects_for_queries(heap_snapshot, queries, workers, limit, budget)
+            ), ndjson_file)
+
+def get_target_node_ids(heap_snapshot: Any, node_ids: Optional[List[int]], properties: Optional[str]) -> List[int]:
+    if not node_ids and not properties:
+        raise typer.BadParameter("Specify nodes with --node-id or --properties")
+
+    return [*(node_ids or []), *(find_node_ids_with_properties(heap_snapshot, properties.split(',')) if properties else [])]
+
+@app.command()
+def retainers(
+    file: Annotated[Path, typer.Option("--file", "-f", help="Snapshot file path", exists=True, dir_okay=False)],
+    node_ids: Annotated[Optional[List[int]], typer.Option("--node-id", "-n", help="Id of a node to explain, can be repeated")] = None,
+    properties: Annotated[Optional[str], typer.Option("--properties", "-p", help="Comma seperated properties of the objects to explain")] = None,
+    limit: Annotated[int, typer.Option("--limit", "-l", min=0, help="Maximum number of retaining edges listed per node")] = 20,
+    cache: Annotated[bool, typer.Option("--cache", help="Load the snapshot from a binary cache next to the file, (re)building it when missing or stale")] = False,
+    stats_file: Annotated[Optional[typer.FileTextWrite], typer.Option("--stats", help="Write per-stage timings and counters as JSON to a file, '-' for stdout")] = None
+):
+    """
+    output the edges retaining nodes and their shortest retainer path from the GC roots in JSON
+    """
+    with stats_report(stats_file):
+        heap_snapshot = load_heap_snapshot(str(file), cache)
+        index = get_snapshot_index(heap_snapshot)
+
+        pprint({
+            node_id: {
+                'node': describe_node(heap_snapshot, index.get_node_index(node_id)),
+                'retainers': get_retainers(heap_snapshot, node_id)[:limit],
+                'path': find_shortest_retainer_path(heap_snapshot, node_id),
+            }
+            for node_id in get_target_node_ids(heap_snapshot, node_ids, properties)
+        })
+
+@app.command()
+def dominators(
+    file: Annotated[Path, typer.Option("--file", "-f", help="Snapshot file path", exists=True, dir_okay=False)],
+    node_ids: Annotated[Optional[List[int]], typer.Option("--node-id", "-n", help="Id of a node to output the dominator chain of, can be repeated")] = None,
+    properties: Annotated[Optional[str], typer.Option("--properties", "-p", help="Comma seperated properties of the objects to output the dominator chain of")] = None,
+    top: Annotated[int, typer.Option("--top", "-t", min=1, help="Number of nodes retaining the most memory to output when no nodes are given")] = 20,
+    cache: Annotated[bool, typer.Option("--cache", help="Load the snapshot from a binary cache next to the file, (re)building it when missing or stale")] = False,
+    stats_file: Annotated[Optional[typer.FileTextWrite], typer.Option("--stats", help="Write per-stage timings and counters as JSON to a file, '-' for stdout")] = None
+):
+    """
+    output the nodes retaining the most memory, or the dominator chains of the given nodes, with retained sizes in JSON
+    """
+    with stats_report(stats_file):
+        heap_snapshot = load_heap_snapshot(str(file), cache)
+
+        if not node_ids and not properties:
+            pprint(find_largest_retained_nodes(heap_snapshot, top))
+            return
+
+        pprint({
+            node_id: get_dominators(heap_snapshot, node_id)
+            for node_id in get_target_node_ids(heap_snapshot, node_ids, properties)
+        })
+
+@app.command()
+def diff(
+    before: Annotated[Path, typer.Option("--before", "-b", help="Snapshot file captured first", exists=True, dir_okay=False)],
+    after: Annotated[Path, typer.Option("--after", "-a", help="Snapshot file captured later", exists=True, dir_okay=False)],
+    top: Annotated[int, typer.Option("--top", "-t", min=1, help="Number of groups to output, largest size delta first")] = 50,
+    cache: Annotated[bool, typer.Option("--cache", help="Load the snapshots from binary caches next to the files, (re)building them when missing or stale")] = False,
+    stats_file: Annotated[Optional[typer.FileTextWrite], typer.Option("--stats", help="Write per-stage timings and counters as JSON to a file, '-' for stdout")] = None
+):
+    """
+    compare two heap snapshots of the same page and output the added, removed, grown and shrunk objects by type and constructor name in JSON
+    """
+    with stats_report(stats_file):
+        pprint(diff_snapshots(load_heap_snapshot(str(before), cache), load_heap_snapshot(str(after), cache))[:top])
+
+@app.command()
+def summary(
+    file: Annotated[Path, typer.Option("--file", "-f", help="Snapshot file path", exists=True, dir_okay=False)],
+    top: Annotated[int, typer.Option("--top", "-t", min=1, help="Number of groups to output")] = 50,
+    retained: Annotated[bool, typer.Option("--retained", "-r", help="Compute the retained size of each group, requires building the dominator tree")] = False,
+    sort_by: Annotated[str, typer.Option("--sort", "-s", help=f"Column to sort groups by, one of {', '.join(SUMMARY_SORT_KEYS)}, defaults to retainedSize with --retained and selfSize otherwise")] = "",
+    as_json: Annotated[bool, typer.Option("--json", help="Output plain JSON")] = False,
+    cache: Annotated[bool, typer.Option("--cache", help="Load the snapshot from a binary cache next to the file, (re)building it when missing or stale")] = False,
+    out_of_core: Annotated[bool, typer.Option("--out-of-core", help="Stream the nodes and edges into memory-mapped shards on disk and process them shard by shard, for snapshots larger than memory")] = False,
+    scratch_dir: Annotated[Optional[Path], typer.Option("--scratch-dir", help="Directory for the shards of --out-of-core, defaults to <file>.shards next to the snapshot", file_okay=False)] = None,
+    memory_fraction: Annotated[float, typer.Option("--memory-fraction", min=0.001, max=1.0, help="Approximate memory used by --out-of-core as a fraction of the snapshot file size, sets the shard size")] = DEFAULT_MEMORY_FRACTION,
+    stats_file: Annotated[Optional[typer.FileTextWrite], typer.Option("--stats", help="Write per-stage timings and counters as JSON to a file, '-' for stdout")] = None
+):
+    """
+    output a histogram of the heap by type and constructor name with counts, self sizes and optionally retained sizes
+    """
+    with stats_report(stats_file):
+        try:
+            if out_of_core:
+                groups = summarize_sharded_snapshot(load_sharded_snapshot(str(file), scratch_dir and str(scratch_dir), memory_fraction), retained, top, sort_by)
+            else:
+                groups = summarize_snapshot(load_heap_snapshot(str(file), cache), retained, top, sort_by)
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+
+        if as_json:
+            print(json.dumps(groups, indent=2))
+        else:
+            pprint(groups)
+
+@app.command()
+def serve(
+    host: Annotated[str, typer.Option("--host", help="Address to listen on")] = DEFAULT_HOST,
+    port: Annotated[int, typer.Option("--port", help="Port to listen on")] = DEFAULT_PORT,
+    memory_budget: Annotated[int, typer.Option("--memory-budget", "-m", min=1, help="Approximate memory in MB kept for loaded snapshots, least recently used ones are evicted past it")] = 2048,
+    files: Annotated[Optional[List[Path]], typer.Option("--file", "-f", help="Snapshot file to load on startup, can be repeated", exists=True, dir_okay=False)] = None,
+    cache: Annotated[bool, typer.Option("--cache", help="Load snapshots from binary caches next to the files, (re)building them when missing or stale")] = False
+):
+    """
+    keep heap snapshots loaded and answer queries for them over HTTP, see the client command
+    """
+    serve_snapshots(host, port, memory_budget << 20, cache, [str(file) for file in files or []])
+
+@app.command()
+def client(
+    file: Annotated[Path, typer.Option("--file", "-f", help="Snapshot file path, as seen by the server", exists=True, dir_okay=False)],
+    properties: Annotated[Optional[str], typer.Option("--properties", "-p", help="Comma seperated properties to search for")] = None,
+    ignore_properties: Annotated[Optional[str], typer.Option("--ignore-properties", "-i", help="Comma seperated properties of properties to ignore on object")] = None,
+    where: Annotated[Optional[List[str]], typer.Option("--where", "-W", help="Only output objects matching a predicate, can be repeated: name, !name, name=value, name~regex, @constructor=Name, @type=type or @self_size>=bytes")] = None,
+    limit: Annotated[Optional[int], typer.Option("--limit", "-l", min=1, help="Maximum number of matching objects to build")] = None,
+    max_depth: Annotated[Optional[int], typer.Option("--max-depth", min=0, help="Objects and arrays nested deeper are replaced by a truncation marker")] = None,
+    max_elements: Annotated[Optional[int], typer.Option("--max-elements", min=0, help="Elements kept per array, a truncation marker follows them")] = None,
+    max_nodes: Annotated[Optional[int], typer.Option("--max-nodes", min=1, help="Nodes visited per object before building stops at a truncation marker")] = None,
+    max_bytes: Annotated[Optional[int], typer.Option("--max-bytes", min=1, help="Approximate JSON size per object before building stops at a truncation marker")] = None,
+    refs: Annotated[bool, typer.Option("--refs", help="Output objects and arrays already in the value as a $ref to their node id and first occurrence")] = False,
+    node_ids_only: Annotated[bool, typer.Option("--node-ids", help="Only output the ids of the matching nodes")] = False,
+    server_url: Annotated[str, typer.Option("--server", "-s", help="URL of a running serve command")] = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+):
+    """
+    query a snapshot kept loaded by the serve command, matching objects are written as a line of JSON each as they are built
+    """
+    if not properties and not where:
+        raise typer.BadParameter("Specify --properties and/or --where")
+
+    parse_where(where)
+
+    payload = {
+        'file': str(file.resolve()),
+        'properties': properties.split(',') if properties else [],
+        'ignore_properties': ignore_properties.split(',') if ignore_properties else [],
+        'where': where or [],
+        'limit': limit,
+    }
+
+    budget = get_build_budget(max_depth, max_elements, max_nodes, max_bytes, refs)
+
+    if budget:
+        payload['budget'] = budget.model_dump(exclude_defaults=True)
+
+    try:
+        if node_ids_only:
+            with request_server(server_url, "/node-ids", payload) as response:
+                print(json.dumps(json.load(response)['nodeIds']))
+            return
+
+        for line in iter_server_lines(server_url, "/query", payload):
+            sys.stdout.buffer.write(line)
+            sys.stdout.buffer.flush()
+    except ServerError as e:
+        log.error(str(e))
+        raise typer.Exit(code=1)
+
+@app.command()
+def benchmark(
+    file: Annotated[Optional[Path], typer.Option("--file", "-f", help="Snapshot file to benchmark, a synthetic snapshot is generated when omitted", exists=True, dir_okay=False)] = None,
+    properties: Annotated[Optional[str], typer.Option("--properties", "-p", help="Comma seperated properties to search for, defaults to prop0,prop1 for synthetic snapshots")] = None,
+    nodes: Annotated[int, typer.Option("--nodes", help="Synthetic snapshot node count")] = 100_000,
+    fan_out: Annotated[int, typer.Option("--fan-out", help="Synthetic snapshot properties per object / elements per array")] = 8,
+    depth: Annotated[int, typer.Option("--depth", help="Synthetic snapshot object nesting depth")] = 4,
+    property_names: Annotated[int, typer.Option("--property-names", help="Synthetic snapshot distinct property names")] = 1_000,
+    seed: Annotated[int, typer.Option("--seed", help="Synthetic snapshot random seed")] = 0,
+    build_limit: Annotated[int, typer.Option("--build-limit", help="Maximum number of matching objects to build")] = 10,
+    output_file: Annotated[Optional[typer.FileTextWrite], typer.Option("-o", "--output", help="Write the JSON report to a file")] = None
+):
+    """
+    time loading, indexing, searching and building objects for a snapshot file or a generated synthetic snapshot
+    """
+    if file:
+        if not properties:
+            raise typer.BadParameter("--properties is required when benchmarking a snapshot file")
+        report = run_benchmark(file, properties.split(','), build_limit)
+    else:
+        report = run_synthetic_benchmark(nodes, fan_out, depth, property_names, seed, properties.split(',') if properties else None, build_limit)
+
+    if output_file:
+        output_file.write(report.model_dump_json(indent=2))
+    else:
+        pprint(report.model_dump())
 
 if __name__ == '__main__':
     app()
@@ -0,0 +1,124 @@
+import os
+import time
+import logging
+import resource
+import tempfile
+import multiprocessing
+from contextlib import contextmanager
+from pathlib import Path
+from pydantic import BaseModel
+from typing import Dict, Iterator, List, Optional
+
+from .cache import load_heap_snapshot
+from .snapshot import find_node_ids_with_properties, get_snapshot_index
+from .build_object import build_object_from_node_id
+from .synthetic import write_synthetic_heap_snapshot
+
+log = logging.getLogger('heapsnapshot.benchmark')
+
+class BenchmarkReport(BaseModel):
+    snapshot_path: str
+    snapshot_bytes: int
+    node_count: int
+    edge_count: int
+    string_count: int
+    properties: List[str]
+    matches: int
+    built: int
+    # wall time in seconds and peak RSS in bytes at the end of each stage
+    stage_seconds: Dict[str, float] = {}
+    stage_peak_rss: Dict[str, int] = {}
+    total_seconds: float = 0
+    peak_rss: int = 0
+
+def get_peak_rss() -> int:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if os.uname().sysname == 'Darwin' else peak_rss * 1024
+
+@contextmanager
+def stage(report: BenchmarkReport, name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    yield
+    report.stage_seconds[name] = time.perf_counter() - start
+    report.stage_peak_rss[name] = get_peak_rss()
+    log.debug(f"{name}: {report.stage_seconds[name]:.3f}s, peak rss {report.stage_peak_rss[name] >> 20}MB")
+
+def run_benchmark(snapshot_path: Path, properties: List[str], build_limit: int = 10) -> BenchmarkReport:
+    """
+    Load a snapshot file and time each stage of a query: parse, index, search and object building
+    """
+    report = BenchmarkReport(
+        snapshot_path=str(snapshot_path),
+        snapshot_bytes=snapshot_path.stat().st_size,
+        node_count=0,
+        edge_count=0,
+        string_count=0,
+        properties=properties,
+        matches=0,
+        built=0,
+    )
+
+    start = time.perf_counter()
+
+    with stage(report, "parse"):
+        heap_snapshot = load_heap_snapshot(str(snapshot_path))
+
+    report.node_count = heap_snapshot.snapshot.node_count
+    report.edge_count = heap_snapshot.snapshot.edge_count
+    report.string_count = len(heap_snapshot.strings)
+
+    with stage(report, "index"):
+        get_snapshot_index(heap_snapshot)
+
+    with stage(report, "search"):
+        node_ids = find_node_ids_with_properties(heap_snapshot, properties)
+
+    report.matches = len(node_ids)
+    node_ids = node_ids[:build_limit]
+    report.built = len(node_ids)
+
+    with stage(report, "build"):
+        for node_id in node_ids:
+            try:
+                build_object_from_node_id(heap_snapshot, node_id)
+            except ValueError as e:
+                log.debug(f"unable to build node {node_id}: {e}")
+
+    report.total_seconds = time.perf_counter() - start
+    report.peak_rss = get_peak_rss()
+
+    return report
+
+def run_synthetic_benchmark(
+    node_count: int = 100_000,
+    fan_out: int = 8,
+    depth: int = 4,
+    property_names: int = 1_000,
+    seed: int = 0,
+    properties: Optional[List[str]] = None,
+    build_limit: int = 10
+) -> BenchmarkReport:
+    """
+    Generate a synthetic snapshot to a temporary file and run the benchmark against it,
+    by default searching for objects having the first two generated property names.
+
+    The snapshot is generated in a child process so it does not count towards the reported peak RSS.
+    """
+    with tempfile.TemporaryDirectory(prefix="playwrong-") as tmp_dir:
+        snapshot_path = Path(tmp_dir) / "synthetic.heapsnapshot"
+
+        start = time.perf_counter()
+        generator = multiprocessing.get_context("spawn").Process(
+            target=write_synthetic_heap_snapshot,
+            args=(str(snapshot_path), node_count, fan_out, depth, property_names, seed)
+        )
+        generator.start()
+        generator.join()
+
+        if generator.exitcode != 0:
+            raise RuntimeError(f"Synthetic snapshot generation failed with exit code {generator.exitcode}")
+
+        log.debug(f"generated {snapshot_path} in {time.perf_counter() - start:.3f}s")
+
+        return run_benchmark(snapshot_path, properties or ["prop0", "prop1"], build_limit)
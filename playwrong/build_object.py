@@ -1,96 +1,404 @@
 import re
 import logging
-from typing import Any, Dict, List, Callable, Optional
+import functools
+import numpy as np
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterator, List, Callable, Optional, Tuple
 
-from .models import BuiltHeapValue, HeapSnapshot, HeapSnapshotStructuredGraph, HeapSnapshotStructuredEdge
-from .structured_graph import create_structured_graph
+from .models import BuildBudget, BuiltHeapValue, HeapSnapshot
+from .index import SnapshotIndex
+from .snapshot import get_edge_rows, get_node_at_index, get_snapshot_index
+from .stats import count
 
 log = logging.getLogger('heapsnapshot.build_object')
 
-async def build_object_from_node_id(
+# node name -> kind of the objects compiled to containers
+OBJECT_KINDS = {'Object': 'object', 'Array': 'array'}
+CONTAINER_KINDS = ['object', 'array']
+VALUE_NODE_TYPES = ['array', 'string', 'number', 'regexp']
+INDEX_EDGE_TYPES = ['element', 'hidden']
+
+# nodes kept in the memo shared by the compilers of a snapshot
+NODE_MEMO_SIZE = 100_000
+# kind of a memoized node before it has been worked out, None is a valid kind
+UNKNOWN_KIND = object()
+
+def build_object_from_node_id(
     heap_snapshot: HeapSnapshot,
     node_id: int,
-    property_filter: Callable[[str], bool] = lambda _: True
+    property_filter: Callable[[str], bool] = lambda _: True,
+    budget: Optional[BuildBudget] = None
 ) -> BuiltHeapValue:
     log.debug(f"building node object for node {node_id}")
 
-    graph = await create_structured_graph(
-        heap_snapshot=heap_snapshot,
-        node_id=node_id,
-        edge_filter=lambda edge: (
-            (edge['type'] == 'property' and edge['name'] != '__proto__' and property_filter(edge['name'])) or
-            edge['type'] in ['element', 'hidden'] or
-            edge['name'] == 'value'
+    node_index = get_snapshot_index(heap_snapshot).get_node_index(node_id)
+    return compile_object(ObjectCompiler(heap_snapshot, property_filter, budget), node_index)
+
+def compile_object(compiler: 'ObjectCompiler', node_index: int) -> BuiltHeapValue:
+    if compiler.get_node_type(node_index) != 'object':
+        raise ValueError(f"Node '{compiler.get_node_id(node_index)}' is not object, cannot build object")
+
+    built_object = compiler.compile(node_index)
+    count("build.nodes_visited", compiler.nodes_visited)
+    count("build.memo_hits", compiler.memo_hits)
+    count("build.memo_misses", compiler.memo_misses)
+
+    return built_object
+
+class NodeMemo:
+    """
+    Bounded LRU memo of what ObjectCompiler reads about nodes, shared by every compiler of a snapshot so
+    subgraphs reached from several objects are only read once. Entries are (type, name string id, edges,
+    kind) tuples by node index, replaced as edges and kind are worked out. Edges are every edge an object
+    may be built through as (name or None for element and hidden edges, whether the property filter
+    applies to it, child node index), the filter itself is applied by each compiler. Entries only hold
+    tuples of atomic values so the garbage collector does not need to track them.
+    """
+
+    def __init__(self, max_size: int = NODE_MEMO_SIZE):
+        self.max_size = max_size
+        self._entries: OrderedDict[int, tuple] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Compilers in several threads (see server) share the memo. Every OrderedDict operation is atomic,
+    # an entry may only be gone by the time it is refreshed or evicted, so there is no lock to pay for.
+    def get(self, node_index: int) -> Optional[tuple]:
+        entry = self._entries.get(node_index)
+
+        if entry is not None:
+            try:
+                self._entries.move_to_end(node_index)
+            except KeyError:
+                pass
+
+        return entry
+
+    def put(self, node_index: int, entry: tuple) -> None:
+        self._entries[node_index] = entry
+
+        if len(self._entries) > self.max_size:
+            try:
+                self._entries.popitem(last=False)
+            except KeyError:
+                pass
+
+def get_node_memo(heap_snapshot: HeapSnapshot) -> NodeMemo:
+    if heap_snapshot._node_memo is None:
+        heap_snapshot._node_memo = NodeMemo()
+
+    return heap_snapshot._node_memo
+
+class ObjectCompiler:
+    """
+    Compiles nodes to Python values in a single walk over the snapshot arrays: only the edges and
+    children that end up in the value are visited. Plain objects become dicts of their properties
+    (except __proto__), arrays lists of their elements, and strings, numbers, regexps, booleans and
+    null their value. Edges back to a node being compiled are left out. Nodes, their kinds and edges
+    are memoized in the NodeMemo of the snapshot, the entries used and the filtered edges are also
+    kept for the lifetime of the compiler.
+
+    The walk stops at the limits of budget, see BuildBudget.
+    """
+
+    def __init__(
+        self,
+        heap_snapshot: HeapSnapshot,
+        property_filter: Callable[[str], bool] = lambda _: True,
+        budget: Optional[BuildBudget] = None
+    ):
+        meta = heap_snapshot.snapshot.meta
+
+        self.heap_snapshot = heap_snapshot
+        self.strings = heap_snapshot.strings
+        self.property_filter = property_filter
+        self.budget = budget or BuildBudget()
+        self.nodes_visited = 0
+        self.output_bytes = 0
+
+        self.node_field_count = len(meta.node_fields)
+        self.node_type_field = meta.node_fields.index('type')
+        self.node_name_field = meta.node_fields.index('name')
+        self.node_id_field = meta.node_fields.index('id')
+        self.node_types = meta.node_types[self.node_type_field]
+
+        edge_type_field = meta.edge_fields.index('type')
+        self.edge_columns = [edge_type_field, meta.edge_fields.index('name_or_index'), meta.edge_fields.index('to_node')]
+        self.edge_types = meta.edge_types[edge_type_field]
+
+        self.memo = get_node_memo(heap_snapshot)
+        self.memo_hits = 0
+        self.memo_misses = 0
+
+        self._nodes: Dict[int, tuple] = {}
+        self._edges: Dict[int, List[Tuple[Optional[str], int]]] = {}
+
+    def get_node_row(self, node_index: int) -> np.ndarray:
+        return get_node_at_index(self.heap_snapshot, node_index)
+
+    @functools.cached_property
+    def index(self) -> SnapshotIndex:
+        return get_snapshot_index(self.heap_snapshot)
+
+    def get_node_edge_rows(self, node_index: int) -> np.ndarray:
+        edge_range = self.index.get_node_edge_range(node_index)
+        return get_edge_rows(self.heap_snapshot, edge_range.start, edge_range.stop)
+
+    def get_node(self, node_index: int) -> tuple:
+        """
+        NodeMemo entry of a node, read from the snapshot when it is not memoized
+        """
+        node = self._nodes.get(node_index)
+
+        if node is not None:
+            return node
+
+        node = self.memo.get(node_index)
+
+        if node is None:
+            self.memo_misses += 1
+            row = self.get_node_row(node_index)
+            node_type, name = self.node_types[int(row[self.node_type_field])], int(row[self.node_name_field])
+
+            if node_type == 'object':
+                kind = OBJECT_KINDS.get(self.strings[name])
+            elif node_type in VALUE_NODE_TYPES:
+                kind = node_type
+            else:
+                # booleans and null are hidden nodes told apart by their edges, see get_kind
+                kind = UNKNOWN_KIND if node_type == 'hidden' else None
+
+            node = (node_type, name, None, kind)
+            self.memo.put(node_index, node)
+        else:
+            self.memo_hits += 1
+
+        self._nodes[node_index] = node
+        return node
+
+    def get_node_type(self, node_index: int) -> str:
+        return self.get_node(node_index)[0]
+
+    def get_node_name(self, node_index: int) -> str:
+        return self.strings[self.get_node(node_index)[1]]
+
+    def update_node(self, node_index: int, edges: Optional[tuple] = None, kind: Any = UNKNOWN_KIND) -> tuple:
+        node_type, name, node_edges, node_kind = self.get_node(node_index)
+        node = self._nodes[node_index] = (
+            node_type,
+            name,
+            node_edges if edges is None else edges,
+            node_kind if kind is UNKNOWN_KIND else kind
         )
-    )
-
-    if graph['node']['type'] != 'object':
-        raise ValueError(f"Node '{node_id}' is not object, cannot build object")
-
-    log.debug(f"compiling graph node object {node_id}")
-    return await compile_graph_node_object(graph)
-
-async def compile_graph_node_object(graph: HeapSnapshotStructuredGraph) -> BuiltHeapValue:
-    node = graph['node']
-    node_type = node['type']
-    node_name = node['name']
-
-    edges = [edge for edge in graph['edges'] if await filter_edge(edge)]
-
-    if node_type == 'array':
-        return [await compile_graph_node_object(edge['graph']) for edge in edges]
-
-    elif node_type == 'object':
-        if node_name == 'Object':
-            return {
-                edge['edge']['name']: await compile_graph_node_object(edge['graph'])
-                for edge in edges
-            }
-        elif node_name == 'Array':
-            return await compile_graph_node_object({
-                **graph,
-                'node': {**graph['node'], 'type': 'array'}
-            })
+        self.memo.put(node_index, node)
+        return node
+
+    def read_edges(self, node_index: int) -> Tuple[Tuple[Optional[str], bool, int], ...]:
+        edges = []
+
+        for edge_type, name_or_index, to_node in self.get_node_edge_rows(node_index)[:, self.edge_columns].tolist():
+            edge_type = self.edge_types[edge_type]
+            child_index = to_node // self.node_field_count
+
+            if edge_type in INDEX_EDGE_TYPES:
+                edges.append((None, False, child_index))
+                continue
+
+            name = self.strings[name_or_index]
+
+            if name == 'value':
+                edges.append((name, False, child_index))
+            elif edge_type == 'property' and name != '__proto__':
+                edges.append((name, True, child_index))
+
+        return tuple(edges)
+
+    def get_memoized_edges(self, node_index: int) -> Tuple[Tuple[Optional[str], bool, int], ...]:
+        edges = self.get_node(node_index)[2]
+
+        if edges is None:
+            edges = self.update_node(node_index, edges=self.read_edges(node_index))[2]
+
+        return edges
+
+    def get_edges(self, node_index: int) -> List[Tuple[Optional[str], int]]:
+        """
+        (property name or None for element and hidden edges, child node index) of the
+        edges of a node that build_object_from_node_id follows
+        """
+        edges = self._edges.get(node_index)
+
+        if edges is not None:
+            return edges
+
+        edges = self._edges[node_index] = [
+            (name, child_index)
+            for name, filtered, child_index in self.get_memoized_edges(node_index)
+            if not filtered or self.property_filter(name)
+        ]
+
+        return edges
+
+    def get_kind(self, node_index: int) -> Optional[str]:
+        """
+        What a node compiles to: object, array, string, number, regexp, boolean or null,
+        None for nodes that are left out of built values
+        """
+        kind = self.get_node(node_index)[3]
+
+        if kind is not UNKNOWN_KIND:
+            return kind
+
+        # kinds are shared by the compilers of the snapshot, so they do not depend on the property filter
+        names = {self.get_node_name(child_index) for _, _, child_index in self.get_memoized_edges(node_index)}
+        kind = None
+
+        if 'boolean' in names:
+            kind = 'boolean'
+        elif 'object' in names and 'null' in names:
+            kind = 'null'
+
+        self.update_node(node_index, kind=kind)
+        return kind
+
+    def iter_value_edges(self, node_index: int, ancestors: Counter) -> Iterator[Tuple[Optional[str], int]]:
+        """
+        Edges of a node to children that compile to a value, edges back to the node or one of ancestors are circular and
+        skipped unless refs are emitted, compile outputs them as a $ref to the ancestor
+        """
+        refs = self.budget.refs
+
+        for key, child_index in self.get_edges(node_index):
+            if (refs or (child_index != node_index and not ancestors[child_index])) and self.get_kind(child_index) is not None:
+                yield key, child_index
+
+    def create_value(self, node_index: int, ancestors: Counter) -> BuiltHeapValue:
+        """
+        The value of a node, containers are returned empty and filled in by compile
+        """
+        self.nodes_visited += 1
+        kind = self.get_kind(node_index)
+
+        if kind == 'array':
+            return []
+        elif kind == 'object':
+            return {}
+        elif kind == 'string':
+            return self.get_node_name(node_index)
+        elif kind == 'regexp':
+            return re.compile(self.get_node_name(node_index))
+        elif kind == 'number':
+            for key, child_index in self.iter_value_edges(node_index, ancestors):
+                if key == 'value':
+                    return float(self.get_node_name(child_index))
+
+            raise ValueError(f"Unable to find the value of number node at index {node_index}")
+        elif kind == 'boolean':
+            for _, child_index in self.iter_value_edges(node_index, ancestors):
+                if self.get_node_type(child_index) == 'string':
+                    return self.get_node_name(child_index) == 'true'
+
+            raise ValueError(f"Unable to find the value of boolean node at index {node_index}")
+        elif kind == 'null':
+            return None
         else:
-            raise ValueError(f"Unknown or unsupported object with type '{node_name}'")
+            raise ValueError(f"Unknown graph node type '{self.get_node_type(node_index)}', unable to compile graph object")
 
-    elif node_type == 'string':
-        return node['name']
+    def get_node_id(self, node_index: int) -> int:
+        return int(self.get_node_row(node_index)[self.node_id_field])
 
-    elif node_type == 'regexp':
-        return re.compile(node['name'])
+    def truncated(self, reason: str, node_index: int) -> Dict[str, Any]:
+        count("build.truncated")
+        return {'$truncated': reason, 'nodeId': self.get_node_id(node_index)}
 
-    elif node_type == 'number':
-        return float(next(edge for edge in edges if edge['edge']['name'] == 'value')['graph']['node']['name'])
+    def get_exhausted_budget(self) -> Optional[str]:
+        if self.budget.max_nodes is not None and self.nodes_visited >= self.budget.max_nodes:
+            return 'nodes'
 
-    elif await is_boolean(graph):
-        return next(edge for edge in edges if edge['graph']['node']['type'] == 'string')['graph']['node']['name'] == 'true'
+        if self.budget.max_bytes is not None and self.output_bytes >= self.budget.max_bytes:
+            return 'bytes'
 
-    elif await is_null(graph):
         return None
-    else:
-        raise ValueError(f"Unknown graph node type '{node_type}', unable to compile graph object")
-
-async def is_boolean(graph: HeapSnapshotStructuredGraph) -> bool:
-    return (
-        graph['node']['type'] == 'hidden' and
-        any(edge['graph']['node']['name'] == 'boolean' for edge in graph['edges'])
-    )
-
-async def is_null(graph: HeapSnapshotStructuredGraph) -> bool:
-    return (
-        graph['node']['type'] == 'hidden' and
-        any(edge['graph']['node']['name'] == 'object' for edge in graph['edges']) and
-        any(edge['graph']['node']['name'] == 'null' for edge in graph['edges'])
-    )
-
-async def filter_edge(edge: Dict) -> bool:
-    edge_node_type = edge.get('graph', {}).get('node', {}).get('type')
-
-    if not edge_node_type:
-        return False
-
-    if edge_node_type == 'object':
-        return edge['graph']['node']['name'] in ['Array', 'Object']
-    else:
-        return edge_node_type in ['array', 'string', 'number', 'regexp'] or await is_boolean(edge['graph']) or await is_null(edge['graph'])
+
+    def add_value(self, container: BuiltHeapValue, key: Optional[str], value: BuiltHeapValue) -> None:
+        if isinstance(container, list):
+            container.append(value)
+        else:
+            container[key] = value
+            self.output_bytes += len(str(key)) + 3
+
+        # a separator and the value written as JSON, containers are counted as their content is added
+        if isinstance(value, str):
+            self.output_bytes += len(value) + 3
+        elif isinstance(value, re.Pattern):
+            self.output_bytes += len(value.pattern) + 3
+        elif isinstance(value, (list, dict)) and not value:
+            self.output_bytes += 3
+        else:
+            self.output_bytes += len(repr(value)) + 1
+
+    def compile(self, node_index: int) -> BuiltHeapValue:
+        if self.get_kind(node_index) not in CONTAINER_KINDS:
+            raise ValueError(f"Unknown or unsupported object with type '{self.get_node_name(node_index)}'")
+
+        budget = self.budget
+
+        # Depth first walk with an explicit stack of (container, node index, value edges, JSON pointer) frames.
+        # ancestors counts the node of every frame below the top one, which is what an edge of the top
+        # frame is checked against to be circular.
+        ancestors = Counter()
+        root = self.create_value(node_index, ancestors)
+        stack = [(root, node_index, self.iter_value_edges(node_index, ancestors), '')]
+        self.output_bytes = 2
+
+        # container node index -> JSON pointer of its first occurrence, when emitting refs
+        pointers: Dict[int, str] = {node_index: ''}
+
+        while stack:
+            container, frame_index, edges, pointer = stack[-1]
+            edge = next(edges, None)
+
+            if edge is not None and budget.max_elements is not None and isinstance(container, list) and len(container) >= budget.max_elements:
+                self.add_value(container, None, self.truncated('elements', frame_index))
+                edge = None
+
+            if edge is None:
+                stack.pop()
+                if stack:
+                    ancestors[stack[-1][1]] -= 1
+                continue
+
+            key, child_index = edge
+            is_container = self.get_kind(child_index) in CONTAINER_KINDS
+            exhausted = self.get_exhausted_budget()
+
+            if exhausted:
+                self.add_value(container, key, self.truncated(exhausted, child_index))
+                break
+
+            if is_container and budget.refs and child_index in pointers:
+                self.add_value(container, key, {'$ref': self.get_node_id(child_index), 'path': pointers[child_index]})
+                continue
+
+            if is_container and budget.max_depth is not None and len(stack) > budget.max_depth:
+                self.add_value(container, key, self.truncated('depth', child_index))
+                continue
+
+            ancestors[frame_index] += 1
+            value = self.create_value(child_index, ancestors)
+            self.add_value(container, key, value)
+
+            if not is_container:
+                ancestors[frame_index] -= 1
+                continue
+
+            child_pointer = None
+
+            if budget.refs:
+                child_key = len(container) - 1 if isinstance(container, list) else key
+                child_pointer = pointers[child_index] = f"{pointer}/{str(child_key).replace('~', '~0').replace('/', '~1')}"
+
+            stack.append((value, child_index, self.iter_value_edges(child_index, ancestors), child_pointer))
+
+        return root
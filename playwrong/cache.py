@@ -0,0 +1,186 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+import logging
+import numpy as np
+from typing import Dict, Optional, Sequence
+
+from .index import SnapshotIndex, SortedNodeIdLookup
+from .models import ColumnarHeapSnapshot, Snapshot
+from .parser import parse_heap_snapshot_path
+from .snapshot import get_node_column, get_snapshot_index
+from .stats import count, timed
+from .strings import CachedStringTable
+
+log = logging.getLogger("heapsnapshot.cache")
+
+CACHE_SUFFIX = ".pwcache"
+CACHE_MAGIC = b"PWRONGSC"
+CACHE_VERSION = 1
+CACHE_ALIGNMENT = 64
+HASH_CHUNK_SIZE = 1 << 20
+
+# magic, version, header length
+CACHE_PREAMBLE = struct.Struct("<8sIQ")
+
+def align(size: int) -> int:
+    return -(-size // CACHE_ALIGNMENT) * CACHE_ALIGNMENT
+
+def get_cache_path(snapshot_path: str) -> str:
+    return f"{snapshot_path}{CACHE_SUFFIX}"
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def encode_strings(strings: Sequence[str]) -> tuple[np.ndarray, bytes]:
+    encoded = [string.encode("utf-8", "surrogatepass") for string in strings]
+
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+
+    return offsets, b"".join(encoded)
+
+def write_snapshot_cache(heap_snapshot: ColumnarHeapSnapshot, cache_path: str, source_hash: str) -> None:
+    log.debug(f"writing snapshot cache {cache_path}")
+
+    index = get_snapshot_index(heap_snapshot)
+    node_id_lookup = SortedNodeIdLookup.from_node_ids(get_node_column(heap_snapshot, "id"))
+    string_offsets, string_data = encode_strings(heap_snapshot.strings)
+
+    arrays: Dict[str, np.ndarray] = {
+        "nodes": heap_snapshot.nodes,
+        "edges": heap_snapshot.edges,
+        "string_offsets": string_offsets,
+        "string_data": np.frombuffer(string_data, dtype=np.uint8),
+        "first_edge_offsets": index.first_edge_offsets,
+        "edge_owners": index.edge_owners,
+        "sorted_node_ids": node_id_lookup.sorted_node_ids,
+        "node_order": node_id_lookup.node_order,
+        "trace_function_infos": heap_snapshot.trace_function_infos,
+        "samples": heap_snapshot.samples,
+        "locations": heap_snapshot.locations,
+    }
+
+    header = {
+        "source_hash": source_hash,
+        "snapshot": heap_snapshot.snapshot.model_dump(),
+        "trace_tree": heap_snapshot.trace_tree,
+        "arrays": {},
+    }
+
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        header["arrays"][name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset += align(array.nbytes)
+
+    encoded_header = json.dumps(header).encode()
+    data_start = align(CACHE_PREAMBLE.size + len(encoded_header))
+
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CACHE_PREAMBLE.pack(CACHE_MAGIC, CACHE_VERSION, len(encoded_header)))
+        f.write(encoded_header)
+
+        for name, array in arrays.items():
+            f.seek(data_start + header["arrays"][name]["offset"])
+            f.write(array.data)
+
+        f.truncate(data_start + offset)
+
+    os.replace(tmp_path, cache_path)
+
+def load_snapshot_cache(cache_path: str, source_hash: Optional[str] = None) -> Optional[ColumnarHeapSnapshot]:
+    """
+    Memory-map a snapshot cache, returns None if it is missing, unreadable or was built from a different source file
+    """
+    if not os.path.exists(cache_path):
+        return None
+
+    with open(cache_path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+
+    magic, version, header_length = CACHE_PREAMBLE.unpack_from(buffer) if len(buffer) >= CACHE_PREAMBLE.size else (None, None, 0)
+
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        log.debug(f"ignoring snapshot cache {cache_path} with unknown format")
+        return None
+
+    header = json.loads(buffer[CACHE_PREAMBLE.size:CACHE_PREAMBLE.size + header_length])
+
+    if source_hash is not None and header["source_hash"] != source_hash:
+        log.debug(f"snapshot cache {cache_path} is stale")
+        return None
+
+    data_start = align(CACHE_PREAMBLE.size + header_length)
+
+    arrays = {
+        name: np.frombuffer(
+            buffer,
+            dtype=np.dtype(array["dtype"]),
+            count=int(np.prod(array["shape"])),
+            offset=data_start + array["offset"],
+        ).reshape(array["shape"])
+        for name, array in header["arrays"].items()
+    }
+
+    heap_snapshot = ColumnarHeapSnapshot.model_construct(
+        snapshot=Snapshot.model_validate(header["snapshot"]),
+        nodes=arrays["nodes"],
+        edges=arrays["edges"],
+        strings=CachedStringTable(arrays["string_offsets"], arrays["string_data"]),
+        trace_function_infos=arrays["trace_function_infos"],
+        samples=arrays["samples"],
+        trace_tree=header["trace_tree"],
+        locations=arrays["locations"],
+    )
+
+    heap_snapshot._index = SnapshotIndex(
+        arrays["first_edge_offsets"],
+        SortedNodeIdLookup(arrays["sorted_node_ids"], arrays["node_order"]),
+        arrays["edge_owners"],
+    )
+
+    heap_snapshot._cache_path = cache_path
+
+    log.debug(f"loaded snapshot cache {cache_path}")
+    return heap_snapshot
+
+def load_heap_snapshot(snapshot_path: str, use_cache: bool = False) -> ColumnarHeapSnapshot:
+    """
+    Load a heap snapshot file, when use_cache is set a binary sidecar is memory-mapped
+    if it is up to date with the snapshot file, otherwise it is (re)written after parsing
+    """
+    if not use_cache:
+        return parse_heap_snapshot_path(snapshot_path)
+
+    cache_path = get_cache_path(snapshot_path)
+
+    with timed("snapshot_cache.load"):
+        source_hash = hash_file(snapshot_path)
+        heap_snapshot = load_snapshot_cache(cache_path, source_hash)
+
+    if heap_snapshot is not None:
+        count("snapshot_cache.hits")
+        return heap_snapshot
+
+    count("snapshot_cache.misses")
+
+    heap_snapshot = parse_heap_snapshot_path(snapshot_path)
+
+    with timed("snapshot_cache.write"):
+        write_snapshot_cache(heap_snapshot, cache_path, source_hash)
+
+    return heap_snapshot
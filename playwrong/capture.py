@@ -0,0 +1,171 @@
+import re
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, TextIO, Tuple, Union
+
+from playwright.async_api import Browser, BrowserContext, async_playwright
+
+from .compression import COMPRESSION_SUFFIXES, open_snapshot_writer
+from .models import ColumnarHeapSnapshot
+from .parser import HeapSnapshotParser
+from .snapshot import get_snapshot_index
+from .stats import get_stats, timed
+
+log = logging.getLogger('heapsnapshot.capture')
+
+HEAP_SNAPSHOT_PARAMS = {'reportProgress': True, 'captureNumericValue': True}
+
+ProgressCallback = Callable[[int, int], None]
+
+class CaptureSession:
+    """
+    State of a single heap snapshot capture: the incremental parser the CDP chunks
+    are fed into and, optionally, the file the raw chunks are written to. Without
+    parse, chunks are only written and nothing is held in memory.
+    """
+
+    def __init__(self, url: str, output_file: Optional[TextIO] = None, parse: bool = True):
+        self.url = url
+        self.output_file = output_file
+        self.parser = HeapSnapshotParser() if parse else None
+        self.size = 0
+        self.chunk_count = 0
+        self.error: Optional[Exception] = None
+        # chunks are delivered by CDP event handlers, outside of the caller's context
+        self.stats = get_stats()
+
+    def add_chunk(self, chunk: Dict[str, Any]) -> None:
+        if self.error:
+            return
+
+        chunk = chunk['chunk']
+
+        self.size += len(chunk)
+        self.chunk_count += 1
+
+        if self.stats:
+            self.stats.count("capture.chunks")
+            self.stats.count("capture.characters", len(chunk))
+
+        try:
+            if self.output_file:
+                self.output_file.write(chunk)
+
+            if self.parser is None:
+                return
+
+            if self.stats:
+                with self.stats.timer("parse"):
+                    self.parser.feed(chunk)
+            else:
+                self.parser.feed(chunk)
+        except (OSError, ValueError) as e:
+            log.error(f"Error when processing heap snapshot chunk for {self.url}: {e}")
+            self.error = e
+
+    def close(self) -> Optional[ColumnarHeapSnapshot]:
+        if self.error:
+            raise self.error
+
+        log.debug(f"heap snapshot for {self.url}: {self.chunk_count} chunks, {self.size} characters")
+
+        if self.parser is None:
+            return None
+
+        if self.stats:
+            with self.stats.timer("parse"):
+                heap_snapshot = self.parser.close()
+        else:
+            heap_snapshot = self.parser.close()
+
+        get_snapshot_index(heap_snapshot)
+        return heap_snapshot
+
+async def capture_heap_snapshot(
+    browser: Union[Browser, BrowserContext],
+    url: str,
+    output_file: Optional[TextIO] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    parse: bool = True
+) -> Optional[ColumnarHeapSnapshot]:
+    """
+    Open url in a new browser context (or a new page of the given context) and capture its heap snapshot.
+    Without parse the snapshot is only written to output_file and None is returned.
+    """
+    context = await browser.new_context() if isinstance(browser, Browser) else browser
+    page = await context.new_page()
+
+    try:
+        await page.goto(url)
+
+        session = CaptureSession(url, output_file, parse)
+        cdp_session = await context.new_cdp_session(page)
+        cdp_session.on("HeapProfiler.addHeapSnapshotChunk", session.add_chunk)
+        cdp_session.on("error", lambda e: log.error(f"Error when capturing heap snapshot for {url}: {e}"))
+
+        if on_progress:
+            cdp_session.on("HeapProfiler.reportHeapSnapshotProgress", lambda progress: on_progress(progress['done'], progress['total']))
+
+        with timed("capture"):
+            await cdp_session.send("HeapProfiler.takeHeapSnapshot", HEAP_SNAPSHOT_PARAMS)
+        await cdp_session.detach()
+    finally:
+        if context is browser:
+            await page.close()
+        else:
+            await context.close()
+
+    return session.close()
+
+def get_snapshot_filename(position: int, url: str, compression: Optional[str] = None) -> str:
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', re.sub(r'^[a-z]+://', '', url)).strip('-')[:64]
+    return f"{position:04d}-{slug or 'snapshot'}.heapsnapshot{COMPRESSION_SUFFIXES[compression] if compression else ''}"
+
+async def capture_heap_snapshots(
+    urls: List[str],
+    concurrency: int = 4,
+    output_dir: Optional[Path] = None,
+    browser: Optional[Browser] = None,
+    parse: bool = True,
+    compression: Optional[str] = None
+) -> AsyncIterator[Tuple[str, Union[ColumnarHeapSnapshot, Exception, None]]]:
+    """
+    Capture the heap snapshots of several URLs with one shared browser, at most concurrency
+    at a time, each in its own context. (url, snapshot) pairs are yielded as captures
+    complete, a failed capture yields its exception instead of a snapshot and, without
+    parse, snapshots are only written to output_dir (compressed with compression) and None is yielded.
+    """
+    if browser is None:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch()
+            try:
+                async for result in capture_heap_snapshots(urls, concurrency, output_dir, browser, parse, compression):
+                    yield result
+            finally:
+                await browser.close()
+        return
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def capture(position: int, url: str) -> Tuple[str, Union[ColumnarHeapSnapshot, Exception, None]]:
+        async with semaphore:
+            log.debug(f"capturing heap snapshot for {url}")
+            try:
+                if output_dir is None:
+                    return url, await capture_heap_snapshot(browser, url, parse=parse)
+
+                with open_snapshot_writer(str(output_dir / get_snapshot_filename(position, url, compression)), compression) as output_file:
+                    return url, await capture_heap_snapshot(browser, url, output_file, parse=parse)
+            except Exception as e:
+                log.error(f"Error when capturing heap snapshot for {url}: {e}")
+                return url, e
+
+    tasks = [asyncio.create_task(capture(position, url)) for position, url in enumerate(urls)]
+
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,89 @@
+import io
+import gzip
+import logging
+from typing import BinaryIO, Optional, TextIO, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+log = logging.getLogger('heapsnapshot.compression')
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+COMPRESSION_MAGIC = {'gzip': b'\x1f\x8b', 'zstd': b'\x28\xb5\x2f\xfd'}
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+def require_compression(compression: str) -> None:
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unknown compression '{compression}', expected one of {', '.join(COMPRESSION_SUFFIXES)}")
+
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError("zstandard is required for zstd compressed snapshots, install playwrong with the 'zstd' extra")
+
+def get_compression_for_path(path: str) -> Optional[str]:
+    """
+    Compression implied by the suffix of a file name, None when it has none of COMPRESSION_SUFFIXES
+    """
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+
+    return None
+
+def detect_compression(path: str) -> Optional[str]:
+    """
+    Compression of a file from its magic bytes, None for an uncompressed file
+    """
+    with open(path, 'rb') as snapshot_file:
+        header = snapshot_file.read(max(len(magic) for magic in COMPRESSION_MAGIC.values()))
+
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if header.startswith(magic):
+            return compression
+
+    return None
+
+def open_compressed_writer(output_file: BinaryIO, compression: str) -> TextIO:
+    """
+    Text stream compressing what is written to it into output_file as it goes. Closing it
+    finishes the compressed stream but leaves output_file open.
+    """
+    require_compression(compression)
+
+    if compression == 'gzip':
+        stream = gzip.GzipFile(fileobj=output_file, mode='wb', compresslevel=GZIP_LEVEL)
+    else:
+        stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(output_file, closefd=False)
+
+    return io.TextIOWrapper(stream, encoding='utf-8')
+
+def open_snapshot_writer(path: str, compression: Optional[str] = None) -> TextIO:
+    """
+    Open a snapshot file for writing as text, compressed as it is written when compression is given
+    """
+    if compression is None:
+        return open(path, 'w', encoding='utf-8')
+
+    require_compression(compression)
+
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=GZIP_LEVEL)
+
+    return zstandard.open(path, 'wt', cctx=zstandard.ZstdCompressor(level=ZSTD_LEVEL), encoding='utf-8')
+
+def open_snapshot_reader(path: str, compression: str, binary: bool = False) -> Union[TextIO, BinaryIO]:
+    """
+    Open a compressed snapshot file as text (or bytes when binary is set), decompressed as it is read
+    """
+    require_compression(compression)
+    log.debug(f"reading {compression} compressed snapshot {path}")
+
+    mode, encoding = ('rb', None) if binary else ('rt', 'utf-8')
+
+    if compression == 'gzip':
+        return gzip.open(path, mode, encoding=encoding)
+
+    return zstandard.open(path, mode, encoding=encoding)
@@ -0,0 +1,112 @@
+import logging
+import numpy as np
+from typing import Any, Dict, List, Tuple
+
+from .models import HeapSnapshot
+from .snapshot import get_node_column
+from .stats import count, timed
+from .summary import decode_node_group, get_node_groups
+
+log = logging.getLogger("heapsnapshot.diff")
+
+# largest id table, relative to the number of nodes joined, before falling back to a sorted join
+MAX_ID_TABLE_RATIO = 8
+
+def aggregate_nodes(heap_snapshot: HeapSnapshot, groups: np.ndarray, sizes: np.ndarray) -> Dict[Tuple[str, str], Tuple[int, int]]:
+    """
+    (type, name) -> (node count, total size) of the given nodes
+    """
+    unique_groups, inverse = np.unique(groups, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(unique_groups))
+    totals = np.bincount(inverse, weights=sizes, minlength=len(unique_groups))
+
+    return {
+        decode_node_group(heap_snapshot, group): (int(group_count), int(total))
+        for group, group_count, total in zip(unique_groups.tolist(), counts.tolist(), totals.tolist())
+    }
+
+def match_node_ids(before_ids: np.ndarray, after_ids: np.ndarray) -> np.ndarray:
+    """
+    Index in before of every node of after with the same id, -1 for new nodes. Node ids are
+    usually dense enough for a direct address table to do the join in linear time, a sorted
+    lookup is used when they are too sparse for one.
+    """
+    if not len(before_ids) or not len(after_ids):
+        return np.full(len(after_ids), -1, dtype=np.int64)
+
+    table_size = int(max(before_ids.max(), after_ids.max())) + 1
+
+    if table_size <= MAX_ID_TABLE_RATIO * (len(before_ids) + len(after_ids)):
+        before_index_by_id = np.full(table_size, -1, dtype=np.int32 if len(before_ids) < 2 ** 31 else np.int64)
+        before_index_by_id[before_ids] = np.arange(len(before_ids))
+        return before_index_by_id[after_ids].astype(np.int64)
+
+    log.debug(f"node ids up to {table_size} are too sparse for an id table, joining sorted ids")
+
+    order = np.argsort(before_ids, kind="stable")
+    positions = np.minimum(np.searchsorted(before_ids, after_ids, sorter=order), len(before_ids) - 1)
+    matches = order[positions].astype(np.int64)
+
+    return np.where(before_ids[matches] == after_ids, matches, -1)
+
+def diff_snapshots(before: HeapSnapshot, after: HeapSnapshot) -> List[Dict[str, Any]]:
+    """
+    Compare two snapshots of the same page joined on node id. For every (type, name) group, returns the
+    nodes only in after (added), only in before (removed) and in both with a larger (grown) or smaller
+    (shrunk) self size in after, with their counts and sizes, largest size delta first. Grown and shrunk
+    sizes are by how much the nodes changed.
+    """
+    with timed("diff"):
+        before_ids, after_ids = get_node_column(before, "id"), get_node_column(after, "id")
+        before_sizes, after_sizes = get_node_column(before, "self_size"), get_node_column(after, "self_size")
+
+        matches = match_node_ids(before_ids, after_ids)
+        added = matches == -1
+
+        kept = np.zeros(len(before_ids), dtype=bool)
+        kept[matches[~added]] = True
+
+        growth = np.zeros(len(after_ids), dtype=np.int64)
+        growth[~added] = after_sizes[~added].astype(np.int64) - before_sizes[matches[~added]]
+        grown = growth > 0
+        shrunk = growth < 0
+
+        before_groups, after_groups = get_node_groups(before), get_node_groups(after)
+
+        aggregates = {
+            "added": aggregate_nodes(after, after_groups[added], after_sizes[added]),
+            "removed": aggregate_nodes(before, before_groups[~kept], before_sizes[~kept]),
+            "grown": aggregate_nodes(after, after_groups[grown], growth[grown]),
+            "shrunk": aggregate_nodes(after, after_groups[shrunk], -growth[shrunk]),
+        }
+
+    count("diff.added", int(added.sum()))
+    count("diff.removed", int((~kept).sum()))
+    count("diff.grown", int(grown.sum()))
+    count("diff.shrunk", int(shrunk.sum()))
+
+    groups = sorted({group for aggregate in aggregates.values() for group in aggregate})
+    results = []
+
+    for node_type, name in groups:
+        added_count, added_size = aggregates["added"].get((node_type, name), (0, 0))
+        removed_count, removed_size = aggregates["removed"].get((node_type, name), (0, 0))
+        grown_count, grown_size = aggregates["grown"].get((node_type, name), (0, 0))
+        shrunk_count, shrunk_size = aggregates["shrunk"].get((node_type, name), (0, 0))
+
+        results.append({
+            'type': node_type,
+            'name': name,
+            'addedCount': added_count,
+            'removedCount': removed_count,
+            'grownCount': grown_count,
+            'shrunkCount': shrunk_count,
+            'countDelta': added_count - removed_count,
+            'addedSize': added_size,
+            'removedSize': removed_size,
+            'grownSize': grown_size,
+            'shrunkSize': shrunk_size,
+            'sizeDelta': added_size - removed_size + grown_size - shrunk_size,
+        })
+
+    return sorted(results, key=lambda result: (-result['sizeDelta'], -result['countDelta']))
@@ -0,0 +1,81 @@
+import logging
+import numpy as np
+from typing import Mapping
+
+log = logging.getLogger("heapsnapshot.index")
+
+class SnapshotIndex:
+    """
+    Lookup tables for a heap snapshot, built in a single pass over the node columns.
+
+    first_edge_offsets: prefix sum of node edge counts, node index -> index of its first edge (node_count + 1 entries)
+    node_index_by_id: node id -> node index, a dict or a SortedNodeIdLookup
+    edge_owners: edge index -> index of the node owning the edge
+    """
+
+    def __init__(self, first_edge_offsets: np.ndarray, node_index_by_id: Mapping[int, int], edge_owners: np.ndarray):
+        self.first_edge_offsets = first_edge_offsets
+        self.node_index_by_id = node_index_by_id
+        self.edge_owners = edge_owners
+
+    @property
+    def node_count(self) -> int:
+        return len(self.first_edge_offsets) - 1
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_owners)
+
+    def get_node_index(self, node_id: int) -> int:
+        try:
+            return self.node_index_by_id[int(node_id)]
+        except KeyError:
+            raise ValueError(f"Unable to find node with id '{node_id}'") from None
+
+    def get_node_edge_range(self, node_index: int) -> range:
+        return range(int(self.first_edge_offsets[node_index]), int(self.first_edge_offsets[node_index + 1]))
+
+    def get_edge_owner(self, edge_index: int) -> int:
+        if not 0 <= edge_index < self.edge_count:
+            raise ValueError(f"Unable to find parent node for edge '{edge_index}'")
+
+        return int(self.edge_owners[edge_index])
+
+class SortedNodeIdLookup:
+    """
+    node id -> node index mapping backed by sorted arrays, used when the index is
+    loaded from a memory-mapped cache instead of being built in memory
+    """
+
+    def __init__(self, sorted_node_ids: np.ndarray, node_order: np.ndarray):
+        self.sorted_node_ids = sorted_node_ids
+        self.node_order = node_order
+
+    def __getitem__(self, node_id: int) -> int:
+        position = int(np.searchsorted(self.sorted_node_ids, node_id))
+
+        if position >= len(self.sorted_node_ids) or self.sorted_node_ids[position] != node_id:
+            raise KeyError(node_id)
+
+        return int(self.node_order[position])
+
+    def __len__(self) -> int:
+        return len(self.sorted_node_ids)
+
+    @classmethod
+    def from_node_ids(cls, node_ids: np.ndarray) -> 'SortedNodeIdLookup':
+        node_order = np.argsort(node_ids, kind='stable').astype(np.int32)
+        return cls(np.asarray(node_ids)[node_order], node_order)
+
+def build_snapshot_index(node_ids: np.ndarray, node_edge_counts: np.ndarray) -> SnapshotIndex:
+    log.debug(f"building snapshot index for {len(node_ids)} nodes")
+
+    node_edge_counts = np.asarray(node_edge_counts, dtype=np.int64)
+
+    first_edge_offsets = np.zeros(len(node_edge_counts) + 1, dtype=np.int64)
+    np.cumsum(node_edge_counts, out=first_edge_offsets[1:])
+
+    node_index_by_id = dict(zip(np.asarray(node_ids).tolist(), range(len(node_ids))))
+    edge_owners = np.repeat(np.arange(len(node_edge_counts), dtype=np.int32), node_edge_counts)
+
+    return SnapshotIndex(first_edge_offsets, node_index_by_id, edge_owners)
@@ -1,32 +1,12 @@
-from pydantic import BaseModel
-from typing import List, Optional, Union, Dict, Any
+import json
+import numpy as np
+from pydantic import BaseModel, ConfigDict, PrivateAttr, field_validator
+from typing import List, Optional, Sequence, Union, Dict, Any
 
 HeapSnapshotNode = List[int]
 HeapSnapshotEdge = List[int]
 MetaValue = Union[str, List[str]]
 
-class HeapSnapshotStructuredEdge(BaseModel):
-    id: int
-    type: str
-    name: Optional[str] = None
-    index: Optional[int] = None
-    nodeId: int
-
-class HeapSnapshotStructuredNode(BaseModel):
-    id: int
-    nodeIndex: int
-    type: str
-    name: str
-    size: int
-    edgeCount: int
-    traceNodeId: int
-    detachness: int
-    edgeIds: List[int]
-
-class HeapSnapshotStructuredGraph(BaseModel):
-    node: HeapSnapshotStructuredNode
-    edges: List[Dict[str, Union[bool, HeapSnapshotStructuredEdge, Optional['HeapSnapshotStructuredGraph']]]]
-
 class SnapshotMeta(BaseModel):
     node_fields: List[MetaValue]
     node_types: List[MetaValue]
@@ -53,6 +33,122 @@ class HeapSnapshot(BaseModel):
     trace_tree: List[int]
     locations: List[int]
 
+    _index: Optional[Any] = PrivateAttr(default=None)
+    _node_memo: Optional[Any] = PrivateAttr(default=None)
+    _retainer_graph: Optional[Any] = PrivateAttr(default=None)
+    _dominator_tree: Optional[Any] = PrivateAttr(default=None)
+    _shortest_retainer_edges: Optional[Any] = PrivateAttr(default=None)
+
+class ColumnarHeapSnapshot(BaseModel):
+    """
+    Heap snapshot with the flat node and edge arrays reshaped into integer matrices
+    of shape (node_count, len(node_fields)) and (edge_count, len(edge_fields))
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    snapshot: Snapshot
+    nodes: np.ndarray
+    edges: np.ndarray
+    strings: Sequence[str]
+    trace_function_infos: np.ndarray
+    samples: np.ndarray
+    trace_tree: List[Any] = []
+    locations: np.ndarray
+
+    _index: Optional[Any] = PrivateAttr(default=None)
+    _node_memo: Optional[Any] = PrivateAttr(default=None)
+    _retainer_graph: Optional[Any] = PrivateAttr(default=None)
+    _dominator_tree: Optional[Any] = PrivateAttr(default=None)
+    _shortest_retainer_edges: Optional[Any] = PrivateAttr(default=None)
+    _cache_path: Optional[str] = PrivateAttr(default=None)
+
+    @classmethod
+    def from_json(cls, json_data: Union[str, bytes]) -> 'ColumnarHeapSnapshot':
+        return cls.from_dict(json.loads(json_data))
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ColumnarHeapSnapshot':
+        snapshot = Snapshot.model_validate(data['snapshot'])
+
+        return cls.model_construct(
+            snapshot=snapshot,
+            nodes=reshape_fields(data['nodes'], len(snapshot.meta.node_fields), 'nodes'),
+            edges=reshape_fields(data['edges'], len(snapshot.meta.edge_fields), 'edges'),
+            strings=data['strings'],
+            trace_function_infos=np.asarray(data.get('trace_function_infos', []), dtype=np.int64),
+            samples=np.asarray(data.get('samples', []), dtype=np.int64),
+            trace_tree=data.get('trace_tree', []),
+            locations=np.asarray(data.get('locations', []), dtype=np.int64),
+        )
+
+    @classmethod
+    def from_heap_snapshot(cls, heap_snapshot: HeapSnapshot) -> 'ColumnarHeapSnapshot':
+        meta = heap_snapshot.snapshot.meta
+
+        return cls.model_construct(
+            snapshot=heap_snapshot.snapshot,
+            nodes=reshape_fields(heap_snapshot.nodes, len(meta.node_fields), 'nodes'),
+            edges=reshape_fields(heap_snapshot.edges, len(meta.edge_fields), 'edges'),
+            strings=heap_snapshot.strings,
+            trace_function_infos=np.asarray(heap_snapshot.trace_function_infos, dtype=np.int64),
+            samples=np.asarray(heap_snapshot.samples, dtype=np.int64),
+            trace_tree=heap_snapshot.trace_tree,
+            locations=np.asarray(heap_snapshot.locations, dtype=np.int64),
+        )
+
+def narrowest_int_dtype(values: np.ndarray) -> np.dtype:
+    if not len(values):
+        return np.dtype(np.int32)
+
+    info = np.iinfo(np.int32)
+    return np.dtype(np.int32) if info.min <= values.min() and values.max() <= info.max else np.dtype(np.int64)
+
+def reshape_fields(values: Union[List[int], np.ndarray], field_count: int, source: str) -> np.ndarray:
+    values = np.asarray(values)
+
+    if values.dtype.kind not in 'iu':
+        values = values.astype(np.int64)
+
+    if len(values) % field_count:
+        raise ValueError(f"Length of '{source}' ({len(values)}) is not a multiple of its field count ({field_count})")
+
+    return values.astype(narrowest_int_dtype(values), copy=False).reshape(-1, field_count)
+
+class BatchQuery(BaseModel):
+    name: str
+    properties: List[str]
+    ignore_properties: List[str] = []
+    # predicate expressions, see predicates.parse_predicate
+    where: List[str] = []
+
+    @field_validator('properties', 'ignore_properties', mode='before')
+    @classmethod
+    def split_comma_separated(cls, value: Any) -> Any:
+        return value.split(',') if isinstance(value, str) else value
+
+    @field_validator('where', mode='before')
+    @classmethod
+    def wrap_single_predicate(cls, value: Any) -> Any:
+        # predicates may contain commas, a string is a single one
+        return [value] if isinstance(value, str) else value
+
+class BuildBudget(BaseModel):
+    """
+    Limits on building a single object, None for no limit. Parts of the value past a limit
+    are replaced by a {"$truncated": reason, "nodeId": node id} marker.
+
+    max_depth: objects and arrays nested deeper are not expanded (reason "depth")
+    max_elements: arrays keep this many elements, the marker follows them (reason "elements", the array's node id)
+    max_nodes: nodes visited before building stops (reason "nodes")
+    max_bytes: approximate size of the value as JSON before building stops (reason "bytes")
+    refs: objects and arrays already in the value are output as {"$ref": node id, "path": JSON pointer to their first occurrence}
+    """
+    max_depth: Optional[int] = None
+    max_elements: Optional[int] = None
+    max_nodes: Optional[int] = None
+    max_bytes: Optional[int] = None
+    refs: bool = False
+
 BuiltHeapValue = Union[
     None,
     str,
@@ -0,0 +1,54 @@
+import re
+import json
+import logging
+from typing import Any, BinaryIO, Dict, Iterable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+log = logging.getLogger('heapsnapshot.output')
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, re.Pattern):
+        return value.pattern
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_json(value: Any) -> bytes:
+    """
+    Encode a built object as compact JSON, with orjson when it is installed. Regular
+    expressions are written as their pattern. Strings holding lone surrogates (which
+    orjson rejects) fall back to the standard library encoder, escaping them.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=json_default)
+        except orjson.JSONEncodeError:
+            pass
+
+    return json.dumps(value, default=json_default, separators=(',', ':')).encode()
+
+class NDJSONWriter:
+    """
+    Writes one JSON document per line, flushed as it is written so consumers can start on the first one
+    """
+
+    def __init__(self, output_file: BinaryIO):
+        self.output_file = output_file
+        self.count = 0
+
+    def write(self, document: Dict[str, Any]) -> None:
+        self.output_file.write(encode_json(document) + b"\n")
+        self.output_file.flush()
+        self.count += 1
+
+def write_ndjson(documents: Iterable[Dict[str, Any]], output_file: BinaryIO) -> int:
+    writer = NDJSONWriter(output_file)
+
+    for document in documents:
+        writer.write(document)
+
+    log.debug(f"wrote {writer.count} document(s)")
+    return writer.count
@@ -0,0 +1,307 @@
+import os
+import json
+import mmap
+import codecs
+import logging
+import numpy as np
+from json.decoder import scanstring
+from typing import Any, Callable, Dict, IO, List, Optional
+
+from .compression import detect_compression, open_snapshot_reader
+from .models import ColumnarHeapSnapshot
+from .stats import count, timed
+from .strings import STRINGS_KEY, LazyStringTable, find_strings_array
+
+log = logging.getLogger("heapsnapshot.parser")
+
+NUMBER_ARRAYS = ["nodes", "edges", "trace_function_infos", "samples", "locations"]
+STRING_ARRAYS = ["strings"]
+
+WHITESPACE = " \t\n\r"
+READ_CHUNK_SIZE = 1 << 20
+
+class IntBuffer:
+    """
+    Growable int32 buffer, upgraded to int64 when a value does not fit
+    """
+
+    def __init__(self, capacity: int = 0):
+        self._values = np.empty(max(capacity, 1024), dtype=np.int32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def extend(self, values: np.ndarray) -> None:
+        if not len(values):
+            return
+
+        if self._values.dtype == np.int32 and (values.min() < np.iinfo(np.int32).min or values.max() > np.iinfo(np.int32).max):
+            self._values = self._values.astype(np.int64)
+
+        required = self._size + len(values)
+        if required > len(self._values):
+            self._values = np.resize(self._values, max(required, len(self._values) * 2))
+
+        self._values[self._size:required] = values
+        self._size = required
+
+    def to_array(self) -> np.ndarray:
+        return self._values[:self._size]
+
+class HeapSnapshotParser:
+    """
+    Incremental parser for the JSON heap snapshot format.
+
+    Text is pushed with feed() as it arrives, number arrays are decoded straight into
+    typed buffers and strings into a list, so only the unconsumed tail of the input is
+    ever held as text. Parse errors are raised from feed(), or from close() if the
+    input ends early.
+    """
+
+    def __init__(self, buffer_factory: Callable[[str, int], IntBuffer] = lambda key, capacity: IntBuffer(capacity)):
+        self._buffer_factory = buffer_factory
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._key: Optional[str] = None
+        self._data: Dict[str, Any] = {}
+        self.bytes_fed = 0
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    @property
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        The "snapshot" header (meta and counts) once it has been parsed
+        """
+        return self._data.get("snapshot")
+
+    def feed(self, chunk: str) -> None:
+        self.bytes_fed += len(chunk)
+        self._buf = self._buf[self._pos:] + chunk if self._pos < len(self._buf) else chunk
+        self._pos = 0
+        self._parse(final=False)
+
+    def close(self) -> ColumnarHeapSnapshot:
+        self._parse(final=True)
+
+        if not self.done:
+            raise json.JSONDecodeError(f"Unexpected end of heap snapshot while parsing '{self._key or self._state}'", self._buf, self._pos)
+
+        log.debug(f"parsed heap snapshot: {self.bytes_fed} characters")
+
+        return ColumnarHeapSnapshot.from_dict({
+            key: value.to_array() if isinstance(value, IntBuffer) else value
+            for key, value in self._data.items()
+        })
+
+    def _skip_whitespace(self) -> None:
+        buf = self._buf
+        pos = self._pos
+
+        while pos < len(buf) and buf[pos] in WHITESPACE:
+            pos += 1
+
+        self._pos = pos
+
+    def _expect(self, char: str) -> None:
+        if self._buf[self._pos] != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self._buf, self._pos)
+
+        self._pos += 1
+
+    def _parse(self, final: bool) -> None:
+        while True:
+            if self._state == "numbers":
+                if not self._parse_numbers():
+                    return
+                continue
+
+            if self._state == "strings":
+                if not self._parse_strings(final):
+                    return
+                continue
+
+            self._skip_whitespace()
+
+            if self._pos >= len(self._buf) or self._state == "done":
+                return
+
+            if self._state == "start":
+                self._expect("{")
+                self._state = "key"
+
+            elif self._state == "key":
+                char = self._buf[self._pos]
+
+                if char == ",":
+                    self._pos += 1
+                elif char == "}":
+                    self._pos += 1
+                    self._state = "done"
+                elif char == '"':
+                    try:
+                        self._key, self._pos = scanstring(self._buf, self._pos + 1, False)
+                    except json.JSONDecodeError:
+                        if final:
+                            raise
+                        return
+                    self._state = "colon"
+                else:
+                    raise json.JSONDecodeError("Expecting property name enclosed in double quotes", self._buf, self._pos)
+
+            elif self._state == "colon":
+                self._expect(":")
+                self._state = "value"
+
+            elif self._state == "value":
+                if self._key in NUMBER_ARRAYS:
+                    self._expect("[")
+                    self._data[self._key] = self._buffer_factory(self._key, self._expected_size(self._key))
+                    self._state = "numbers"
+
+                elif self._key in STRING_ARRAYS:
+                    self._expect("[")
+                    self._data[self._key] = []
+                    self._state = "strings"
+
+                else:
+                    try:
+                        value, end = json.JSONDecoder().raw_decode(self._buf, self._pos)
+                    except json.JSONDecodeError:
+                        if final:
+                            raise
+                        return
+
+                    if end >= len(self._buf) and not final:
+                        return
+
+                    self._data[self._key] = value
+                    self._pos = end
+                    self._state = "key"
+
+    def _expected_size(self, key: str) -> int:
+        snapshot = self._data.get("snapshot")
+
+        if not snapshot or key not in ["nodes", "edges"]:
+            return 0
+
+        fields = snapshot["meta"][f"{key[:-1]}_fields"]
+        return snapshot.get(f"{key[:-1]}_count", 0) * len(fields)
+
+    def _parse_numbers(self) -> bool:
+        buf = self._buf
+        end = buf.find("]", self._pos)
+        closed = end != -1
+
+        if not closed:
+            end = buf.rfind(",", self._pos)
+            if end == -1:
+                return False
+
+        text = buf[self._pos:end]
+        if text and not text.isspace():
+            self._data[self._key].extend(np.fromstring(text, dtype=np.int64, sep=","))
+
+        self._pos = end + 1
+
+        if closed:
+            self._state = "key"
+
+        return closed
+
+    def _parse_strings(self, final: bool) -> bool:
+        buf = self._buf
+        strings: List[str] = self._data[self._key]
+
+        while True:
+            self._skip_whitespace()
+
+            if self._pos >= len(buf):
+                return False
+
+            char = buf[self._pos]
+
+            if char == ",":
+                self._pos += 1
+            elif char == "]":
+                self._pos += 1
+                self._state = "key"
+                return True
+            elif char == '"':
+                try:
+                    value, self._pos = scanstring(buf, self._pos + 1, False)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    return False
+                strings.append(value)
+            else:
+                raise json.JSONDecodeError("Expecting string", buf, self._pos)
+
+def parse_heap_snapshot_file(snapshot_file: IO[str], chunk_size: int = READ_CHUNK_SIZE) -> ColumnarHeapSnapshot:
+    parser = HeapSnapshotParser()
+
+    with timed("parse"):
+        while chunk := snapshot_file.read(chunk_size):
+            parser.feed(chunk)
+
+        heap_snapshot = parser.close()
+
+    count("parse.characters", parser.bytes_fed)
+    return heap_snapshot
+
+def parse_heap_snapshot_buffer(buffer: bytes, chunk_size: int = READ_CHUNK_SIZE) -> ColumnarHeapSnapshot:
+    """
+    Parse a heap snapshot from a bytes-like buffer (usually a memory-mapped file). The strings
+    array is cut out of what is fed to the parser and indexed into a LazyStringTable over the buffer instead.
+    """
+    strings_start = find_strings_array(buffer)
+    parser = HeapSnapshotParser()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def feed(start: int, end: int) -> None:
+        for position in range(start, end, chunk_size):
+            parser.feed(decoder.decode(buffer[position:min(position + chunk_size, end)]))
+
+    with timed("parse"):
+        if strings_start == -1:
+            feed(0, len(buffer))
+            parser.feed(decoder.decode(b"", final=True))
+            return parser.close()
+
+        strings, strings_end = LazyStringTable.from_buffer(buffer, strings_start + len(STRINGS_KEY))
+
+        feed(0, strings_start)
+        parser.feed('"strings":[]')
+        feed(strings_end, len(buffer))
+        parser.feed(decoder.decode(b"", final=True))
+
+        heap_snapshot = parser.close()
+        heap_snapshot.strings = strings
+
+    count("parse.characters", len(buffer))
+    return heap_snapshot
+
+def parse_heap_snapshot_path(path: str) -> ColumnarHeapSnapshot:
+    """
+    Memory-map a snapshot file and parse it with a lazily decoded string table. Compressed
+    snapshots are parsed as they are decompressed instead.
+    """
+    compression = detect_compression(path)
+
+    if compression is not None:
+        with open_snapshot_reader(path, compression) as snapshot_file:
+            return parse_heap_snapshot_file(snapshot_file)
+
+    with open(path, "rb") as snapshot_file:
+        if not os.fstat(snapshot_file.fileno()).st_size:
+            raise json.JSONDecodeError("Empty heap snapshot", "", 0)
+
+        # the string table keeps the mapping alive through its view of the buffer
+        buffer = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return parse_heap_snapshot_buffer(buffer)
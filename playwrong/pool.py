@@ -0,0 +1,71 @@
+import math
+import logging
+import tempfile
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from .models import BuildBudget, BuiltHeapValue, ColumnarHeapSnapshot, HeapSnapshot
+from .build_object import build_object_from_node_id
+from .cache import get_cache_path, load_snapshot_cache, write_snapshot_cache
+
+log = logging.getLogger('heapsnapshot.pool')
+
+# chunks handed out per worker, more than one so uneven object sizes balance out
+CHUNKS_PER_WORKER = 4
+
+WORKER_SNAPSHOT: Optional[ColumnarHeapSnapshot] = None
+
+def init_worker(cache_path: str) -> None:
+    global WORKER_SNAPSHOT
+    WORKER_SNAPSHOT = load_snapshot_cache(cache_path)
+
+    if WORKER_SNAPSHOT is None:
+        raise ValueError(f"Unable to load snapshot cache '{cache_path}' in worker")
+
+def build_objects(tasks: List[Tuple[int, List[str]]], budget: Optional[BuildBudget] = None) -> List[BuiltHeapValue]:
+    return [
+        build_object_from_node_id(WORKER_SNAPSHOT, node_id, lambda prop, ignore_properties=ignore_properties: prop not in ignore_properties, budget)
+        for node_id, ignore_properties in tasks
+    ]
+
+def iter_built_tasks_in_pool(
+    heap_snapshot: HeapSnapshot,
+    tasks: List[Tuple[int, List[str]]],
+    workers: int = 2,
+    budget: Optional[BuildBudget] = None
+) -> Iterator[BuiltHeapValue]:
+    """
+    Build the objects for (node id, ignore properties) tasks across a pool of worker processes, yielded in
+    task order as soon as their chunk is built. Tasks of several queries can share one pool.
+
+    Workers memory-map the snapshot's binary cache rather than receiving a copy of it, a temporary cache
+    is written first if the snapshot was not loaded from one.
+    """
+    if not tasks:
+        return
+
+    if not isinstance(heap_snapshot, ColumnarHeapSnapshot):
+        heap_snapshot = ColumnarHeapSnapshot.from_heap_snapshot(heap_snapshot)
+
+    chunk_size = max(1, math.ceil(len(tasks) / (workers * CHUNKS_PER_WORKER)))
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+
+    with tempfile.TemporaryDirectory(prefix="playwrong-") as tmp_dir:
+        cache_path = heap_snapshot._cache_path
+
+        if cache_path is None:
+            cache_path = get_cache_path(f"{tmp_dir}/snapshot")
+            write_snapshot_cache(heap_snapshot, cache_path, source_hash="")
+
+        log.debug(f"building {len(tasks)} object(s) in {len(chunks)} chunk(s) across {workers} worker(s)")
+
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(chunks)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(cache_path,)
+        ) as executor:
+            for built_objects in executor.map(functools.partial(build_objects, budget=budget), chunks):
+                yield from built_objects
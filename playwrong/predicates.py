@@ -0,0 +1,235 @@
+import re
+import logging
+import numpy as np
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+from .build_object import OBJECT_KINDS
+from .models import HeapSnapshot
+from .snapshot import (
+    find_node_ids_with_properties,
+    find_property_edge_ids_for_string,
+    find_string_ids,
+    get_edge_column,
+    get_edge_rows,
+    get_node_at_index,
+    get_node_column,
+    get_snapshot_index,
+)
+from .stats import count, timed
+
+log = logging.getLogger('heapsnapshot.predicates')
+
+# [!]name[(=|~)value] for properties, [!]@constructor=Name, [!]@type=type and [!]@self_size>=bytes for nodes
+PREDICATE_PATTERN = re.compile(r'^(?P<negate>!)?(?P<field>@?[^=~<>!]+?)(?:(?P<op>=|~|>=)(?P<value>.*))?$', re.DOTALL)
+NODE_FIELDS = {'@constructor': '=', '@type': '=', '@self_size': '>='}
+
+class Predicate(BaseModel):
+    """
+    A condition on a node, a property name optionally compared to the string or number it holds
+    (op '=' for equality, '~' for a regular expression search) or, for fields starting with '@',
+    a condition on the node itself. negate inverts it, so '!name' matches nodes without the property.
+    """
+    field: str
+    op: Optional[str] = None
+    value: Optional[str] = None
+    negate: bool = False
+
+    def __str__(self) -> str:
+        return f"{'!' if self.negate else ''}{self.field}{self.op or ''}{self.value or ''}"
+
+def parse_predicate(expression: str) -> Predicate:
+    match = PREDICATE_PATTERN.match(expression.strip())
+
+    if not match:
+        raise ValueError(f"Invalid predicate '{expression}'")
+
+    predicate = Predicate(field=match['field'], op=match['op'], value=match['value'], negate=bool(match['negate']))
+
+    if predicate.field.startswith('@'):
+        if predicate.field not in NODE_FIELDS:
+            raise ValueError(f"Unknown node field '{predicate.field}' in predicate '{expression}', expected one of {', '.join(NODE_FIELDS)}")
+
+        if predicate.op != NODE_FIELDS[predicate.field]:
+            raise ValueError(f"Predicate '{expression}' should be of the form {predicate.field}{NODE_FIELDS[predicate.field]}value")
+
+        if predicate.field == '@self_size' and not predicate.value.isdigit():
+            raise ValueError(f"Expected a number of bytes in predicate '{expression}'")
+
+    elif predicate.op == '>=':
+        raise ValueError(f"Properties can only be compared with '=' or '~' in predicate '{expression}'")
+
+    if predicate.op == '~':
+        try:
+            re.compile(predicate.value)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression in predicate '{expression}': {e}") from None
+
+    return predicate
+
+def parse_predicates(expressions: List[str]) -> List[Predicate]:
+    return [parse_predicate(expression) for expression in expressions]
+
+def get_node_type_id(heap_snapshot: HeapSnapshot, node_type: str) -> int:
+    node_types = heap_snapshot.snapshot.meta.node_types[heap_snapshot.snapshot.meta.node_fields.index("type")]
+
+    if node_type not in node_types:
+        raise ValueError(f"Unknown node type '{node_type}', expected one of {', '.join(node_types)}")
+
+    return node_types.index(node_type)
+
+def check_predicates(heap_snapshot: HeapSnapshot, predicates: List[Predicate]) -> None:
+    """
+    Reject predicates that cannot apply to this snapshot, the node types come from its meta
+    so @type values are only known once it is loaded
+    """
+    node_types = heap_snapshot.snapshot.meta.node_types[heap_snapshot.snapshot.meta.node_fields.index("type")]
+
+    for predicate in predicates:
+        if predicate.field == '@type' and predicate.value not in node_types:
+            raise ValueError(f"Unknown node type '{predicate.value}' in predicate '{predicate}', expected one of {', '.join(node_types)}")
+
+def get_number_text(heap_snapshot: HeapSnapshot, node_index: int) -> Optional[str]:
+    """
+    Text of the value of a number node, held by the string its 'value' edge points to
+    """
+    meta = heap_snapshot.snapshot.meta
+    edge_types = meta.edge_types[meta.edge_fields.index("type")]
+    type_field, name_field, to_node_field = (meta.edge_fields.index(field) for field in ["type", "name_or_index", "to_node"])
+
+    edge_range = get_snapshot_index(heap_snapshot).get_node_edge_range(node_index)
+
+    for edge in get_edge_rows(heap_snapshot, edge_range.start, edge_range.stop).tolist():
+        if edge_types[edge[type_field]] not in ['element', 'hidden'] and heap_snapshot.strings[edge[name_field]] == 'value':
+            child = get_node_at_index(heap_snapshot, edge[to_node_field] // len(meta.node_fields))
+            return heap_snapshot.strings[int(child[meta.node_fields.index("name")])]
+
+    return None
+
+def match_values(heap_snapshot: HeapSnapshot, predicate: Predicate, node_indexes: np.ndarray) -> np.ndarray:
+    """
+    Whether each node is a string or number whose value satisfies predicate.op / predicate.value
+    """
+    node_types, node_names = get_node_column(heap_snapshot, "type")[node_indexes], get_node_column(heap_snapshot, "name")[node_indexes]
+    strings = node_types == get_node_type_id(heap_snapshot, "string")
+    numbers = node_types == get_node_type_id(heap_snapshot, "number")
+
+    pattern = re.compile(predicate.value) if predicate.op == '~' else None
+    matches = np.zeros(len(node_indexes), dtype=bool)
+
+    if predicate.op == '=':
+        matches[strings] = np.isin(node_names[strings], find_string_ids(heap_snapshot, predicate.value))
+    else:
+        # string ids are shared by equal strings, so each distinct one is searched once
+        string_ids, inverse = np.unique(node_names[strings], return_inverse=True)
+        string_matches = np.array([bool(pattern.search(heap_snapshot.strings[int(string_id)])) for string_id in string_ids], dtype=bool)
+        matches[strings] = string_matches[inverse] if len(string_ids) else False
+
+    try:
+        expected = float(predicate.value) if predicate.op == '=' else None
+    except ValueError:
+        expected = None
+
+    if pattern is None and expected is None:
+        return matches
+
+    number_texts: Dict[int, Optional[str]] = {}
+
+    for position in np.flatnonzero(numbers).tolist():
+        node_index = int(node_indexes[position])
+
+        if node_index not in number_texts:
+            number_texts[node_index] = get_number_text(heap_snapshot, node_index)
+
+        text = number_texts[node_index]
+
+        if text is not None:
+            matches[position] = bool(pattern.search(text)) if pattern else float(text) == expected
+
+    return matches
+
+def evaluate_predicate(heap_snapshot: HeapSnapshot, predicate: Predicate, node_indexes: np.ndarray) -> np.ndarray:
+    """
+    Whether each of node_indexes satisfies predicate, property edges are found with one
+    vectorized scan of the edges and only their owners among node_indexes are looked at further
+    """
+    if predicate.field == '@constructor':
+        matches = (
+            (get_node_column(heap_snapshot, "type")[node_indexes] == get_node_type_id(heap_snapshot, "object")) &
+            np.isin(get_node_column(heap_snapshot, "name")[node_indexes], find_string_ids(heap_snapshot, predicate.value))
+        )
+    elif predicate.field == '@type':
+        matches = get_node_column(heap_snapshot, "type")[node_indexes] == get_node_type_id(heap_snapshot, predicate.value)
+    elif predicate.field == '@self_size':
+        matches = get_node_column(heap_snapshot, "self_size")[node_indexes] >= int(predicate.value)
+    else:
+        edge_ids = find_property_edge_ids_for_string(heap_snapshot, predicate.field)
+        owners = get_snapshot_index(heap_snapshot).edge_owners[edge_ids]
+
+        if predicate.op is not None:
+            # only edges of the nodes being filtered need their values compared
+            edge_ids = edge_ids[np.isin(owners, node_indexes)]
+            children = get_edge_column(heap_snapshot, "to_node")[edge_ids] // len(heap_snapshot.snapshot.meta.node_fields)
+            owners = get_snapshot_index(heap_snapshot).edge_owners[edge_ids][match_values(heap_snapshot, predicate, children)]
+
+        matches = np.isin(node_indexes, owners)
+
+    return ~matches if predicate.negate else matches
+
+def filter_node_indexes(heap_snapshot: HeapSnapshot, node_indexes: np.ndarray, predicates: List[Predicate]) -> np.ndarray:
+    for predicate in predicates:
+        if not len(node_indexes):
+            break
+
+        node_indexes = node_indexes[evaluate_predicate(heap_snapshot, predicate, node_indexes)]
+        log.debug(f"{len(node_indexes)} nodes matching {predicate}")
+
+    return node_indexes
+
+def filter_node_ids(heap_snapshot: HeapSnapshot, node_ids: List[int], predicates: List[Predicate]) -> List[int]:
+    """
+    The node ids satisfying every predicate, in the same order
+    """
+    if not predicates:
+        return node_ids
+
+    check_predicates(heap_snapshot, predicates)
+    index = get_snapshot_index(heap_snapshot)
+    node_indexes = np.fromiter((index.get_node_index(node_id) for node_id in node_ids), dtype=np.int64, count=len(node_ids))
+
+    with timed("search.predicates"):
+        node_indexes = filter_node_indexes(heap_snapshot, node_indexes, predicates)
+
+    return get_node_column(heap_snapshot, "id")[node_indexes].tolist()
+
+def find_buildable_node_indexes(heap_snapshot: HeapSnapshot) -> np.ndarray:
+    """
+    Indexes of the plain objects and arrays, the nodes objects can be built from
+    """
+    names = np.concatenate([find_string_ids(heap_snapshot, name) for name in OBJECT_KINDS])
+
+    return np.flatnonzero(
+        (get_node_column(heap_snapshot, "type") == get_node_type_id(heap_snapshot, "object")) &
+        np.isin(get_node_column(heap_snapshot, "name"), names)
+    )
+
+def find_node_ids_matching(heap_snapshot: HeapSnapshot, properties: List[str], predicates: List[Predicate]) -> List[int]:
+    """
+    Ids of the nodes having all of properties and satisfying every predicate, every plain object
+    and array is a candidate without properties
+    """
+    if not properties and not predicates:
+        raise ValueError("Please specify at least one property or predicate to find node ids for")
+
+    check_predicates(heap_snapshot, predicates)
+
+    if properties:
+        node_ids = filter_node_ids(heap_snapshot, find_node_ids_with_properties(heap_snapshot, properties), predicates)
+    else:
+        with timed("search.predicates"):
+            node_indexes = filter_node_indexes(heap_snapshot, find_buildable_node_indexes(heap_snapshot), predicates)
+
+        node_ids = get_node_column(heap_snapshot, "id")[node_indexes].tolist()
+
+    count("search.predicate_matches", len(node_ids))
+    return node_ids
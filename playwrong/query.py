@@ -0,0 +1,140 @@
+import json
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .models import BatchQuery, BuildBudget, BuiltHeapValue, HeapSnapshot
+from .snapshot import find_node_ids_with_properties, find_node_ids_with_property_sets
+from .build_object import build_object_from_node_id
+from .pool import iter_built_tasks_in_pool
+from .predicates import Predicate, filter_node_ids, find_node_ids_matching, parse_predicates
+from .stats import count, timed
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+log = logging.getLogger('heapsnapshot.query')
+
+def find_objects_with_properties(heap_snapshot: HeapSnapshot, properties: List[str], ignore_properties: List[str] = [], workers: int = 1, limit: Optional[int] = None, predicates: List[Predicate] = [], budget: Optional[BuildBudget] = None) -> List[BuiltHeapValue]:
+    return [
+        built_object
+        for _, built_object in iter_objects_with_properties(heap_snapshot, properties, ignore_properties, workers, limit, predicates, budget)
+    ]
+
+def iter_objects_with_properties(heap_snapshot: HeapSnapshot, properties: List[str], ignore_properties: List[str] = [], workers: int = 1, limit: Optional[int] = None, predicates: List[Predicate] = [], budget: Optional[BuildBudget] = None) -> Iterator[Tuple[int, BuiltHeapValue]]:
+    """
+    Yield (node id, object) for the first limit nodes having all of properties and satisfying
+    every predicate, each as soon as it is built
+    """
+    log.debug(f"finding objects {properties=} {ignore_properties=} predicates={[str(predicate) for predicate in predicates]}")
+
+    with timed("search"):
+        if predicates:
+            node_ids = find_node_ids_matching(heap_snapshot, properties, predicates)
+        else:
+            node_ids = find_node_ids_with_properties(heap_snapshot, properties)
+
+    log.debug(f"{len(node_ids)} node(s) found, compiling object(s) {node_ids}")
+
+    node_ids = node_ids[:limit]
+
+    if len(node_ids) > 5 and workers == 1:
+        log.warning("more than 5 nodes found, this may be slow - to improve performance, increase the specifity of your query or ignore unwanted properties on the target object")
+
+    yield from zip(node_ids, iter_built_objects(heap_snapshot, node_ids, ignore_properties, workers, budget))
+
+def iter_built_objects(heap_snapshot: HeapSnapshot, node_ids: List[int], ignore_properties: List[str] = [], workers: int = 1, budget: Optional[BuildBudget] = None) -> Iterator[BuiltHeapValue]:
+    count("build.objects", len(node_ids))
+
+    # graph stats are only recorded in this process, not in pool workers
+    if workers > 1 and len(node_ids) > 1:
+        yield from iter_built_tasks_in_pool(heap_snapshot, [(node_id, ignore_properties) for node_id in node_ids], workers, budget)
+        return
+
+    for node_id in node_ids:
+        with timed("build"):
+            built_object = build_object_from_node_id(heap_snapshot, node_id, lambda prop: prop not in ignore_properties, budget)
+
+        yield built_object
+
+def find_objects_for_queries(heap_snapshot: HeapSnapshot, queries: List[BatchQuery], workers: int = 1, limit: Optional[int] = None, budget: Optional[BuildBudget] = None) -> Dict[str, List[BuiltHeapValue]]:
+    results = {query.name: [] for query in queries}
+
+    for name, _, built_object in iter_objects_for_queries(heap_snapshot, queries, workers, limit, budget):
+        results[name].append(built_object)
+
+    return results
+
+def iter_objects_for_queries(heap_snapshot: HeapSnapshot, queries: List[BatchQuery], workers: int = 1, limit: Optional[int] = None, budget: Optional[BuildBudget] = None) -> Iterator[Tuple[str, int, BuiltHeapValue]]:
+    """
+    Yield (query name, node id, object) for the first limit matches of every query, query by query, each as soon as it is built
+    """
+    log.debug(f"running {len(queries)} queries")
+
+    with timed("search"):
+        node_ids = find_node_ids_with_property_sets(heap_snapshot, {query.name: query.properties for query in queries})
+
+        for query in queries:
+            node_ids[query.name] = filter_node_ids(heap_snapshot, node_ids[query.name], parse_predicates(query.where))
+
+    tasks = [(query.name, node_id, query.ignore_properties) for query in queries for node_id in node_ids[query.name][:limit]]
+
+    if workers > 1:
+        count("build.objects", len(tasks))
+        built_objects = iter_built_tasks_in_pool(heap_snapshot, [(node_id, ignore_properties) for _, node_id, ignore_properties in tasks], workers, budget)
+    else:
+        built_objects = (
+            built_object
+            for _, node_id, ignore_properties in tasks
+            for built_object in iter_built_objects(heap_snapshot, [node_id], ignore_properties, budget=budget)
+        )
+
+    for (name, node_id, _), built_object in zip(tasks, built_objects):
+        yield name, node_id, built_object
+
+def load_batch_queries(path: Path) -> List[BatchQuery]:
+    """
+    Read queries from a JSON or YAML file, either a mapping of query name to
+    {properties, ignore_properties, where} or a list of {name, properties, ignore_properties, where}
+    """
+    text = path.read_text()
+
+    if path.suffix in ['.yaml', '.yml']:
+        if yaml is None:
+            raise ValueError("PyYAML is required to read YAML query files, install playwrong with the 'yaml' extra")
+
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid YAML in queries file '{path}': {e}") from None
+    else:
+        data = json.loads(text)
+
+    if isinstance(data, dict):
+        data = [{'name': name, **query} if isinstance(query, dict) else query for name, query in data.items()]
+
+    if not isinstance(data, list):
+        raise ValueError("Queries file must hold a mapping of query name to query or a list of queries")
+
+    queries = [BatchQuery.model_validate(query) for query in data]
+
+    for query in queries:
+        if not query.properties:
+            raise ValueError(f"Query '{query.name}' needs at least one property")
+
+        parse_predicates(query.where)
+
+    names = [query.name for query in queries]
+    if len(set(names)) != len(names):
+        raise ValueError("Query names must be unique")
+
+    return queries
+
+async def afind_objects_with_properties(heap_snapshot: HeapSnapshot, properties: List[str], ignore_properties: List[str] = [], workers: int = 1, limit: Optional[int] = None, predicates: List[Predicate] = [], budget: Optional[BuildBudget] = None) -> List[BuiltHeapValue]:
+    """
+    Async facade over find_objects_with_properties, the CPU bound search runs in a worker thread so the event loop stays responsive
+    """
+    return await asyncio.to_thread(find_objects_with_properties, heap_snapshot, properties, ignore_properties, workers, limit, predicates, budget)
@@ -0,0 +1,384 @@
+import logging
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+from .models import HeapSnapshot
+from .snapshot import (
+    get_edge_at_index,
+    get_edge_column,
+    get_edge_type_id,
+    get_field_value,
+    get_node_at_index,
+    get_node_column,
+    get_snapshot_index,
+)
+from .stats import timed
+
+log = logging.getLogger("heapsnapshot.retainers")
+
+# node 0 is the synthetic root, the GC roots hang off of it
+ROOT_NODE_INDEX = 0
+NAME_PREVIEW_LENGTH = 120
+
+class RetainerGraph:
+    """
+    Forward and reverse (retainer) edges of a heap snapshot in CSR form, by node index.
+
+    Edges leaving node i are the edge indexes successor_offsets[i] to successor_offsets[i + 1], to_nodes holds
+    the node index each edge points at. retainer_edges[retainer_offsets[i]:retainer_offsets[i + 1]] are the edge
+    indexes pointing at node i. strong marks the edges that keep their target alive, every edge but weak ones.
+    """
+
+    def __init__(self, successor_offsets: np.ndarray, to_nodes: np.ndarray, retainer_offsets: np.ndarray, retainer_edges: np.ndarray, edge_owners: np.ndarray, strong: np.ndarray):
+        self.successor_offsets = successor_offsets
+        self.to_nodes = to_nodes
+        self.retainer_offsets = retainer_offsets
+        self.retainer_edges = retainer_edges
+        self.edge_owners = edge_owners
+        self.strong = strong
+
+    @property
+    def node_count(self) -> int:
+        return len(self.successor_offsets) - 1
+
+    def get_retainer_edges(self, node_index: int) -> np.ndarray:
+        return self.retainer_edges[self.retainer_offsets[node_index]:self.retainer_offsets[node_index + 1]]
+
+class DominatorTree:
+    """
+    immediate_dominators: node index -> index of its immediate dominator, the root dominates itself and
+    nodes unreachable from the root through strong edges are -1
+    retained_sizes: node index -> self size of the node plus the self sizes of every node it dominates
+    """
+
+    def __init__(self, immediate_dominators: np.ndarray, retained_sizes: np.ndarray):
+        self.immediate_dominators = immediate_dominators
+        self.retained_sizes = retained_sizes
+        self._intervals: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def get_intervals(self, root: int = ROOT_NODE_INDEX) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Position of every node in a preorder walk of the dominator tree and the position after its
+        subtree, so u dominates v when starts[u] <= starts[v] < ends[u]. Unreachable nodes are -1.
+        """
+        if self._intervals is not None:
+            return self._intervals
+
+        node_count = len(self.immediate_dominators)
+        dominated = np.flatnonzero(self.immediate_dominators != -1)
+        dominated = dominated[dominated != root]
+
+        dominators = self.immediate_dominators[dominated]
+        children = dominated[np.argsort(dominators, kind="stable")].tolist()
+        child_offsets = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dominators, minlength=node_count), out=child_offsets[1:])
+        child_offsets = child_offsets.tolist()
+
+        order = []
+        stack = [root]
+
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(children[child_offsets[node]:child_offsets[node + 1]])
+
+        # subtree sizes, children come after their dominator in the walk
+        subtree_sizes = [1] * node_count
+        immediate_dominators = self.immediate_dominators.tolist()
+
+        for node in reversed(order[1:]):
+            subtree_sizes[immediate_dominators[node]] += subtree_sizes[node]
+
+        order = np.asarray(order, dtype=np.int64)
+        starts = np.full(node_count, -1, dtype=np.int64)
+        starts[order] = np.arange(len(order))
+        ends = np.where(starts == -1, -1, starts + np.asarray(subtree_sizes, dtype=np.int64))
+
+        self._intervals = starts, ends
+        return self._intervals
+
+def build_retainer_graph(heap_snapshot: HeapSnapshot) -> RetainerGraph:
+    index = get_snapshot_index(heap_snapshot)
+    node_count = index.node_count
+
+    log.debug(f"building retainer graph for {node_count} nodes, {index.edge_count} edges")
+
+    to_nodes = get_edge_column(heap_snapshot, "to_node") // len(heap_snapshot.snapshot.meta.node_fields)
+    retainer_edges = np.argsort(to_nodes, kind="stable")
+
+    retainer_offsets = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(to_nodes, minlength=node_count), out=retainer_offsets[1:])
+
+    return RetainerGraph(
+        index.first_edge_offsets,
+        to_nodes,
+        retainer_offsets,
+        retainer_edges,
+        index.edge_owners,
+        get_edge_column(heap_snapshot, "type") != get_edge_type_id(heap_snapshot, "weak"),
+    )
+
+def get_retainer_graph(heap_snapshot: HeapSnapshot) -> RetainerGraph:
+    if heap_snapshot._retainer_graph is None:
+        with timed("retainers"):
+            heap_snapshot._retainer_graph = build_retainer_graph(heap_snapshot)
+
+    return heap_snapshot._retainer_graph
+
+def compute_immediate_dominators(graph: RetainerGraph, root: int = ROOT_NODE_INDEX) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lengauer-Tarjan semidominators (simple version, with path compression) over the strong edges, turned
+    into immediate dominators with SEMI-NCA. Every step is a loop over plain lists rather than recursion. Returns the immediate dominators by node index and the
+    node indexes reachable from the root in depth first preorder.
+    """
+    node_count = graph.node_count
+    successor_offsets = graph.successor_offsets.tolist()
+    to_nodes = np.where(graph.strong, graph.to_nodes, -1).tolist()
+
+    # owners of the strong edges pointing at each node
+    strong_retainer_edges = graph.strong[graph.retainer_edges]
+    retainer_offsets = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(graph.to_nodes[graph.strong], minlength=node_count), out=retainer_offsets[1:])
+    retainer_offsets = retainer_offsets.tolist()
+    retainers = graph.edge_owners[graph.retainer_edges[strong_retainer_edges]].tolist()
+
+    # depth first numbering, the stack holds the current path and next_edges where each of its nodes is up to
+    preorder = [-1] * node_count
+    preorder[root] = 0
+    vertex = [root]
+    parent = [-1]
+    next_edges = list(successor_offsets)
+    stack = [root]
+
+    while stack:
+        node = stack[-1]
+        edge = next_edges[node]
+        end = successor_offsets[node + 1]
+
+        while edge < end:
+            child = to_nodes[edge]
+            edge += 1
+
+            if child != -1 and preorder[child] == -1:
+                break
+        else:
+            stack.pop()
+            continue
+
+        next_edges[node] = edge
+        preorder[child] = len(vertex)
+        vertex.append(child)
+        parent.append(preorder[node])
+        stack.append(child)
+
+    reachable = len(vertex)
+    log.debug(f"{reachable} of {node_count} nodes reachable from the root")
+
+    semi = list(range(reachable))
+    label = list(range(reachable))
+    ancestor = [-1] * reachable
+
+    def evaluate(v: int) -> int:
+        # compress the path to the root of v's forest tree, from the top down
+        path = []
+        x = v
+        while ancestor[ancestor[x]] != -1:
+            path.append(x)
+            x = ancestor[x]
+
+        for x in reversed(path):
+            a = ancestor[x]
+            if semi[label[a]] < semi[label[x]]:
+                label[x] = label[a]
+            ancestor[x] = ancestor[a]
+
+        return label[v]
+
+    # semidominators, in reverse preorder
+    for w in range(reachable - 1, 0, -1):
+        node = vertex[w]
+        semi_w = semi[w]
+
+        for retainer in retainers[retainer_offsets[node]:retainer_offsets[node + 1]]:
+            u = preorder[retainer]
+            if u == -1:
+                continue
+
+            # vertexes not linked into the forest yet are their own evaluation
+            if ancestor[u] != -1:
+                u = semi[evaluate(u)]
+
+            if u < semi_w:
+                semi_w = u
+
+        semi[w] = semi_w
+        ancestor[w] = parent[w]
+
+    # immediate dominators (the SEMI-NCA variant): the nearest common ancestor of the
+    # parent and the semidominator, walking up the dominators found so far
+    idom = parent
+    for w in range(1, reachable):
+        dominator = idom[w]
+        semi_w = semi[w]
+
+        while dominator > semi_w:
+            dominator = idom[dominator]
+
+        idom[w] = dominator
+
+    vertex_array = np.asarray(vertex, dtype=np.int64)
+    immediate_dominators = np.full(node_count, -1, dtype=np.int64)
+    immediate_dominators[vertex_array] = vertex_array[np.asarray(idom, dtype=np.int64)]
+    immediate_dominators[root] = root
+
+    return immediate_dominators, vertex_array
+
+def compute_dominator_tree(heap_snapshot: HeapSnapshot) -> DominatorTree:
+    graph = get_retainer_graph(heap_snapshot)
+    immediate_dominators, vertex = compute_immediate_dominators(graph)
+
+    # dominators come before the nodes they dominate in preorder, so walking it backwards
+    # adds every subtree into its dominator before the dominator itself is added
+    retained_sizes = get_node_column(heap_snapshot, "self_size").astype(np.int64)
+    sizes = retained_sizes.tolist()
+    dominators = immediate_dominators.tolist()
+
+    for node in vertex[:0:-1].tolist():
+        sizes[dominators[node]] += sizes[node]
+
+    retained_sizes[vertex] = np.asarray(sizes, dtype=np.int64)[vertex]
+
+    return DominatorTree(immediate_dominators, retained_sizes)
+
+def get_dominator_tree(heap_snapshot: HeapSnapshot) -> DominatorTree:
+    if heap_snapshot._dominator_tree is None:
+        with timed("dominators"):
+            heap_snapshot._dominator_tree = compute_dominator_tree(heap_snapshot)
+
+    return heap_snapshot._dominator_tree
+
+def find_shortest_retainer_edges(heap_snapshot: HeapSnapshot, root: int = ROOT_NODE_INDEX) -> np.ndarray:
+    """
+    Breadth first search from the root over strong edges, one level at a time. Returns node index -> index
+    of the edge it was first reached through, -1 for the root and unreachable nodes.
+    """
+    graph = get_retainer_graph(heap_snapshot)
+    offsets = graph.successor_offsets
+
+    reached_by = np.full(graph.node_count, -1, dtype=np.int64)
+    visited = np.zeros(graph.node_count, dtype=bool)
+    visited[root] = True
+    frontier = np.array([root], dtype=np.int64)
+
+    while len(frontier):
+        starts, counts = offsets[frontier], offsets[frontier + 1] - offsets[frontier]
+        # edge indexes of every frontier node, ranges concatenated
+        edges = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        edges = edges[graph.strong[edges]]
+
+        targets = graph.to_nodes[edges]
+        unvisited = ~visited[targets]
+        targets, first = np.unique(targets[unvisited], return_index=True)
+
+        reached_by[targets] = edges[unvisited][first]
+        visited[targets] = True
+        frontier = targets
+
+    return reached_by
+
+def get_shortest_retainer_edges(heap_snapshot: HeapSnapshot) -> np.ndarray:
+    if heap_snapshot._shortest_retainer_edges is None:
+        with timed("retainer_paths"):
+            heap_snapshot._shortest_retainer_edges = find_shortest_retainer_edges(heap_snapshot)
+
+    return heap_snapshot._shortest_retainer_edges
+
+def describe_node(heap_snapshot: HeapSnapshot, node_index: int) -> Dict[str, Any]:
+    node = get_node_at_index(heap_snapshot, node_index)
+    name = get_field_value(heap_snapshot, 'node', 'name', node)
+
+    return {
+        'id': get_field_value(heap_snapshot, 'node', 'id', node),
+        'type': get_field_value(heap_snapshot, 'node', 'type', node),
+        'name': name if len(name) <= NAME_PREVIEW_LENGTH else name[:NAME_PREVIEW_LENGTH] + '...',
+        'size': get_field_value(heap_snapshot, 'node', 'self_size', node),
+    }
+
+def describe_edge(heap_snapshot: HeapSnapshot, edge_index: int) -> Dict[str, Any]:
+    edge = get_edge_at_index(heap_snapshot, edge_index)
+    type_ = get_field_value(heap_snapshot, 'edge', 'type', edge)
+    is_index = type_ in ['element', 'hidden']
+
+    return {
+        'id': int(edge_index),
+        'type': type_,
+        'name': None if is_index else get_field_value(heap_snapshot, 'edge', 'name_or_index', edge, True),
+        'index': get_field_value(heap_snapshot, 'edge', 'name_or_index', edge) if is_index else None,
+    }
+
+def get_retainers(heap_snapshot: HeapSnapshot, node_id: int) -> List[Dict[str, Any]]:
+    """
+    Every edge pointing at the node, with the node it belongs to
+    """
+    graph = get_retainer_graph(heap_snapshot)
+    node_index = get_snapshot_index(heap_snapshot).get_node_index(node_id)
+
+    return [
+        {'edge': describe_edge(heap_snapshot, edge), 'node': describe_node(heap_snapshot, int(graph.edge_owners[edge]))}
+        for edge in graph.get_retainer_edges(node_index).tolist()
+    ]
+
+def find_shortest_retainer_path(heap_snapshot: HeapSnapshot, node_id: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Shortest chain of strong edges from the root to the node, as a list of {edge, node} steps
+    starting at a GC root, None if the node is only reachable through weak edges
+    """
+    graph = get_retainer_graph(heap_snapshot)
+    reached_by = get_shortest_retainer_edges(heap_snapshot)
+    node_index = get_snapshot_index(heap_snapshot).get_node_index(node_id)
+
+    if node_index != ROOT_NODE_INDEX and reached_by[node_index] == -1:
+        return None
+
+    path = []
+    while node_index != ROOT_NODE_INDEX:
+        edge = int(reached_by[node_index])
+        path.append({'edge': describe_edge(heap_snapshot, edge), 'node': describe_node(heap_snapshot, node_index)})
+        node_index = int(graph.edge_owners[edge])
+
+    return path[::-1]
+
+def get_dominators(heap_snapshot: HeapSnapshot, node_id: int) -> List[Dict[str, Any]]:
+    """
+    The node followed by its chain of dominators up to the root, with retained sizes
+    """
+    tree = get_dominator_tree(heap_snapshot)
+    node_index = get_snapshot_index(heap_snapshot).get_node_index(node_id)
+    chain = []
+
+    while node_index != -1:
+        chain.append({**describe_node(heap_snapshot, node_index), 'retainedSize': int(tree.retained_sizes[node_index])})
+
+        if node_index == ROOT_NODE_INDEX:
+            break
+        node_index = int(tree.immediate_dominators[node_index])
+
+    return chain
+
+def find_largest_retained_nodes(heap_snapshot: HeapSnapshot, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    The nodes (other than the root) retaining the most memory, largest first
+    """
+    tree = get_dominator_tree(heap_snapshot)
+    retained_sizes = np.where(tree.immediate_dominators == -1, -1, tree.retained_sizes)
+    retained_sizes[ROOT_NODE_INDEX] = -1
+
+    limit = min(limit, len(retained_sizes))
+    largest = np.argpartition(-retained_sizes, limit - 1)[:limit] if limit else np.empty(0, dtype=np.int64)
+    largest = largest[np.argsort(-retained_sizes[largest], kind="stable")]
+
+    return [
+        {**describe_node(heap_snapshot, node_index), 'retainedSize': int(tree.retained_sizes[node_index])}
+        for node_index in largest.tolist()
+        if retained_sizes[node_index] >= 0
+    ]
@@ -0,0 +1,320 @@
+import os
+import json
+import logging
+import threading
+import itertools
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pydantic
+
+from .cache import load_heap_snapshot
+from .models import BuildBudget, HeapSnapshot
+from .output import encode_json
+from .predicates import find_node_ids_matching, parse_predicates
+from .query import iter_objects_with_properties
+from .snapshot import get_snapshot_index
+from .stats import count, timed
+
+log = logging.getLogger('heapsnapshot.server')
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MEMORY_BUDGET = 2 << 30
+
+# rough size of a node id -> node index dict entry, including the int objects
+NODE_ID_ENTRY_BYTES = 100
+
+def get_array_bytes(value: Any) -> int:
+    """
+    Bytes held by the numpy arrays among the attributes of value
+    """
+    return sum(
+        attribute.nbytes
+        for attribute in vars(value).values()
+        if isinstance(attribute, np.ndarray)
+    )
+
+def estimate_snapshot_bytes(heap_snapshot: HeapSnapshot) -> int:
+    """
+    Approximate memory held by a loaded snapshot and the lookup tables built for it so far.
+    Memory-mapped arrays are counted too, even though their pages can be reclaimed.
+    """
+    total = 0
+
+    for values in [heap_snapshot.nodes, heap_snapshot.edges]:
+        total += values.nbytes if isinstance(values, np.ndarray) else 8 * len(values)
+
+    strings = heap_snapshot.strings
+    total += get_array_bytes(strings) if hasattr(strings, "__dict__") else sum(len(string) + 50 for string in strings)
+
+    index = heap_snapshot._index
+    if index is not None:
+        total += get_array_bytes(index)
+        if isinstance(index.node_index_by_id, dict):
+            total += NODE_ID_ENTRY_BYTES * len(index.node_index_by_id)
+        else:
+            total += get_array_bytes(index.node_index_by_id)
+
+    for cached in [heap_snapshot._retainer_graph, heap_snapshot._dominator_tree]:
+        if cached is not None:
+            total += get_array_bytes(cached)
+
+    return total
+
+class SnapshotStore:
+    """
+    LRU cache of loaded snapshots keyed by file path. Least recently used snapshots are
+    evicted while the estimated size of the cached ones is over memory_budget, the one
+    most recently used is always kept. Snapshots are reloaded when their file changes.
+    """
+
+    def __init__(self, memory_budget: int = DEFAULT_MEMORY_BUDGET, use_cache: bool = False):
+        self.memory_budget = memory_budget
+        self.use_cache = use_cache
+        self._entries: OrderedDict[str, Tuple[Tuple[int, int], HeapSnapshot, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(size for _, _, size in self._entries.values())
+
+    def get(self, snapshot_path: str) -> HeapSnapshot:
+        """
+        Loads run outside the store lock so requests for other snapshots are not held up,
+        concurrent requests for the same snapshot wait on its loading lock and share one load
+        """
+        snapshot_path = os.path.abspath(snapshot_path)
+
+        if not os.path.isfile(snapshot_path):
+            raise ValueError(f"Snapshot file '{snapshot_path}' does not exist")
+
+        stat = os.stat(snapshot_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            heap_snapshot = self._lookup(snapshot_path, version)
+            if heap_snapshot is not None:
+                return heap_snapshot
+
+            loading = self._loading.setdefault(snapshot_path, threading.Lock())
+
+        with loading:
+            with self._lock:
+                heap_snapshot = self._lookup(snapshot_path, version)
+                if heap_snapshot is not None:
+                    return heap_snapshot
+
+            count("server.misses")
+            log.debug(f"loading snapshot {snapshot_path}")
+
+            try:
+                with timed("server.load"):
+                    heap_snapshot = load_heap_snapshot(snapshot_path, self.use_cache)
+                    get_snapshot_index(heap_snapshot)
+                    size = estimate_snapshot_bytes(heap_snapshot)
+
+                with self._lock:
+                    self._entries[snapshot_path] = (version, heap_snapshot, size)
+                    self._entries.move_to_end(snapshot_path)
+                    self.evict()
+            finally:
+                with self._lock:
+                    self._loading.pop(snapshot_path, None)
+
+            return heap_snapshot
+
+    def _lookup(self, snapshot_path: str, version: Tuple[int, int]) -> Optional[HeapSnapshot]:
+        # callers hold the store lock
+        entry = self._entries.get(snapshot_path)
+
+        if entry is None or entry[0] != version:
+            return None
+
+        count("server.hits")
+        self._entries.move_to_end(snapshot_path)
+        return entry[1]
+
+    def update(self, snapshot_path: str) -> None:
+        """
+        Re-estimate the size of a snapshot once lookup tables may have been added to it
+        """
+        snapshot_path = os.path.abspath(snapshot_path)
+
+        with self._lock:
+            entry = self._entries.get(snapshot_path)
+
+            if entry is not None:
+                self._entries[snapshot_path] = (entry[0], entry[1], estimate_snapshot_bytes(entry[1]))
+                self.evict()
+
+    def evict(self) -> None:
+        while len(self._entries) > 1 and self.total_bytes > self.memory_budget:
+            snapshot_path, _ = self._entries.popitem(last=False)
+            count("server.evictions")
+            log.debug(f"evicted snapshot {snapshot_path}")
+
+    def describe(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {'file': snapshot_path, 'bytes': size, 'nodeCount': heap_snapshot.snapshot.node_count}
+                for snapshot_path, (_, heap_snapshot, size) in reversed(self._entries.items())
+            ]
+
+class SnapshotServer(ThreadingHTTPServer):
+    def __init__(self, address: Tuple[str, int], store: SnapshotStore):
+        super().__init__(address, SnapshotRequestHandler)
+        self.store = store
+
+class SnapshotRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /snapshots: the cached snapshots, most recently used first
+    POST /load {file}: load a snapshot into the cache
+    POST /node-ids {file, properties, where, limit}: ids of the nodes having all of properties and matching the where predicates
+    POST /query {file, properties, ignore_properties, where, limit, budget}: NDJSON stream of {nodeId, value}, one per matching object
+    """
+    server: SnapshotServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        log.debug(f"{self.address_string()} {format % args}")
+
+    def send_json(self, value: Any, status: HTTPStatus = HTTPStatus.OK) -> None:
+        body = encode_json(value)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: HTTPStatus, message: str) -> None:
+        self.send_json({'error': message}, status)
+
+    def read_json(self) -> Dict[str, Any]:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        payload = json.loads(body or b"{}")
+
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+
+        return payload
+
+    def do_GET(self) -> None:
+        if self.path != "/snapshots":
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"Unknown endpoint '{self.path}'")
+            return
+
+        self.send_json(self.server.store.describe())
+
+    def do_POST(self) -> None:
+        handlers = {
+            "/load": self.handle_load,
+            "/node-ids": self.handle_node_ids,
+            "/query": self.handle_query,
+        }
+
+        if self.path not in handlers:
+            self.send_error_json(HTTPStatus.NOT_FOUND, f"Unknown endpoint '{self.path}'")
+            return
+
+        try:
+            payload = self.read_json()
+
+            if not payload.get('file'):
+                raise ValueError("Specify the snapshot 'file'")
+
+            handlers[self.path](payload, self.server.store.get(payload['file']))
+            self.server.store.update(payload['file'])
+        except (ValueError, TypeError, pydantic.ValidationError) as e:
+            self.send_error_json(HTTPStatus.BAD_REQUEST, str(e))
+
+    def handle_load(self, payload: Dict[str, Any], heap_snapshot: HeapSnapshot) -> None:
+        self.send_json({'file': os.path.abspath(payload['file']), 'nodeCount': heap_snapshot.snapshot.node_count})
+
+    def handle_node_ids(self, payload: Dict[str, Any], heap_snapshot: HeapSnapshot) -> None:
+        node_ids = find_node_ids_matching(heap_snapshot, payload.get('properties') or [], parse_predicates(payload.get('where') or []))
+        self.send_json({'nodeIds': node_ids[:payload.get('limit')]})
+
+    def handle_query(self, payload: Dict[str, Any], heap_snapshot: HeapSnapshot) -> None:
+        results = iter_objects_with_properties(
+            heap_snapshot,
+            payload.get('properties') or [],
+            payload.get('ignore_properties') or [],
+            limit=payload.get('limit'),
+            predicates=parse_predicates(payload.get('where') or []),
+            budget=BuildBudget.model_validate(payload['budget']) if payload.get('budget') else None
+        )
+
+        # search and build the first object before responding, so errors there are still a 400
+        first = next(results, None)
+        documents = itertools.chain([first] if first is not None else [], results)
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        try:
+            for node_id, built_object in documents:
+                self.wfile.write(encode_json({'nodeId': node_id, 'value': built_object}) + b"\n")
+                self.wfile.flush()
+        except ValueError as e:
+            log.error(f"Error building object: {e}")
+            self.wfile.write(encode_json({'error': str(e)}) + b"\n")
+
+def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    use_cache: bool = False,
+    preload: List[str] = []
+) -> None:
+    store = SnapshotStore(memory_budget, use_cache)
+
+    for snapshot_path in preload:
+        store.get(snapshot_path)
+
+    with SnapshotServer((host, port), store) as server:
+        log.info(f"serving snapshots on http://{host}:{server.server_address[1]}")
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+class ServerError(Exception):
+    pass
+
+def request_server(server_url: str, endpoint: str, payload: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Call an endpoint of a running server, returns the open response so streamed results can be read as they arrive
+    """
+    request = urllib.request.Request(
+        f"{server_url.rstrip('/')}{endpoint}",
+        data=None if payload is None else json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+
+    try:
+        return urllib.request.urlopen(request)
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read())['error']
+        except (ValueError, KeyError, TypeError):
+            message = str(e)
+        raise ServerError(message) from None
+    except urllib.error.URLError as e:
+        raise ServerError(f"Unable to reach server at {server_url}: {e.reason}") from None
+
+def iter_server_lines(server_url: str, endpoint: str, payload: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    with request_server(server_url, endpoint, payload) as response:
+        yield from response
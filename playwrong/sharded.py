@@ -0,0 +1,648 @@
+import os
+import glob
+import json
+import mmap
+import codecs
+import shutil
+import logging
+import numpy as np
+from collections import OrderedDict
+from pydantic import BaseModel
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .build_object import ObjectCompiler, compile_object
+from .compression import detect_compression, open_snapshot_reader
+from .models import BuildBudget, BuiltHeapValue, Snapshot
+from .parser import READ_CHUNK_SIZE, HeapSnapshotParser, IntBuffer
+from .stats import count, timed
+from .strings import ARRAY_START, EMPTY_ARRAY_END, STRING_ELEMENT, STRINGS_KEY, LazyStringTable, find_string_spans
+from .summary import check_sort_key, get_top_groups, group_nodes
+
+log = logging.getLogger("heapsnapshot.sharded")
+
+SHARDS_SUFFIX = ".shards"
+SHARDS_MANIFEST = "manifest.json"
+SHARDS_VERSION = 1
+
+DEFAULT_MEMORY_FRACTION = 0.25
+
+# arrays of about a shard's size alive at once: the mapped shard and the columns and masks
+# derived from it while scanning, or the node and edge shards kept mapped while building objects
+SHARD_WORKING_SET = 8
+MIN_SHARD_ROWS = 1 << 12
+OPEN_SHARDS = 2
+
+SOURCE_COPY = "snapshot.heapsnapshot"
+STRING_STARTS = "string-starts.bin"
+STRING_ENDS = "string-ends.bin"
+
+class ShardInfo(BaseModel):
+    """
+    One .npy file of rows start to start + rows of the nodes or edges, first_edge is the
+    index of the first edge of the first node for node shards
+    """
+    file: str
+    start: int
+    rows: int
+    first_edge: int = 0
+
+class ShardManifest(BaseModel):
+    """
+    Contents of a shards directory, shards are reused while source_size and source_mtime_ns match the
+    snapshot file and they were written with the same shard_bytes. Strings are read from the snapshot
+    file itself, or from its decompressed copy source_copy in the directory.
+    """
+    version: int = SHARDS_VERSION
+    source: str
+    source_size: int
+    source_mtime_ns: int
+    source_copy: Optional[str] = None
+    shard_bytes: int
+    snapshot: Snapshot
+    string_count: int
+    node_shards: List[ShardInfo]
+    edge_shards: List[ShardInfo]
+
+def get_shards_directory(snapshot_path: str) -> str:
+    return f"{snapshot_path}{SHARDS_SUFFIX}"
+
+def get_shard_bytes(file_size: int, memory_fraction: float) -> int:
+    """
+    Size of a shard so the working set of a shard by shard pass stays around memory_fraction of the file size
+    """
+    if not 0 < memory_fraction <= 1:
+        raise ValueError(f"Memory fraction must be between 0 and 1, got {memory_fraction}")
+
+    return int(file_size * memory_fraction) // SHARD_WORKING_SET
+
+def get_shard_rows(shard_bytes: int, field_count: int) -> int:
+    return max(MIN_SHARD_ROWS, shard_bytes // (field_count * np.dtype(np.int64).itemsize))
+
+class ShardWriter(IntBuffer):
+    """
+    IntBuffer for the parser writing the values to .npy files of (rows, field_count) shards as they fill
+    up instead of growing, so at most one shard of the array is held in memory. to_array() writes the
+    last shard and returns an empty array, the rows are read back from the shards.
+    """
+
+    def __init__(self, directory: str, name: str, field_count: int, shard_rows: int):
+        self.capacity = shard_rows * field_count
+        super().__init__(self.capacity)
+
+        self.directory = directory
+        self.name = name
+        self.field_count = field_count
+        self.shards: List[ShardInfo] = []
+        self.values_written = 0
+
+    def __len__(self) -> int:
+        return self.values_written + self._size
+
+    def extend(self, values: np.ndarray) -> None:
+        while len(values):
+            available = self.capacity - self._size
+            super().extend(values[:available])
+            values = values[available:]
+
+            if self._size == self.capacity:
+                self.flush()
+
+    def flush(self) -> None:
+        if not self._size:
+            return
+
+        if self._size % self.field_count:
+            raise ValueError(f"Length of '{self.name}' ({len(self)}) is not a multiple of its field count ({self.field_count})")
+
+        rows = super().to_array().reshape(-1, self.field_count)
+        shard = ShardInfo(file=f"{self.name}-{len(self.shards):05d}.npy", start=self.values_written // self.field_count, rows=len(rows))
+
+        np.save(os.path.join(self.directory, shard.file), rows)
+        count(f"shards.{self.name}")
+
+        self.shards.append(shard)
+        self.values_written += self._size
+        self._values = np.empty(self.capacity, dtype=np.int32)
+        self._size = 0
+
+    def to_array(self) -> np.ndarray:
+        self.flush()
+        return np.empty(0, dtype=np.int32)
+
+class ShardedStringTable(LazyStringTable):
+    """
+    LazyStringTable over a memory-mapped snapshot file with the bounds of the strings memory-mapped from
+    the shards directory, searched chunk_size strings at a time
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, data: np.ndarray, chunk_size: int):
+        super().__init__(starts, ends, data)
+        self.chunk_size = chunk_size
+
+    def find_ids(self, string: str) -> np.ndarray:
+        return np.concatenate([np.empty(0, dtype=np.int64)] + [
+            LazyStringTable(np.array(self.starts[start:start + self.chunk_size]), np.array(self.ends[start:start + self.chunk_size]), self.data).find_ids(string) + start
+            for start in range(0, len(self), self.chunk_size)
+        ])
+
+class ShardedHeapSnapshot:
+    """
+    Heap snapshot whose nodes and edges stay on disk as the .npy shards of a ShardManifest.
+    Passes over all nodes or edges map one shard at a time, lookups of single nodes keep the
+    OPEN_SHARDS node and edge shards used last mapped.
+    """
+
+    def __init__(self, directory: str, manifest: ShardManifest, strings: ShardedStringTable):
+        meta = manifest.snapshot.meta
+
+        self.directory = directory
+        self.manifest = manifest
+        self.snapshot = manifest.snapshot
+        self.strings = strings
+
+        self.node_fields = {field: meta.node_fields.index(field) for field in ["type", "name", "id", "self_size", "edge_count"]}
+        self.edge_fields = {field: meta.edge_fields.index(field) for field in ["type", "name_or_index", "to_node"]}
+
+        self._node_shard_starts = np.array([shard.start for shard in manifest.node_shards], dtype=np.int64)
+        self._edge_shard_starts = np.array([shard.start for shard in manifest.edge_shards], dtype=np.int64)
+        self._node_shards: OrderedDict[int, Tuple[ShardInfo, np.ndarray, np.ndarray]] = OrderedDict()
+        self._edge_shards: OrderedDict[int, Tuple[ShardInfo, np.ndarray]] = OrderedDict()
+        self._node_memo = None
+
+    @property
+    def node_count(self) -> int:
+        return sum(shard.rows for shard in self.manifest.node_shards)
+
+    @property
+    def edge_count(self) -> int:
+        return sum(shard.rows for shard in self.manifest.edge_shards)
+
+    def load_shard(self, shard: ShardInfo) -> np.ndarray:
+        count("shards.mapped")
+        return np.load(os.path.join(self.directory, shard.file), mmap_mode="r")
+
+    def iter_node_shards(self) -> Iterator[Tuple[ShardInfo, np.ndarray]]:
+        for shard in self.manifest.node_shards:
+            yield shard, self.load_shard(shard)
+
+    def iter_edge_shards(self) -> Iterator[Tuple[ShardInfo, np.ndarray]]:
+        for shard in self.manifest.edge_shards:
+            yield shard, self.load_shard(shard)
+
+    def get_first_edges(self, shard: ShardInfo, nodes: np.ndarray) -> np.ndarray:
+        """
+        Index of the first edge of each node of a shard, followed by the end of the edges of its last node
+        """
+        first_edges = np.empty(shard.rows + 1, dtype=np.int64)
+        first_edges[0] = 0
+        np.cumsum(nodes[:, self.node_fields["edge_count"]], out=first_edges[1:])
+
+        return first_edges + shard.first_edge
+
+    def get_node_shard(self, node_index: int) -> Tuple[ShardInfo, np.ndarray, np.ndarray]:
+        if not 0 <= node_index < self.node_count:
+            raise ValueError(f"Attempting index node that is out of bounds of snapshot (index: {node_index}, total node count: {self.node_count})")
+
+        position = int(np.searchsorted(self._node_shard_starts, node_index, side="right")) - 1
+        cached = self._node_shards.get(position)
+
+        if cached is None:
+            shard = self.manifest.node_shards[position]
+            nodes = self.load_shard(shard)
+            cached = self._node_shards[position] = (shard, nodes, self.get_first_edges(shard, nodes))
+
+            if len(self._node_shards) > OPEN_SHARDS:
+                self._node_shards.popitem(last=False)
+
+        self._node_shards.move_to_end(position)
+        return cached
+
+    def get_edge_shard(self, edge_index: int) -> Tuple[ShardInfo, np.ndarray]:
+        position = int(np.searchsorted(self._edge_shard_starts, edge_index, side="right")) - 1
+        cached = self._edge_shards.get(position)
+
+        if cached is None:
+            shard = self.manifest.edge_shards[position]
+            cached = self._edge_shards[position] = (shard, self.load_shard(shard))
+
+            if len(self._edge_shards) > OPEN_SHARDS:
+                self._edge_shards.popitem(last=False)
+
+        self._edge_shards.move_to_end(position)
+        return cached
+
+    def get_node_row(self, node_index: int) -> np.ndarray:
+        shard, nodes, _ = self.get_node_shard(node_index)
+        return nodes[node_index - shard.start]
+
+    def get_node_id(self, node_index: int) -> int:
+        return int(self.get_node_row(node_index)[self.node_fields["id"]])
+
+    def get_node_edge_range(self, node_index: int) -> range:
+        shard, _, first_edges = self.get_node_shard(node_index)
+        position = node_index - shard.start
+        return range(int(first_edges[position]), int(first_edges[position + 1]))
+
+    def get_edge_rows(self, start: int, end: int) -> np.ndarray:
+        """
+        Edges start to end (exclusive) as a (edge count, len(edge_fields)) matrix, copied out of the shards they span
+        """
+        parts = []
+
+        while start < end:
+            shard, edges = self.get_edge_shard(start)
+            stop = min(end, shard.start + shard.rows)
+            parts.append(np.array(edges[start - shard.start:stop - shard.start]))
+            start = stop
+
+        if len(parts) == 1:
+            return parts[0]
+
+        return np.concatenate(parts) if parts else np.empty((0, len(self.snapshot.meta.edge_fields)), dtype=np.int32)
+
+class ShardedObjectCompiler(ObjectCompiler):
+    """
+    ObjectCompiler reading nodes and edges from the shards of a ShardedHeapSnapshot
+    """
+    heap_snapshot: ShardedHeapSnapshot
+
+    def get_node_row(self, node_index: int) -> np.ndarray:
+        return self.heap_snapshot.get_node_row(node_index)
+
+    def get_node_edge_rows(self, node_index: int) -> np.ndarray:
+        edge_range = self.heap_snapshot.get_node_edge_range(node_index)
+        return self.heap_snapshot.get_edge_rows(edge_range.start, edge_range.stop)
+
+def feed_until(parser: HeapSnapshotParser, decoder: codecs.IncrementalDecoder, snapshot_file: BinaryIO, key: bytes, chunk_size: int = READ_CHUNK_SIZE) -> int:
+    """
+    Feed snapshot_file to parser up to the first occurrence of key, returns its position
+    or -1 once the whole file has been fed without finding it
+    """
+    position = 0
+    pending = b""
+
+    while True:
+        chunk = snapshot_file.read(chunk_size)
+        pending += chunk
+        found = pending.find(key)
+
+        if found != -1:
+            parser.feed(decoder.decode(pending[:found]))
+            return position + found
+
+        if not chunk:
+            parser.feed(decoder.decode(pending))
+            return -1
+
+        # the end of the pending bytes may be the start of key
+        fed = max(len(pending) - len(key) + 1, 0)
+        parser.feed(decoder.decode(pending[:fed]))
+        position += fed
+        pending = pending[fed:]
+
+def match_string_element(snapshot_file: BinaryIO, position: int, window: int) -> Any:
+    """
+    Match one element of the strings array at position, reading more of the file until the string ends
+    """
+    while True:
+        snapshot_file.seek(position)
+        data = snapshot_file.read(window)
+        match = STRING_ELEMENT.match(data)
+
+        if match or len(data) < window:
+            return match
+
+        window *= 2
+
+def write_string_spans(snapshot_file: BinaryIO, position: int, directory: str, window: int) -> Tuple[int, int]:
+    """
+    Scan the JSON string array starting at position like LazyStringTable.from_buffer, window bytes at a time.
+    The bounds of the strings are appended to the STRING_STARTS and STRING_ENDS files of directory, returns
+    the number of strings and the position after the closing bracket.
+    """
+    snapshot_file.seek(position)
+    start = ARRAY_START.match(snapshot_file.read(window))
+
+    if not start:
+        raise json.JSONDecodeError("Expecting '['", "", position)
+
+    position += start.end()
+    string_count = 0
+
+    with open(os.path.join(directory, STRING_STARTS), "wb") as starts_file, open(os.path.join(directory, STRING_ENDS), "wb") as ends_file:
+        while True:
+            snapshot_file.seek(position)
+            raw = snapshot_file.read(window)
+
+            if not string_count:
+                empty = EMPTY_ARRAY_END.match(raw)
+                if empty:
+                    return 0, position + empty.end()
+
+            starts, ends, end = find_string_spans(np.frombuffer(raw, dtype=np.uint8), 0)
+
+            if len(starts):
+                (starts + position).astype(np.int64).tofile(starts_file)
+                (ends + position).astype(np.int64).tofile(ends_file)
+                string_count += len(starts)
+
+            if end is not None:
+                return string_count, position + end
+
+            if len(starts):
+                # the strings after the last one found may be cut by the end of the window
+                position += int(ends[-1]) + 2
+                continue
+
+            # a string longer than the window, or not laid out the way V8 writes it
+            match = match_string_element(snapshot_file, position, window)
+
+            if not match:
+                raise json.JSONDecodeError("Unterminated strings array", "", position)
+
+            np.array([position + match.start(1)], dtype=np.int64).tofile(starts_file)
+            np.array([position + match.end(1)], dtype=np.int64).tofile(ends_file)
+            string_count += 1
+            position += match.end()
+
+            if match.group(2) == b"]":
+                return string_count, position
+
+def write_snapshot_shards(snapshot_path: str, directory: str, shard_bytes: int) -> ShardManifest:
+    """
+    Stream a snapshot file into a shards directory: nodes and edges are written as shards while they are
+    parsed and only the bounds of the strings are recorded, compressed snapshots are decompressed there first
+    """
+    log.debug(f"writing snapshot shards of {snapshot_path} to {directory}")
+
+    os.makedirs(directory, exist_ok=True)
+    stat = os.stat(snapshot_path)
+
+    for path in [os.path.join(directory, SHARDS_MANIFEST), *glob.glob(os.path.join(directory, "nodes-*.npy")), *glob.glob(os.path.join(directory, "edges-*.npy"))]:
+        if os.path.exists(path):
+            os.remove(path)
+
+    source_path, source_copy = snapshot_path, None
+    compression = detect_compression(snapshot_path)
+
+    if compression is not None:
+        source_copy = SOURCE_COPY
+        source_path = os.path.join(directory, source_copy)
+
+        with timed("shards.decompress"):
+            with open_snapshot_reader(snapshot_path, compression, binary=True) as snapshot_file, open(source_path, "wb") as copy_file:
+                shutil.copyfileobj(snapshot_file, copy_file, READ_CHUNK_SIZE)
+
+    writers: Dict[str, ShardWriter] = {}
+
+    def create_buffer(key: str, capacity: int) -> IntBuffer:
+        if key not in ["nodes", "edges"]:
+            return IntBuffer(capacity)
+
+        if parser.snapshot is None:
+            raise ValueError(f"The 'snapshot' header of '{snapshot_path}' must come before its '{key}'")
+
+        field_count = len(parser.snapshot["meta"][f"{key[:-1]}_fields"])
+        writers[key] = ShardWriter(directory, key, field_count, get_shard_rows(shard_bytes, field_count))
+
+        return writers[key]
+
+    parser = HeapSnapshotParser(buffer_factory=create_buffer)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    window = max(shard_bytes, READ_CHUNK_SIZE)
+
+    with timed("shards.write"), open(source_path, "rb") as snapshot_file:
+        strings_start = feed_until(parser, decoder, snapshot_file, STRINGS_KEY)
+
+        if strings_start == -1:
+            raise ValueError(f"Heap snapshot '{snapshot_path}' has no strings array")
+
+        parser.feed('"strings":[]')
+        string_count, strings_end = write_string_spans(snapshot_file, strings_start + len(STRINGS_KEY), directory, window)
+
+        snapshot_file.seek(strings_end)
+
+        while chunk := snapshot_file.read(READ_CHUNK_SIZE):
+            parser.feed(decoder.decode(chunk))
+
+        parser.feed(decoder.decode(b"", final=True))
+        heap_snapshot = parser.close()
+
+    node_shards = writers["nodes"].shards if "nodes" in writers else []
+    edge_shards = writers["edges"].shards if "edges" in writers else []
+
+    manifest = ShardManifest(
+        source=os.path.abspath(snapshot_path),
+        source_size=stat.st_size,
+        source_mtime_ns=stat.st_mtime_ns,
+        source_copy=source_copy,
+        shard_bytes=shard_bytes,
+        snapshot=heap_snapshot.snapshot,
+        string_count=string_count,
+        node_shards=node_shards,
+        edge_shards=edge_shards,
+    )
+
+    # edge ranges are found from the edge counts of the nodes before each shard
+    edge_count_field = manifest.snapshot.meta.node_fields.index("edge_count")
+    first_edge = 0
+
+    for shard in node_shards:
+        shard.first_edge = first_edge
+        first_edge += int(np.load(os.path.join(directory, shard.file), mmap_mode="r")[:, edge_count_field].sum(dtype=np.int64))
+
+    edge_count = sum(shard.rows for shard in edge_shards)
+
+    if first_edge != edge_count:
+        raise ValueError(f"Edge counts of the nodes of '{snapshot_path}' ({first_edge}) do not add up to its edges ({edge_count})")
+
+    tmp_path = os.path.join(directory, f"{SHARDS_MANIFEST}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(manifest.model_dump_json())
+
+    os.replace(tmp_path, os.path.join(directory, SHARDS_MANIFEST))
+
+    count("shards.nodes", sum(shard.rows for shard in node_shards))
+    count("shards.edges", edge_count)
+    log.debug(f"wrote {len(node_shards)} node and {len(edge_shards)} edge shard(s) of {shard_bytes} bytes")
+
+    return manifest
+
+def load_shard_manifest(directory: str) -> Optional[ShardManifest]:
+    try:
+        with open(os.path.join(directory, SHARDS_MANIFEST)) as f:
+            return ShardManifest.model_validate_json(f.read())
+    except (OSError, ValueError):
+        return None
+
+def open_sharded_snapshot(directory: str, manifest: ShardManifest) -> ShardedHeapSnapshot:
+    source_path = os.path.join(directory, manifest.source_copy) if manifest.source_copy else manifest.source
+
+    with open(source_path, "rb") as snapshot_file:
+        # the string table keeps the mapping alive through its view of the buffer
+        buffer = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if manifest.string_count:
+        starts = np.memmap(os.path.join(directory, STRING_STARTS), dtype=np.int64, mode="r", shape=(manifest.string_count,))
+        ends = np.memmap(os.path.join(directory, STRING_ENDS), dtype=np.int64, mode="r", shape=(manifest.string_count,))
+    else:
+        starts = ends = np.empty(0, dtype=np.int64)
+
+    strings = ShardedStringTable(starts, ends, np.frombuffer(buffer, dtype=np.uint8), max(MIN_SHARD_ROWS, manifest.shard_bytes // (2 * np.dtype(np.int64).itemsize)))
+    return ShardedHeapSnapshot(directory, manifest, strings)
+
+def load_sharded_snapshot(snapshot_path: str, directory: Optional[str] = None, memory_fraction: float = DEFAULT_MEMORY_FRACTION) -> ShardedHeapSnapshot:
+    """
+    Open the shards of a snapshot file, (re)writing them when they are missing, stale or were
+    written for another memory_fraction. directory defaults to a .shards directory next to the file.
+    """
+    directory = directory or get_shards_directory(snapshot_path)
+    stat = os.stat(snapshot_path)
+    shard_bytes = get_shard_bytes(stat.st_size, memory_fraction)
+
+    with timed("shards.load"):
+        manifest = load_shard_manifest(directory)
+
+    if (
+        manifest is not None and
+        manifest.version == SHARDS_VERSION and
+        manifest.source == os.path.abspath(snapshot_path) and
+        (manifest.source_size, manifest.source_mtime_ns) == (stat.st_size, stat.st_mtime_ns) and
+        manifest.shard_bytes == shard_bytes
+    ):
+        count("shards.hits")
+    else:
+        count("shards.misses")
+        manifest = write_snapshot_shards(snapshot_path, directory, shard_bytes)
+
+    return open_sharded_snapshot(directory, manifest)
+
+def find_sharded_edge_owners(heap_snapshot: ShardedHeapSnapshot, edge_ids: np.ndarray) -> np.ndarray:
+    """
+    Index of the node owning each of the sorted edge_ids, only the node shards owning some of them are mapped
+    """
+    owners = np.empty(len(edge_ids), dtype=np.int64)
+    shard_ends = [shard.first_edge for shard in heap_snapshot.manifest.node_shards[1:]] + [heap_snapshot.edge_count]
+
+    for shard, shard_end in zip(heap_snapshot.manifest.node_shards, shard_ends):
+        start, end = np.searchsorted(edge_ids, [shard.first_edge, shard_end])
+
+        if start == end:
+            continue
+
+        first_edges = heap_snapshot.get_first_edges(shard, heap_snapshot.load_shard(shard))
+        owners[start:end] = shard.start + np.searchsorted(first_edges, edge_ids[start:end], side="right") - 1
+
+    return owners
+
+def find_sharded_node_indexes_with_properties(heap_snapshot: ShardedHeapSnapshot, property_names: List[str]) -> np.ndarray:
+    """
+    Indexes of the nodes having all of property_names in the order find_node_ids_with_properties
+    finds them, the property edges of every name are found in one pass over the edge shards
+    """
+    if not property_names:
+        raise ValueError("Please specify at least one property to find node ids for")
+
+    property_names = list(dict.fromkeys(property_names))
+    string_ids_by_property = [heap_snapshot.strings.find_ids(property_name) for property_name in property_names]
+
+    if not all(len(string_ids) for string_ids in string_ids_by_property):
+        return np.empty(0, dtype=np.int64)
+
+    string_ids = np.concatenate(string_ids_by_property)
+    string_properties = np.repeat(np.arange(len(property_names)), [len(ids) for ids in string_ids_by_property])
+
+    order = np.argsort(string_ids)
+    string_ids, string_properties = string_ids[order], string_properties[order]
+
+    meta = heap_snapshot.snapshot.meta
+    property_type = meta.edge_types[meta.edge_fields.index("type")].index("property")
+    type_field, name_field = heap_snapshot.edge_fields["type"], heap_snapshot.edge_fields["name_or_index"]
+
+    edge_ids, edge_properties = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+
+    with timed("search.edge_scan"):
+        for shard, edges in heap_snapshot.iter_edge_shards():
+            names = edges[:, name_field]
+            matches = np.flatnonzero((edges[:, type_field] == property_type) & np.isin(names, string_ids))
+
+            edge_ids.append(matches + shard.start)
+            edge_properties.append(string_properties[np.searchsorted(string_ids, names[matches])])
+            count("search.edges_scanned", shard.rows)
+
+    edge_properties = np.concatenate(edge_properties)
+    owners = find_sharded_edge_owners(heap_snapshot, np.concatenate(edge_ids))
+
+    common = owners[edge_properties == 0]
+
+    for position in range(1, len(property_names)):
+        if not len(common):
+            break
+
+        common = common[np.isin(common, owners[edge_properties == position])]
+        log.debug(f"{len(common)} common nodes")
+
+    count("search.matches", len(common))
+    return common
+
+def find_sharded_node_ids_with_properties(heap_snapshot: ShardedHeapSnapshot, property_names: List[str]) -> List[int]:
+    return [heap_snapshot.get_node_id(node_index) for node_index in find_sharded_node_indexes_with_properties(heap_snapshot, property_names).tolist()]
+
+def iter_sharded_objects_with_properties(
+    heap_snapshot: ShardedHeapSnapshot,
+    properties: List[str],
+    ignore_properties: List[str] = [],
+    limit: Optional[int] = None,
+    budget: Optional[BuildBudget] = None
+) -> Iterator[Tuple[int, BuiltHeapValue]]:
+    """
+    iter_objects_with_properties over the shards of a snapshot, objects are built in this process
+    """
+    log.debug(f"finding objects out of core {properties=} {ignore_properties=}")
+
+    with timed("search"):
+        node_indexes = find_sharded_node_indexes_with_properties(heap_snapshot, properties)
+
+    log.debug(f"{len(node_indexes)} node(s) found")
+
+    node_indexes = node_indexes[:limit].tolist()
+    count("build.objects", len(node_indexes))
+
+    property_filter: Callable[[str], bool] = lambda prop: prop not in ignore_properties
+
+    for node_index in node_indexes:
+        with timed("build"):
+            compiler = ShardedObjectCompiler(heap_snapshot, property_filter, budget)
+            built_object = compile_object(compiler, node_index)
+
+        yield heap_snapshot.get_node_id(node_index), built_object
+
+def summarize_sharded_snapshot(heap_snapshot: ShardedHeapSnapshot, retained: bool = False, top: int = 50, sort_by: str = "") -> List[Dict[str, Any]]:
+    """
+    summarize_snapshot one node shard at a time, the groups of each shard are merged into the totals so far
+    """
+    check_sort_key(sort_by, retained)
+
+    if retained:
+        raise ValueError("Retained sizes need the dominator tree of the whole heap graph and cannot be computed out of core")
+
+    type_field, name_field, size_field = (heap_snapshot.node_fields[field] for field in ["type", "name", "self_size"])
+
+    unique_groups = np.empty(0, dtype=np.int64)
+    columns = {"count": np.empty(0), "selfSize": np.empty(0)}
+
+    with timed("summary"):
+        for _, nodes in heap_snapshot.iter_node_shards():
+            shard_groups, inverse = np.unique(group_nodes(heap_snapshot, nodes[:, type_field], nodes[:, name_field]), return_inverse=True)
+            shard_columns = {
+                "count": np.bincount(inverse, minlength=len(shard_groups)),
+                "selfSize": np.bincount(inverse, weights=nodes[:, size_field], minlength=len(shard_groups)),
+            }
+
+            unique_groups, inverse = np.unique(np.concatenate([unique_groups, shard_groups]), return_inverse=True)
+            columns = {
+                name: np.bincount(inverse, weights=np.concatenate([column, shard_columns[name]]), minlength=len(unique_groups))
+                for name, column in columns.items()
+            }
+
+    return get_top_groups(heap_snapshot, unique_groups, columns, sort_by or "selfSize", top)
@@ -1,53 +1,68 @@
 import logging
-from .models import HeapSnapshot, HeapSnapshotNode, HeapSnapshotEdge
+import numpy as np
+from typing import Dict, Iterable, List
+from .index import SnapshotIndex, build_snapshot_index
+from .models import ColumnarHeapSnapshot, HeapSnapshot, HeapSnapshotNode, HeapSnapshotEdge
+from .stats import count, timed
 
 log = logging.getLogger("heapsnapshot.snapshot")
 
 COMMON_PROPERTIES = ["name"]
 
-async def get_string(heap_snapshot: HeapSnapshot, string_id: int) -> str:
+def get_string(heap_snapshot: HeapSnapshot, string_id: int) -> str:
     return heap_snapshot.strings[string_id]
 
-async def get_node_edge_ids(heap_snapshot: HeapSnapshot, node_id: int) -> list[int]:
-    node, node_index = await find_node_by_id(heap_snapshot, node_id)
+def get_snapshot_index(heap_snapshot: HeapSnapshot) -> SnapshotIndex:
+    if heap_snapshot._index is None:
+        with timed("index"):
+            heap_snapshot._index = build_snapshot_index(
+                get_node_column(heap_snapshot, "id"),
+                get_node_column(heap_snapshot, "edge_count")
+            )
 
-    edge_offset = 0
+        count("index.nodes", heap_snapshot._index.node_count)
 
-    for i in range(int(node_index)):
-        edge_offset += await get_node_edge_count(heap_snapshot, await get_node_at_index(heap_snapshot, i))
+    return heap_snapshot._index
 
-    edge_count = await get_node_edge_count(heap_snapshot, node)
+def get_node_edge_ids(heap_snapshot: HeapSnapshot, node_id: int) -> list[int]:
+    index = get_snapshot_index(heap_snapshot)
+    return list(index.get_node_edge_range(index.get_node_index(node_id)))
 
-    return [edge_offset + i for i in range(edge_count)]
+def find_edge_parent_node_id(heap_snapshot: HeapSnapshot, edge_id: int) -> int:
+    index = get_snapshot_index(heap_snapshot)
+    node_index = index.get_edge_owner(edge_id)
+    return get_field_value(heap_snapshot, "node", "id", get_node_at_index(heap_snapshot, node_index))
 
-async def find_edge_parent_node_id(heap_snapshot: HeapSnapshot, edge_id: int) -> int:
-    edge_id_offset = 0
+def get_node_edge_count(heap_snapshot: HeapSnapshot, node: HeapSnapshotNode) -> int:
+    return get_field_value(heap_snapshot, "node", "edge_count", node)
 
-    for i in range(heap_snapshot.snapshot.node_count):
-        edge_id_offset += await get_node_edge_count(heap_snapshot, await get_node_at_index(heap_snapshot, i))
+def find_edge_by_id(heap_snapshot: HeapSnapshot, edge_id: int) -> dict:
+    edge = get_edge_at_index(heap_snapshot, edge_id) if 0 <= edge_id < heap_snapshot.snapshot.edge_count else []
 
-        if edge_id_offset > edge_id:
-            return await get_field_value(heap_snapshot, "node", "id", await get_node_at_index(heap_snapshot, i))
-
-    raise ValueError(f"Unable to find parent node for edge '{edge_id}'")
-
-async def get_node_edge_count(heap_snapshot: HeapSnapshot, node: HeapSnapshotNode) -> int:
-    return await get_field_value(heap_snapshot, "node", "edge_count", node)
-
-async def find_edge_by_id(heap_snapshot: HeapSnapshot, edge_id: int) -> dict:
-    edge = await get_edge_at_index(heap_snapshot, edge_id)
-
-    if not edge:
+    if not len(edge):
         raise ValueError(f"Unable to find edge with id '{edge_id}'")
 
     return edge, edge_id
 
-async def get_edge_at_index(heap_snapshot: HeapSnapshot, edge_index: int) -> HeapSnapshotEdge:
+def get_edge_at_index(heap_snapshot: HeapSnapshot, edge_index: int) -> HeapSnapshotEdge:
+    if isinstance(heap_snapshot, ColumnarHeapSnapshot):
+        return heap_snapshot.edges[int(edge_index)]
+
     edge_size = len(heap_snapshot.snapshot.meta.edge_fields)
     edge_offset = edge_index * edge_size
     return heap_snapshot.edges[edge_offset:edge_offset + edge_size]
 
-async def get_field_value(heap_snapshot: HeapSnapshot, field_source: str, field_name: str, value: list, string_or_number_is_string: bool = False) -> str | int:
+def get_edge_rows(heap_snapshot: HeapSnapshot, start: int, end: int) -> np.ndarray:
+    """
+    Edges start to end (exclusive) as a (edge count, len(edge_fields)) matrix
+    """
+    if isinstance(heap_snapshot, ColumnarHeapSnapshot):
+        return heap_snapshot.edges[start:end]
+
+    edge_size = len(heap_snapshot.snapshot.meta.edge_fields)
+    return np.asarray(heap_snapshot.edges[start * edge_size:end * edge_size]).reshape(-1, edge_size)
+
+def get_field_value(heap_snapshot: HeapSnapshot, field_source: str, field_name: str, value: list, string_or_number_is_string: bool = False) -> str | int:
     fields = getattr(heap_snapshot.snapshot.meta, f"{field_source}_fields")
     field_index = fields.index(field_name)
 
@@ -56,18 +71,18 @@ async def get_field_value(heap_snapshot: HeapSnapshot, field_source: str, field_
 
     field_types = getattr(heap_snapshot.snapshot.meta, f"{field_source}_types")
     field_type = field_types[field_index]
-    field_raw_value = value[field_index]
+    field_raw_value = int(value[field_index])
 
     field_value = None
 
     if isinstance(field_type, list):
         field_value = field_type[field_raw_value]
     elif field_type == "string":
-        field_value = await get_string(heap_snapshot, field_raw_value)
+        field_value = get_string(heap_snapshot, field_raw_value)
     elif field_type == "number":
         field_value = field_raw_value
     elif field_type == "string_or_number":
-        field_value = await get_string(heap_snapshot, field_raw_value) if string_or_number_is_string else field_raw_value
+        field_value = get_string(heap_snapshot, field_raw_value) if string_or_number_is_string else field_raw_value
     elif field_type == "node":
         field_value = field_raw_value
     else:
@@ -78,85 +93,195 @@ async def get_field_value(heap_snapshot: HeapSnapshot, field_source: str, field_
 
     return field_value
 
-async def iterate_edges(heap_snapshot: HeapSnapshot):
+def iterate_edges(heap_snapshot: HeapSnapshot):
     for edge_id in range(heap_snapshot.snapshot.edge_count):
-        value = await get_edge_at_index(heap_snapshot, edge_id)
+        value = get_edge_at_index(heap_snapshot, edge_id)
         yield value, edge_id
 
-async def iterate_nodes(heap_snapshot: HeapSnapshot):
+def iterate_nodes(heap_snapshot: HeapSnapshot):
     for node_index in range(heap_snapshot.snapshot.node_count):
-        value = await get_node_at_index(heap_snapshot, node_index)
+        value = get_node_at_index(heap_snapshot, node_index)
         yield value, node_index
 
-async def filter_edge_ids(heap_snapshot: HeapSnapshot, iterator: callable) -> list[int]:
+def filter_edge_ids(heap_snapshot: HeapSnapshot, iterator: callable) -> list[int]:
     edge_ids = []
 
-    async for edge, edge_id in iterate_edges(heap_snapshot):
-        if await iterator(edge, edge_id):
+    for edge, edge_id in iterate_edges(heap_snapshot):
+        if iterator(edge, edge_id):
             edge_ids.append(edge_id)
 
     return edge_ids
 
-async def find_node_by_id(heap_snapshot: HeapSnapshot, node_id: int) -> dict:
-    node = None
-    node_index = None
-
-    async for current_node, current_node_index in iterate_nodes(heap_snapshot):
-        if await get_field_value(heap_snapshot, "node", "id", current_node) == node_id:
-            node = current_node
-            node_index = current_node_index
-            break
-
-    if node:
-        return node, node_index
-    else:
-        raise ValueError(f"Unable to find node with id '{node_id}'")
+def find_node_by_id(heap_snapshot: HeapSnapshot, node_id: int) -> dict:
+    index = get_snapshot_index(heap_snapshot)
+    node_index = index.get_node_index(node_id)
+    return get_node_at_index(heap_snapshot, node_index), node_index
 
-async def get_node_at_index(heap_snapshot: HeapSnapshot, index: int) -> HeapSnapshotNode:
+def get_node_at_index(heap_snapshot: HeapSnapshot, index: int) -> HeapSnapshotNode:
     if index > heap_snapshot.snapshot.node_count:
         raise ValueError(f"Attempting index node that is out of bounds of snapshot (index: {index}, total node count: {heap_snapshot.snapshot.node_count})")
 
+    if isinstance(heap_snapshot, ColumnarHeapSnapshot):
+        return heap_snapshot.nodes[int(index)]
+
     node_size = len(heap_snapshot.snapshot.meta.node_fields)
     node_offset = index * node_size
 
     return heap_snapshot.nodes[int(node_offset):int(node_offset + node_size)]
 
-async def find_node_ids_with_properties(heap_snapshot: HeapSnapshot, property_names: list[str]) -> list[int]:
+def get_field_column(heap_snapshot: HeapSnapshot, field_source: str, field_name: str) -> np.ndarray:
+    fields = getattr(heap_snapshot.snapshot.meta, f"{field_source}_fields")
+
+    if field_name not in fields:
+        raise ValueError(f"Unknown {field_source} field: {field_name}")
+
+    field_index = fields.index(field_name)
+    values = getattr(heap_snapshot, f"{field_source}s")
+
+    if isinstance(heap_snapshot, ColumnarHeapSnapshot):
+        return values[:, field_index]
+
+    return np.asarray(values[field_index::len(fields)])
+
+def get_node_column(heap_snapshot: HeapSnapshot, field_name: str) -> np.ndarray:
+    return get_field_column(heap_snapshot, "node", field_name)
+
+def get_edge_column(heap_snapshot: HeapSnapshot, field_name: str) -> np.ndarray:
+    return get_field_column(heap_snapshot, "edge", field_name)
+
+def find_node_ids_with_properties(heap_snapshot: HeapSnapshot, property_names: list[str]) -> list[int]:
     if not property_names:
         raise ValueError(f"Please specify at least one property to find node ids for")
 
     common_properties = None
 
     for property_name in property_names:
-        if common_properties is None:
-            common_properties = await find_node_ids_with_property(heap_snapshot, property_name)
-        elif not common_properties:
-            return []
-        
+        node_ids = find_node_ids_with_property(heap_snapshot, property_name)
+        common_properties = node_ids if common_properties is None else intersection(common_properties, node_ids)
+
         log.debug(f"{len(common_properties)} common nodes")
-        common_properties = await intersection(common_properties, await find_node_ids_with_property(heap_snapshot, property_name))
 
+        if not common_properties:
+            return []
+
+    count("search.matches", len(common_properties))
     return common_properties
 
-async def find_node_ids_with_property(heap_snapshot: HeapSnapshot, property_name: str) -> list[int]:
+def find_node_ids_with_property_sets(heap_snapshot: HeapSnapshot, property_sets: Dict[str, List[str]]) -> Dict[str, List[int]]:
+    """
+    find_node_ids_with_properties for several property sets at once, every property
+    name is resolved and matched in a single pass over the edges
+    """
+    for name, property_names in property_sets.items():
+        if not property_names:
+            raise ValueError(f"Please specify at least one property to find node ids for in '{name}'")
+
+    nodes_by_property = find_node_ids_with_property_names(heap_snapshot, {p for property_names in property_sets.values() for p in property_names})
+    results = {}
+
+    for name, property_names in property_sets.items():
+        common_properties = nodes_by_property[property_names[0]]
+
+        for property_name in property_names[1:]:
+            if not common_properties:
+                break
+            common_properties = intersection(common_properties, nodes_by_property[property_name])
+
+        log.debug(f"{len(common_properties)} common nodes for {name}")
+        count("search.matches", len(common_properties))
+        results[name] = common_properties
+
+    return results
+
+def find_node_ids_with_property_names(heap_snapshot: HeapSnapshot, property_names: Iterable[str]) -> Dict[str, List[int]]:
+    property_names = sorted(set(property_names))
+    log.debug(f"finding property edges for strings {property_names}")
+
+    string_ids_by_property = find_string_ids_for_strings(heap_snapshot, property_names)
+
+    string_ids = np.concatenate([np.empty(0, dtype=np.int64), *string_ids_by_property.values()])
+    string_properties = np.repeat(
+        np.arange(len(property_names)),
+        [len(string_ids_by_property[property_name]) for property_name in property_names]
+    )
+
+    order = np.argsort(string_ids)
+    string_ids, string_properties = string_ids[order], string_properties[order]
+
+    edge_names = get_edge_column(heap_snapshot, "name_or_index")
+
+    with timed("search.edge_scan"):
+        edge_ids = np.flatnonzero(
+            (get_edge_column(heap_snapshot, "type") == get_edge_type_id(heap_snapshot, "property")) &
+            np.isin(edge_names, string_ids)
+        )
+
+    count("search.edges_scanned", len(edge_names))
+
+    # stable sort so each property keeps its edges in edge order, like find_node_ids_with_property
+    edge_properties = string_properties[np.searchsorted(string_ids, edge_names[edge_ids])]
+    edge_order = np.argsort(edge_properties, kind="stable")
+    boundaries = np.searchsorted(edge_properties[edge_order], np.arange(len(property_names) + 1))
+
+    return {
+        property_name: find_edge_parent_node_ids(heap_snapshot, edge_ids[edge_order[boundaries[i]:boundaries[i + 1]]])
+        for i, property_name in enumerate(property_names)
+    }
+
+def find_node_ids_with_property(heap_snapshot: HeapSnapshot, property_name: str) -> list[int]:
     if property_name in COMMON_PROPERTIES:
         log.debug(f"property '{property_name}' is part of many objects and may be slow")
 
-    edge_ids = await find_property_edge_ids_for_string(heap_snapshot, property_name)
+    edge_ids = find_property_edge_ids_for_string(heap_snapshot, property_name)
     log.debug(f"{len(edge_ids)} nodes found with property {property_name}")
-    return [await find_edge_parent_node_id(heap_snapshot, edge_id) for edge_id in edge_ids]
+    return find_edge_parent_node_ids(heap_snapshot, edge_ids)
+
+def find_edge_parent_node_ids(heap_snapshot: HeapSnapshot, edge_ids: np.ndarray) -> list[int]:
+    index = get_snapshot_index(heap_snapshot)
+    node_ids = get_node_column(heap_snapshot, "id")
+    return node_ids[index.edge_owners[edge_ids]].tolist()
+
+def find_string_ids(heap_snapshot: HeapSnapshot, string: str) -> np.ndarray:
+    if hasattr(heap_snapshot.strings, "find_ids"):
+        return heap_snapshot.strings.find_ids(string)
+
+    return np.fromiter((string_id for string_id, value in enumerate(heap_snapshot.strings) if value == string), dtype=np.int64)
+
+def find_string_ids_for_strings(heap_snapshot: HeapSnapshot, strings: List[str]) -> Dict[str, np.ndarray]:
+    if hasattr(heap_snapshot.strings, "find_ids"):
+        return {string: heap_snapshot.strings.find_ids(string) for string in strings}
+
+    string_ids = {string: [] for string in strings}
+
+    for string_id, value in enumerate(heap_snapshot.strings):
+        if value in string_ids:
+            string_ids[value].append(string_id)
 
-async def find_property_edge_ids_for_string(heap_snapshot: HeapSnapshot, string: str) -> list[int]:
+    return {string: np.asarray(ids, dtype=np.int64) for string, ids in string_ids.items()}
+
+def get_edge_type_id(heap_snapshot: HeapSnapshot, edge_type: str) -> int:
+    edge_fields = heap_snapshot.snapshot.meta.edge_fields
+    return heap_snapshot.snapshot.meta.edge_types[edge_fields.index("type")].index(edge_type)
+
+def find_property_edge_ids_for_string(heap_snapshot: HeapSnapshot, string: str) -> np.ndarray:
     log.debug(f"finding property edges for string {string}")
 
-    async def edge_filter(edge, edge_id):
-        edge_type = await get_field_value(heap_snapshot, "edge", "type", edge)
-        if edge_type != "property":
-            return False
-        edge_name = await get_field_value(heap_snapshot, "edge", "name_or_index", edge, True)
-        return edge_name == string
+    string_ids = find_string_ids(heap_snapshot, string)
+
+    if not len(string_ids):
+        return np.empty(0, dtype=np.int64)
 
-    return await filter_edge_ids(heap_snapshot, edge_filter)
+    edge_types = get_edge_column(heap_snapshot, "type")
+    edge_names = get_edge_column(heap_snapshot, "name_or_index")
+
+    with timed("search.edge_scan"):
+        mask = edge_types == get_edge_type_id(heap_snapshot, "property")
+        mask &= edge_names == string_ids[0] if len(string_ids) == 1 else np.isin(edge_names, string_ids)
+        edge_ids = np.flatnonzero(mask)
+
+    count("search.edges_scanned", len(edge_names))
+    return edge_ids
 
-async def intersection(a: list, b: list) -> list:
+def intersection(a: list, b: list) -> list:
+    b = set(b)
     return [v for v in a if v in b]
@@ -0,0 +1,81 @@
+import time
+import logging
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, ContextManager, Dict, Iterator, Optional
+
+log = logging.getLogger('heapsnapshot.stats')
+
+# called with the stat name and the amount added to it (a count or a number of seconds)
+StatsCallback = Callable[[str, float], None]
+
+class Stats:
+    """
+    Counters and accumulated stage timings of a fetch / query run.
+
+    Instrumented code looks the active Stats up through CURRENT_STATS, so nothing
+    is recorded (and next to nothing is spent) unless collect_stats is in effect.
+    """
+
+    def __init__(self, *callbacks: StatsCallback):
+        self.callbacks = list(callbacks)
+        self.counters: Counter = Counter()
+        self.timings: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+        for callback in self.callbacks:
+            callback(name, value)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+        for callback in self.callbacks:
+            callback(name, seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'total_seconds': time.perf_counter() - self.started,
+            'timings': dict(self.timings),
+            'counters': dict(self.counters),
+        }
+
+CURRENT_STATS: ContextVar[Optional[Stats]] = ContextVar('playwrong_stats', default=None)
+
+def get_stats() -> Optional[Stats]:
+    return CURRENT_STATS.get()
+
+@contextmanager
+def collect_stats(*callbacks: StatsCallback) -> Iterator[Stats]:
+    """
+    Record stats for everything run in this context (including tasks and threads started from it)
+    """
+    stats = Stats(*callbacks)
+    token = CURRENT_STATS.set(stats)
+
+    try:
+        yield stats
+    finally:
+        CURRENT_STATS.reset(token)
+        log.debug(f"stats: {stats.to_dict()}")
+
+def count(name: str, value: int = 1) -> None:
+    stats = CURRENT_STATS.get()
+
+    if stats is not None:
+        stats.count(name, value)
+
+def timed(name: str) -> ContextManager[None]:
+    stats = CURRENT_STATS.get()
+    return nullcontext() if stats is None else stats.timer(name)
@@ -0,0 +1,211 @@
+import re
+import json
+import logging
+import numpy as np
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+log = logging.getLogger("heapsnapshot.strings")
+
+STRINGS_KEY = b'"strings":'
+
+# one element of a JSON string array: the string literal and the separator or closing bracket following it
+STRING_ELEMENT = re.compile(rb'\s*"([^"\\]*(?:\\.[^"\\]*)*)"\s*([,\]])', re.DOTALL)
+QUOTE, BACKSLASH, COMMA, CLOSING_BRACKET = b'"\\,]'
+WHITESPACE = np.frombuffer(b" \t\n\r", dtype=np.uint8)
+
+UNICODE_ESCAPE = re.compile(r'\\u[0-9a-f]{4}')
+
+ARRAY_START = re.compile(rb'\s*\[')
+EMPTY_ARRAY_END = re.compile(rb'\s*\]')
+
+class ByteStringTable(Sequence[str]):
+    """
+    String table over a byte buffer, string i is data[starts[i]:ends[i]] and is only decoded when accessed
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, data: np.ndarray):
+        self.starts = starts
+        self.ends = ends
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, string_id: int) -> str:
+        if isinstance(string_id, slice):
+            return [self[i] for i in range(*string_id.indices(len(self)))]
+
+        return self.decode(self.data[self.starts[string_id]:self.ends[string_id]].tobytes())
+
+    def __iter__(self) -> Iterator[str]:
+        for string_id in range(len(self)):
+            yield self[string_id]
+
+    def decode(self, raw: bytes) -> str:
+        return raw.decode("utf-8", "surrogatepass")
+
+    def encode(self, string: str) -> Optional[List[bytes]]:
+        """
+        The forms string may be stored as in bytes, None if they cannot all be listed to compare against
+        """
+        return [string.encode("utf-8", "surrogatepass")]
+
+    def find_ids(self, string: str) -> np.ndarray:
+        """
+        Ids of the strings equal to string, compared byte by byte without decoding the table
+        """
+        forms = self.encode(string)
+
+        if forms is None:
+            return np.fromiter((string_id for string_id, value in enumerate(self) if value == string), dtype=np.int64)
+
+        if len(forms) == 1:
+            return self.find_encoded_ids(forms[0])
+
+        return np.unique(np.concatenate([self.find_encoded_ids(encoded) for encoded in forms]))
+
+    def find_encoded_ids(self, encoded: bytes) -> np.ndarray:
+        needle = np.frombuffer(encoded, dtype=np.uint8)
+        candidates = np.flatnonzero((self.ends - self.starts) == len(needle))
+
+        if not len(needle) or not len(candidates):
+            return candidates
+
+        starts = self.starts[candidates]
+        matches = np.ones(len(candidates), dtype=bool)
+
+        for i, byte in enumerate(needle):
+            matches &= self.data[starts + i] == byte
+            if not matches.any():
+                break
+
+        return candidates[matches]
+
+class CachedStringTable(ByteStringTable):
+    """
+    String table backed by a UTF-8 blob and an offset index, strings are decoded on access
+    """
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        super().__init__(offsets[:-1], offsets[1:], data)
+        self.offsets = offsets
+
+class LazyStringTable(ByteStringTable):
+    """
+    String table over the raw "strings" array of a snapshot file (usually memory-mapped),
+    the bounds of each JSON string literal are recorded and it is unescaped on access
+    """
+
+    def decode(self, raw: bytes) -> str:
+        if b"\\" not in raw:
+            return raw.decode("utf-8", "surrogatepass")
+
+        return json.loads(b'"' + raw + b'"')
+
+    def encode(self, string: str) -> Optional[List[bytes]]:
+        # strings needing other escapes may be written in more than one way, those are compared decoded
+        if "\\" in json.dumps(string, ensure_ascii=False)[1:-1]:
+            return None
+
+        if string.isascii():
+            return [string.encode("ascii")]
+
+        # V8 writes non-ASCII characters as \uXXXX escapes of their UTF-16 code units, the hex digits
+        # may be in either case, other writers keep them as UTF-8
+        escaped = json.dumps(string)[1:-1]
+        forms = [escaped.encode("ascii"), UNICODE_ESCAPE.sub(lambda match: "\\u" + match[0][2:].upper(), escaped).encode("ascii")]
+
+        try:
+            forms.append(string.encode("utf-8"))
+        except UnicodeEncodeError:
+            pass
+
+        return forms
+
+    @classmethod
+    def from_buffer(cls, buffer: Sequence[int], position: int) -> Tuple["LazyStringTable", int]:
+        """
+        Scan the JSON string array starting at position (its opening bracket), returns
+        the table and the position after the closing bracket
+        """
+        start = ARRAY_START.match(buffer, position)
+        if not start:
+            raise json.JSONDecodeError("Expecting '['", "", position)
+
+        data = np.frombuffer(buffer, dtype=np.uint8)
+        position = start.end()
+
+        empty = EMPTY_ARRAY_END.match(buffer, position)
+        if empty:
+            return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), data), empty.end()
+
+        starts, ends, position = find_string_spans(data, position)
+
+        if position is None:
+            # not laid out the way V8 writes it, scan the remaining strings one by one
+            # from after the closing quote and comma of the last string found
+            spans = []
+
+            for match in iter(STRING_ELEMENT.scanner(buffer, ends[-1] + 2 if len(ends) else start.end()).match, None):
+                spans.append(match.span(1))
+                position = match.end()
+
+                if match.group(2) == b"]":
+                    break
+            else:
+                raise json.JSONDecodeError("Unterminated strings array", "", position or start.end())
+
+            spans = np.array(spans, dtype=np.int64).reshape(-1, 2)
+            starts, ends = np.concatenate([starts, spans[:, 0]]), np.concatenate([ends, spans[:, 1]])
+
+        log.debug(f"found {len(starts)} strings")
+        return cls(starts, ends, data), position
+
+def find_string_spans(data: np.ndarray, position: int) -> Tuple[np.ndarray, np.ndarray, Optional[int]]:
+    """
+    Bounds of the string literals of the array starting at position, found by pairing up unescaped
+    quotes. Strings are read while they are laid out as '"...",' (optionally followed by one whitespace
+    character), the position after the closing bracket is None if something else ended the scan.
+    """
+    region = data[position:]
+    quotes = np.flatnonzero(region == QUOTE)
+
+    # a quote is escaped when preceded by an odd number of backslashes
+    maybe_escaped = np.flatnonzero(region[np.maximum(quotes - 1, 0)] == BACKSLASH)
+    escaped = [i for i in maybe_escaped if count_backslashes(region, int(quotes[i])) % 2]
+    quotes = np.delete(quotes, escaped)
+
+    opens, closes = quotes[0::2], quotes[1::2]
+    opens, closes = opens[:len(closes)], closes[:len(opens)]
+
+    separators = region[np.minimum(closes + 1, len(region) - 1)]
+    gaps = np.append(opens[1:] - closes[:-1], 0)
+    well_formed = (separators == COMMA) & (
+        (gaps == 2) | ((gaps == 3) & np.isin(region[np.minimum(closes + 2, len(region) - 1)], WHITESPACE))
+    )
+
+    broken = np.flatnonzero(~well_formed)
+    end = broken[0] if len(broken) else len(closes)
+    end_position = None
+
+    if end < len(closes) and separators[end] == CLOSING_BRACKET:
+        end_position = position + int(closes[end]) + 2
+        end += 1
+
+    return opens[:end] + position + 1, closes[:end] + position, end_position
+
+def count_backslashes(region: np.ndarray, position: int) -> int:
+    count = 0
+
+    while position - count > 0 and region[position - count - 1] == BACKSLASH:
+        count += 1
+
+    return count
+
+def find_strings_array(buffer: Sequence[int]) -> int:
+    """
+    Position of the top level "strings" key, -1 if there is none.
+
+    The key cannot occur inside a string literal since its quotes would be escaped there.
+    """
+    return buffer.find(STRINGS_KEY)
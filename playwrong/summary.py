@@ -0,0 +1,117 @@
+import logging
+import numpy as np
+from typing import Any, Dict, List, Tuple
+
+from .models import HeapSnapshot
+from .retainers import get_dominator_tree
+from .snapshot import get_node_column
+from .stats import timed
+
+log = logging.getLogger("heapsnapshot.summary")
+
+# node types grouped by their name (the constructor or function name), every other type is grouped as a whole
+NAMED_NODE_TYPES = ["object", "native", "closure"]
+
+SUMMARY_SORT_KEYS = ["count", "selfSize", "retainedSize"]
+
+def get_node_type_names(heap_snapshot: HeapSnapshot) -> List[str]:
+    meta = heap_snapshot.snapshot.meta
+    return meta.node_types[meta.node_fields.index("type")]
+
+def get_node_groups(heap_snapshot: HeapSnapshot) -> np.ndarray:
+    """
+    Group key of every node, type id * (string count + 1) + name string id + 1 for
+    named types and type id * (string count + 1) for the others
+    """
+    return group_nodes(heap_snapshot, get_node_column(heap_snapshot, "type"), get_node_column(heap_snapshot, "name"))
+
+def group_nodes(heap_snapshot: HeapSnapshot, types: np.ndarray, names: np.ndarray) -> np.ndarray:
+    """
+    get_node_groups for the nodes with the given type and name columns
+    """
+    types = types.astype(np.int64)
+    names = names.astype(np.int64)
+
+    type_names = get_node_type_names(heap_snapshot)
+    named = np.isin(types, [type_names.index(node_type) for node_type in NAMED_NODE_TYPES if node_type in type_names])
+
+    return types * (len(heap_snapshot.strings) + 1) + np.where(named, names + 1, 0)
+
+def decode_node_group(heap_snapshot: HeapSnapshot, group: int) -> Tuple[str, str]:
+    node_type, name = divmod(int(group), len(heap_snapshot.strings) + 1)
+    node_type = get_node_type_names(heap_snapshot)[node_type]
+
+    return node_type, heap_snapshot.strings[name - 1] if name else f"({node_type})"
+
+def find_top_level_nodes(groups: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Mask of the nodes not dominated by another node of the same group, given the dominator tree
+    intervals. Sorted by group then position, a node is nested when it starts before the furthest
+    end of the nodes of its group before it.
+    """
+    top_level = np.zeros(len(groups), dtype=bool)
+    reachable = np.flatnonzero(starts != -1)
+
+    if not len(reachable):
+        return top_level
+
+    _, group_ranks = np.unique(groups[reachable], return_inverse=True)
+    span = len(groups) + 1
+    keys = group_ranks.astype(np.int64) * span + starts[reachable]
+    order = np.argsort(keys, kind="stable")
+
+    keys = keys[order]
+    furthest_ends = np.maximum.accumulate(group_ranks[order].astype(np.int64) * span + ends[reachable][order])
+
+    nested = np.zeros(len(order), dtype=bool)
+    nested[1:] = keys[1:] < furthest_ends[:-1]
+
+    top_level[reachable[order[~nested]]] = True
+    return top_level
+
+def summarize_snapshot(heap_snapshot: HeapSnapshot, retained: bool = False, top: int = 50, sort_by: str = "") -> List[Dict[str, Any]]:
+    """
+    Histogram of the nodes by (type, name) with their count and total self size. With retained, also the
+    retained size of each group: the retained sizes of its nodes not dominated by another node of the group.
+    Sorted by sort_by (the retained size when computed, else the self size), largest first, top groups only.
+    """
+    check_sort_key(sort_by, retained)
+
+    with timed("summary"):
+        groups = get_node_groups(heap_snapshot)
+        unique_groups, inverse = np.unique(groups, return_inverse=True)
+
+        columns = {
+            "count": np.bincount(inverse, minlength=len(unique_groups)),
+            "selfSize": np.bincount(inverse, weights=get_node_column(heap_snapshot, "self_size"), minlength=len(unique_groups)),
+        }
+
+    if retained:
+        tree = get_dominator_tree(heap_snapshot)
+
+        with timed("summary.retained"):
+            top_level = find_top_level_nodes(groups, *tree.get_intervals())
+            columns["retainedSize"] = np.bincount(inverse[top_level], weights=tree.retained_sizes[top_level], minlength=len(unique_groups))
+
+    return get_top_groups(heap_snapshot, unique_groups, columns, sort_by or ("retainedSize" if retained else "selfSize"), top)
+
+def check_sort_key(sort_by: str, retained: bool) -> None:
+    if sort_by and sort_by not in SUMMARY_SORT_KEYS:
+        raise ValueError(f"Unknown summary sort key '{sort_by}', expected one of {', '.join(SUMMARY_SORT_KEYS)}")
+
+    if sort_by == "retainedSize" and not retained:
+        raise ValueError("Sorting by retained size requires computing retained sizes")
+
+def get_top_groups(heap_snapshot: HeapSnapshot, unique_groups: np.ndarray, columns: Dict[str, np.ndarray], sort_by: str, top: int) -> List[Dict[str, Any]]:
+    """
+    Rows of the top groups by columns[sort_by], largest first
+    """
+    order = np.argsort(-columns[sort_by], kind="stable")[:top]
+
+    return [
+        {
+            **dict(zip(["type", "name"], decode_node_group(heap_snapshot, unique_groups[position]))),
+            **{name: int(column[position]) for name, column in columns.items()},
+        }
+        for position in order.tolist()
+    ]
@@ -0,0 +1,195 @@
+import json
+import random
+import logging
+import numpy as np
+from collections import deque
+from typing import Any, Dict, List, TextIO
+
+log = logging.getLogger('heapsnapshot.synthetic')
+
+# field layout emitted by V8 (Chrome / Node.js) heap snapshots
+V8_SNAPSHOT_META: Dict[str, Any] = {
+    "node_fields": ["type", "name", "id", "self_size", "edge_count", "trace_node_id", "detachedness"],
+    "node_types": [
+        ["hidden", "array", "string", "object", "code", "closure", "regexp", "number", "native", "synthetic",
+         "concatenated string", "sliced string", "symbol", "bigint", "object shape", "wasm object"],
+        "string", "number", "number", "number", "number", "number"
+    ],
+    "edge_fields": ["type", "name_or_index", "to_node"],
+    "edge_types": [
+        ["context", "element", "property", "internal", "hidden", "shortcut", "weak"],
+        "string_or_number", "node"
+    ],
+    "trace_function_info_fields": ["function_id", "name", "script_name", "script_id", "line", "column"],
+    "trace_node_fields": ["id", "function_info_index", "count", "size", "children"],
+    "sample_fields": ["timestamp_us", "last_assigned_id"],
+    "location_fields": ["object_index", "script_id", "line", "column"],
+}
+
+NODE_TYPES = {name: i for i, name in enumerate(V8_SNAPSHOT_META["node_types"][0])}
+EDGE_TYPES = {name: i for i, name in enumerate(V8_SNAPSHOT_META["edge_types"][0])}
+NODE_FIELD_COUNT = len(V8_SNAPSHOT_META["node_fields"])
+EDGE_FIELD_COUNT = len(V8_SNAPSHOT_META["edge_fields"])
+
+# distinct string values the generated properties draw from
+VALUE_STRING_COUNT = 10_000
+
+class SyntheticHeapSnapshot:
+    """
+    Deterministic generator of heap snapshots shaped like V8's: a synthetic root whose elements are
+    trees of plain objects and arrays holding strings, heap/smi numbers, booleans and null, encoded
+    the way V8 encodes them (oddballs with hidden edges to their value and type strings, numbers with
+    an internal 'value' edge, a 'map' edge on every object).
+
+    node_count: number of nodes to generate (a few more may be emitted to finish the last object)
+    fan_out: properties per object and elements per array
+    depth: maximum nesting depth of objects and arrays
+    property_names: number of distinct property names objects draw from
+    """
+
+    def __init__(self, node_count: int = 100_000, fan_out: int = 8, depth: int = 4, property_names: int = 1_000, seed: int = 0):
+        self.node_count = node_count
+        self.fan_out = fan_out
+        self.depth = depth
+        self.property_names = [f"prop{i}" for i in range(property_names)]
+        self.value_strings = [f"value{i}" for i in range(VALUE_STRING_COUNT)]
+        self.seed = seed
+
+    def generate(self) -> Dict[str, Any]:
+        rng = random.Random(self.seed)
+
+        self._strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._nodes: List[int] = []
+        # edges are recorded with their owner and grouped by owner once everything is generated
+        self._edge_owners: List[int] = []
+        self._edges: List[int] = []
+
+        root = self._add_node("synthetic", "", 0)
+        self._object_map = self._add_node("hidden", "system / Map", 72)
+        self._string_map = self._add_node("hidden", "system / Map (OneByteInternalizedString)", 72)
+        self._oddballs = {}
+
+        for value, type_name in [("true", "boolean"), ("false", "boolean"), ("null", "object")]:
+            oddball = self._add_node("hidden", "system / Oddball", 48)
+            self._add_edge(oddball, "hidden", 0, self._add_string(value))
+            self._add_edge(oddball, "hidden", 1, self._add_string(type_name))
+            self._oddballs[value] = oddball
+
+        pending = deque()
+        tree_count = 0
+
+        while len(self) < self.node_count:
+            tree_count += 1
+            tree = self._add_node("object", "Object", 16 + 8 * self.fan_out)
+            self._add_edge(root, "element", tree_count, tree)
+            pending.append((tree, "Object", 1))
+
+            while pending and len(self) < self.node_count:
+                node, name, depth = pending.popleft()
+
+                if name == "Object":
+                    for property_name in rng.sample(self.property_names, min(self.fan_out, len(self.property_names))):
+                        self._add_value(rng, pending, node, "property", property_name, depth)
+                else:
+                    for element in range(self.fan_out):
+                        self._add_value(rng, pending, node, "element", element, depth)
+
+                self._add_edge(node, "internal", "map", self._object_map)
+
+        return self._to_dict()
+
+    def _add_value(self, rng: random.Random, pending: deque, parent: int, edge_type: str, name_or_index: Any, depth: int) -> None:
+        roll = rng.random()
+
+        if depth < self.depth and roll < 0.2:
+            child = self._add_node("object", "Object", 16 + 8 * self.fan_out)
+            pending.append((child, "Object", depth + 1))
+        elif depth < self.depth and roll < 0.3:
+            child = self._add_node("object", "Array", 32)
+            pending.append((child, "Array", depth + 1))
+        elif roll < 0.6:
+            child = self._add_string(rng.choice(self.value_strings))
+        elif roll < 0.7:
+            child = self._add_node("number", "heap number", 16)
+            self._add_edge(child, "internal", "value", self._add_node("string", repr(rng.uniform(-1e6, 1e6)), 0))
+        elif roll < 0.8:
+            child = self._add_node("number", "smi number", 0)
+            self._add_edge(child, "internal", "value", self._add_node("string", str(rng.randrange(1 << 30)), 0))
+        else:
+            child = self._oddballs[rng.choice(["true", "false", "null"])]
+
+        self._add_edge(parent, edge_type, name_or_index, child)
+
+    def __len__(self) -> int:
+        return len(self._nodes) // NODE_FIELD_COUNT
+
+    def _string_id(self, value: str) -> int:
+        if value not in self._string_ids:
+            self._string_ids[value] = len(self._strings)
+            self._strings.append(value)
+
+        return self._string_ids[value]
+
+    def _add_node(self, node_type: str, name: str, self_size: int) -> int:
+        node_index = len(self)
+        self._nodes.extend([NODE_TYPES[node_type], self._string_id(name), node_index * 2 + 1, self_size, 0, 0, 0])
+        return node_index
+
+    def _add_string(self, value: str) -> int:
+        node = self._add_node("string", value, 24)
+        self._add_edge(node, "internal", "map", self._string_map)
+        return node
+
+    def _add_edge(self, owner: int, edge_type: str, name_or_index: Any, to_node: int) -> None:
+        self._edge_owners.append(owner)
+        self._edges.extend([
+            EDGE_TYPES[edge_type],
+            self._string_id(name_or_index) if isinstance(name_or_index, str) else name_or_index,
+            to_node * NODE_FIELD_COUNT
+        ])
+
+    def _to_dict(self) -> Dict[str, Any]:
+        nodes = np.asarray(self._nodes, dtype=np.int64).reshape(-1, NODE_FIELD_COUNT)
+        edge_owners = np.asarray(self._edge_owners, dtype=np.int64)
+        edges = np.asarray(self._edges, dtype=np.int64).reshape(-1, EDGE_FIELD_COUNT)[np.argsort(edge_owners, kind="stable")]
+        nodes[:, V8_SNAPSHOT_META["node_fields"].index("edge_count")] = np.bincount(edge_owners, minlength=len(nodes))
+
+        log.debug(f"generated synthetic heap snapshot: {len(nodes)} nodes, {len(edges)} edges, {len(self._strings)} strings")
+
+        return {
+            "snapshot": {
+                "meta": V8_SNAPSHOT_META,
+                "node_count": len(nodes),
+                "edge_count": len(edges),
+                "trace_function_count": 0,
+            },
+            "nodes": nodes.ravel(),
+            "edges": edges.ravel(),
+            "trace_function_infos": [],
+            "trace_tree": [],
+            "samples": [],
+            "locations": [],
+            "strings": self._strings,
+        }
+
+def write_heap_snapshot(data: Dict[str, Any], output_file: TextIO) -> None:
+    """
+    Write a heap snapshot dict (nodes and edges as flat lists or arrays) in V8's JSON layout
+    """
+    output_file.write('{"snapshot":')
+    json.dump(data["snapshot"], output_file, separators=(',', ':'))
+
+    for key in ["nodes", "edges", "trace_function_infos", "trace_tree", "samples", "locations"]:
+        values = data[key].tolist() if isinstance(data[key], np.ndarray) else data[key]
+        output_file.write(f',\n"{key}":[')
+        output_file.write(','.join(map(str, values)) if key != "trace_tree" else json.dumps(values)[1:-1])
+        output_file.write(']')
+
+    output_file.write(',\n"strings":[')
+    output_file.write(',\n'.join(json.dumps(string) for string in data["strings"]))
+    output_file.write(']}')
+
+def write_synthetic_heap_snapshot(path: str, node_count: int = 100_000, fan_out: int = 8, depth: int = 4, property_names: int = 1_000, seed: int = 0) -> None:
+    with open(path, "w", encoding="utf-8") as output_file:
+        write_heap_snapshot(SyntheticHeapSnapshot(node_count, fan_out, depth, property_names, seed).generate(), output_file)
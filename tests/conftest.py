@@ -0,0 +1,17 @@
+import io
+import pytest
+
+from playwrong.models import ColumnarHeapSnapshot
+from playwrong.parser import parse_heap_snapshot_file
+
+from .snapshots import build_object_snapshot
+
+@pytest.fixture
+def object_snapshot() -> ColumnarHeapSnapshot:
+    builder, _, _ = build_object_snapshot()
+    return parse_heap_snapshot_file(io.StringIO(builder.to_json()))
+
+@pytest.fixture
+def object_snapshot_path(tmp_path) -> str:
+    builder, _, _ = build_object_snapshot()
+    return builder.write(str(tmp_path / "object.heapsnapshot"))
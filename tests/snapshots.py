@@ -0,0 +1,119 @@
+import io
+import re
+import numpy as np
+from typing import Any, Dict, List, Tuple
+
+from playwrong.synthetic import EDGE_FIELD_COUNT, EDGE_TYPES, NODE_FIELD_COUNT, NODE_TYPES, V8_SNAPSHOT_META, write_heap_snapshot
+
+LOWER_CASE_ESCAPE = re.compile(r'\\u([0-9a-f]{4})')
+
+class SnapshotBuilder:
+    """
+    Hand-built heap snapshot in V8's layout, edges are grouped by owner node when it is written
+    """
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self.string_ids: Dict[str, int] = {}
+        self.nodes: List[List[int]] = []
+        self.edges: List[Tuple[int, List[int]]] = []
+
+    def string_id(self, value: str) -> int:
+        if value not in self.string_ids:
+            self.string_ids[value] = len(self.strings)
+            self.strings.append(value)
+
+        return self.string_ids[value]
+
+    def add_node(self, node_type: str, name: str = "", self_size: int = 0) -> int:
+        node_index = len(self.nodes)
+        self.nodes.append([NODE_TYPES[node_type], self.string_id(name), node_index * 2 + 1, self_size, 0, 0, 0])
+        return node_index
+
+    def add_edge(self, owner: int, edge_type: str, name_or_index: Any, to_node: int) -> None:
+        name_or_index = self.string_id(name_or_index) if isinstance(name_or_index, str) else name_or_index
+        self.edges.append((owner, [EDGE_TYPES[edge_type], name_or_index, to_node * NODE_FIELD_COUNT]))
+
+    def add_string(self, value: str) -> int:
+        return self.add_node("string", value, 24)
+
+    def add_number(self, value: int) -> int:
+        node = self.add_node("number", "smi number")
+        self.add_edge(node, "internal", "value", self.add_string(str(value)))
+        return node
+
+    def add_oddball(self, value: str, type_name: str) -> int:
+        node = self.add_node("hidden", "system / Oddball", 48)
+        self.add_edge(node, "hidden", 0, self.add_string(value))
+        self.add_edge(node, "hidden", 1, self.add_string(type_name))
+        return node
+
+    def node_id(self, node_index: int) -> int:
+        return self.nodes[node_index][2]
+
+    def to_dict(self) -> Dict[str, Any]:
+        nodes = np.asarray(self.nodes, dtype=np.int64).reshape(-1, NODE_FIELD_COUNT)
+        owners = np.asarray([owner for owner, _ in self.edges], dtype=np.int64)
+        edges = np.asarray([edge for _, edge in self.edges], dtype=np.int64).reshape(-1, EDGE_FIELD_COUNT)[np.argsort(owners, kind="stable")]
+        nodes[:, V8_SNAPSHOT_META["node_fields"].index("edge_count")] = np.bincount(owners, minlength=len(nodes))
+
+        return {
+            "snapshot": {"meta": V8_SNAPSHOT_META, "node_count": len(nodes), "edge_count": len(edges), "trace_function_count": 0},
+            "nodes": nodes.ravel(),
+            "edges": edges.ravel(),
+            "trace_function_infos": [],
+            "trace_tree": [],
+            "samples": [],
+            "locations": [],
+            "strings": self.strings,
+        }
+
+    def to_json(self) -> str:
+        """
+        The snapshot as V8 writes it, non-ASCII characters of strings as \\uXXXX escapes with upper case hex digits
+        """
+        output = io.StringIO()
+        write_heap_snapshot(self.to_dict(), output)
+        return LOWER_CASE_ESCAPE.sub(lambda match: "\\u" + match[1].upper(), output.getvalue())
+
+    def write(self, path: str) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+
+        return path
+
+def build_object_snapshot() -> Tuple[SnapshotBuilder, int, Dict[str, Any]]:
+    """
+    A snapshot with one plain object holding a value of every kind, returns the builder,
+    the index of the object node and the value it builds to
+    """
+    builder = SnapshotBuilder()
+    root = builder.add_node("synthetic")
+    object_map = builder.add_node("hidden", "system / Map", 72)
+    true = builder.add_oddball("true", "boolean")
+    null = builder.add_oddball("null", "object")
+
+    target = builder.add_node("object", "Object", 40)
+    builder.add_edge(root, "element", 1, target)
+
+    items = builder.add_node("object", "Array", 32)
+    builder.add_edge(items, "element", 0, builder.add_string("x"))
+    builder.add_edge(items, "element", 1, true)
+    builder.add_edge(items, "element", 2, null)
+
+    nested = builder.add_node("object", "Object", 16)
+    builder.add_edge(nested, "property", "name", builder.add_string("inner"))
+    builder.add_edge(nested, "property", "parent", target)
+
+    prototype = builder.add_node("object", "Object", 16)
+    builder.add_edge(prototype, "property", "café", builder.add_string("prototype"))
+
+    builder.add_edge(target, "property", "café", builder.add_string("crème"))
+    builder.add_edge(target, "property", "count", builder.add_number(42))
+    builder.add_edge(target, "property", "items", items)
+    builder.add_edge(target, "property", "nested", nested)
+    builder.add_edge(target, "property", "__proto__", prototype)
+    builder.add_edge(target, "internal", "map", object_map)
+
+    expected = {"café": "crème", "count": 42.0, "items": ["x", True, None], "nested": {"name": "inner"}}
+    return builder, target, expected
@@ -0,0 +1,64 @@
+import io
+
+from playwrong.build_object import NodeMemo, build_object_from_node_id, get_node_memo
+from playwrong.parser import parse_heap_snapshot_file
+from playwrong.stats import collect_stats
+
+from .snapshots import SnapshotBuilder
+
+def build_shared_snapshot():
+    """
+    Two objects holding the same nested object, returns the snapshot and the ids of the two objects
+    """
+    builder = SnapshotBuilder()
+    root = builder.add_node("synthetic")
+
+    shared = builder.add_node("object", "Object", 16)
+    builder.add_edge(shared, "property", "name", builder.add_string("shared"))
+    builder.add_edge(shared, "property", "count", builder.add_number(7))
+
+    owners = []
+    for index, name in enumerate(["first", "second"]):
+        owner = builder.add_node("object", "Object", 16)
+        builder.add_edge(root, "element", index, owner)
+        builder.add_edge(owner, "property", "label", builder.add_string(name))
+        builder.add_edge(owner, "property", "shared", shared)
+        owners.append(builder.node_id(owner))
+
+    return parse_heap_snapshot_file(io.StringIO(builder.to_json())), owners
+
+def test_memo_is_shared_by_the_compilers_of_a_snapshot():
+    heap_snapshot, (first, second) = build_shared_snapshot()
+
+    with collect_stats() as stats:
+        assert build_object_from_node_id(heap_snapshot, first) == {"label": "first", "shared": {"name": "shared", "count": 7.0}}
+    assert stats.counters["build.memo_hits"] == 0
+
+    with collect_stats() as stats:
+        assert build_object_from_node_id(heap_snapshot, second) == {"label": "second", "shared": {"name": "shared", "count": 7.0}}
+
+    # the shared object, its string and its number (with the number's value string) come from the memo
+    assert stats.counters["build.memo_hits"] == 4
+    assert stats.counters["build.memo_misses"] == 2
+
+    with collect_stats() as stats:
+        build_object_from_node_id(heap_snapshot, first)
+    assert stats.counters["build.memo_misses"] == 0
+
+def test_memo_evicts_least_recently_used_nodes():
+    heap_snapshot, (first, second) = build_shared_snapshot()
+    memo = heap_snapshot._node_memo = NodeMemo(max_size=3)
+    assert get_node_memo(heap_snapshot) is memo
+
+    for node_id in [first, second, first]:
+        assert build_object_from_node_id(heap_snapshot, node_id)["shared"] == {"name": "shared", "count": 7.0}
+        assert len(memo) == 3
+
+    memo = NodeMemo(max_size=2)
+    memo.put(1, ("object",))
+    memo.put(2, ("string",))
+    assert memo.get(1) == ("object",)
+
+    memo.put(3, ("number",))
+    assert memo.get(2) is None
+    assert (memo.get(1), memo.get(3)) == (("object",), ("number",))
@@ -0,0 +1,63 @@
+import pytest
+import pytest_asyncio
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from playwright.async_api import async_playwright
+
+from playwrong.capture import capture_heap_snapshot, capture_heap_snapshots
+from playwrong.cache import load_heap_snapshot
+from playwrong.query import find_objects_with_properties
+
+PAGE = """<!doctype html>
+<html>
+<body>
+<script>
+window.captured = {playwrongMarker: "captured", items: ["a", true, null], nested: {name: "inner"}};
+</script>
+</body>
+</html>
+"""
+EXPECTED = {"playwrongMarker": "captured", "items": ["a", True, None], "nested": {"name": "inner"}}
+
+@pytest.fixture(scope="module")
+def url(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("site")
+    (directory / "index.html").write_text(PAGE)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(SimpleHTTPRequestHandler, directory=str(directory)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_address[1]}/index.html"
+
+    server.shutdown()
+    server.server_close()
+
+@pytest_asyncio.fixture
+async def browser():
+    async with async_playwright() as p:
+        try:
+            browser = await p.chromium.launch()
+        except Exception as e:
+            pytest.skip(f"Chromium is not available: {e}")
+
+        try:
+            yield browser
+        finally:
+            await browser.close()
+
+@pytest.mark.asyncio
+async def test_capture_heap_snapshot(browser, url):
+    heap_snapshot = await capture_heap_snapshot(browser, url)
+
+    assert find_objects_with_properties(heap_snapshot, ["playwrongMarker", "nested"]) == [EXPECTED]
+
+@pytest.mark.asyncio
+async def test_capture_heap_snapshots_to_files(browser, url, tmp_path):
+    results = [result async for result in capture_heap_snapshots([url], output_dir=tmp_path, browser=browser, parse=False, compression="gzip")]
+    assert results == [(url, None)]
+
+    path, = tmp_path.glob("*.heapsnapshot.gz")
+    assert find_objects_with_properties(load_heap_snapshot(str(path)), ["playwrongMarker", "nested"]) == [EXPECTED]
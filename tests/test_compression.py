@@ -0,0 +1,84 @@
+import pytest
+
+from playwrong.compression import (
+    COMPRESSION_SUFFIXES,
+    detect_compression,
+    get_compression_for_path,
+    open_compressed_writer,
+    open_snapshot_reader,
+    open_snapshot_writer,
+    require_compression,
+    zstandard,
+)
+from playwrong.parser import parse_heap_snapshot_path
+from playwrong.query import find_objects_with_properties
+
+from .snapshots import build_object_snapshot
+
+COMPRESSIONS = [
+    "gzip",
+    pytest.param("zstd", marks=pytest.mark.skipif(zstandard is None, reason="zstandard is not installed")),
+]
+
+def check_snapshot(path: str, text: str, compression: str) -> None:
+    _, _, expected = build_object_snapshot()
+
+    assert detect_compression(path) == compression
+    assert find_objects_with_properties(parse_heap_snapshot_path(path), ["count"]) == [expected]
+
+    with open_snapshot_reader(path, compression) as snapshot_file:
+        assert snapshot_file.read() == text
+
+    with open_snapshot_reader(path, compression, binary=True) as snapshot_file:
+        assert snapshot_file.read() == text.encode("utf-8")
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_snapshot_writer_round_trip(tmp_path, compression):
+    builder, _, _ = build_object_snapshot()
+    text = builder.to_json()
+    # compression is found from the magic bytes, whatever the file is called
+    path = str(tmp_path / "object.heapsnapshot")
+
+    with open_snapshot_writer(path, compression) as snapshot_file:
+        snapshot_file.write(text)
+
+    check_snapshot(path, text, compression)
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_compressed_writer_round_trip(tmp_path, compression):
+    builder, _, _ = build_object_snapshot()
+    text = builder.to_json()
+    path = str(tmp_path / f"object.heapsnapshot{COMPRESSION_SUFFIXES[compression]}")
+
+    with open(path, "wb") as output_file:
+        # written in chunks, as captures arrive
+        with open_compressed_writer(output_file, compression) as snapshot_file:
+            for start in range(0, len(text), 100):
+                snapshot_file.write(text[start:start + 100])
+
+        assert not output_file.closed
+
+    assert get_compression_for_path(path) == compression
+    check_snapshot(path, text, compression)
+
+def test_detect_compression(tmp_path):
+    builder, _, _ = build_object_snapshot()
+    path = builder.write(str(tmp_path / "object.heapsnapshot.gz"))
+    assert detect_compression(path) is None
+
+    empty = tmp_path / "empty.heapsnapshot"
+    empty.write_bytes(b"")
+    assert detect_compression(str(empty)) is None
+
+    truncated = tmp_path / "truncated.heapsnapshot"
+    truncated.write_bytes(b"\x28\xb5")
+    assert detect_compression(str(truncated)) is None
+
+def test_get_compression_for_path():
+    assert get_compression_for_path("snapshot.heapsnapshot.gz") == "gzip"
+    assert get_compression_for_path("snapshot.heapsnapshot.zst") == "zstd"
+    assert get_compression_for_path("snapshot.heapsnapshot") is None
+
+def test_require_compression():
+    with pytest.raises(ValueError, match="Unknown compression"):
+        require_compression("bzip2")
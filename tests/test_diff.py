@@ -0,0 +1,49 @@
+import io
+import numpy as np
+import pytest
+
+from playwrong.diff import MAX_ID_TABLE_RATIO, diff_snapshots, match_node_ids
+from playwrong.parser import parse_heap_snapshot_file
+
+from .snapshots import SnapshotBuilder
+
+def build_snapshot(nodes, id_step: int):
+    """
+    A snapshot with a root and one object per (name, node id, self size), node ids are multiplied by id_step
+    """
+    builder = SnapshotBuilder()
+    root = builder.add_node("synthetic")
+
+    for index, (name, node_id, self_size) in enumerate(nodes):
+        node = builder.add_node("object", name, self_size)
+        builder.nodes[node][2] = node_id * id_step
+        builder.add_edge(root, "element", index, node)
+
+    return parse_heap_snapshot_file(io.StringIO(builder.to_json()))
+
+@pytest.mark.parametrize("id_step", [1, 1000])
+def test_diff_snapshots(id_step):
+    before = build_snapshot([("Grown", 3, 10), ("Shrunk", 5, 20), ("Removed", 7, 30), ("Same", 9, 8), ("Shrunk", 11, 4)], id_step)
+    after = build_snapshot([("Same", 9, 8), ("Added", 13, 40), ("Shrunk", 5, 15), ("Grown", 3, 16), ("Shrunk", 11, 1)], id_step)
+
+    results = {result["name"]: result for result in diff_snapshots(before, after)}
+    assert set(results) == {"Added", "Removed", "Grown", "Shrunk"}
+
+    assert {name: (result["addedCount"], result["removedCount"], result["grownCount"], result["shrunkCount"]) for name, result in results.items()} == {
+        "Added": (1, 0, 0, 0), "Removed": (0, 1, 0, 0), "Grown": (0, 0, 1, 0), "Shrunk": (0, 0, 0, 2),
+    }
+    assert {name: (result["addedSize"], result["removedSize"], result["grownSize"], result["shrunkSize"]) for name, result in results.items()} == {
+        "Added": (40, 0, 0, 0), "Removed": (0, 30, 0, 0), "Grown": (0, 0, 6, 0), "Shrunk": (0, 0, 0, 8),
+    }
+    assert [(result["name"], result["sizeDelta"], result["countDelta"]) for result in diff_snapshots(before, after)] == [
+        ("Added", 40, 1), ("Grown", 6, 0), ("Shrunk", -8, 0), ("Removed", -30, -1),
+    ]
+
+@pytest.mark.parametrize("id_step", [1, MAX_ID_TABLE_RATIO * 100])
+def test_match_node_ids(id_step):
+    before_ids = np.asarray([7, 1, 5, 3], dtype=np.int64) * id_step
+    after_ids = np.asarray([3, 9, 7, 11, 1], dtype=np.int64) * id_step
+
+    assert match_node_ids(before_ids, after_ids).tolist() == [3, -1, 0, -1, 1]
+    assert match_node_ids(before_ids[:0], after_ids).tolist() == [-1] * 5
+    assert match_node_ids(before_ids, after_ids[:0]).tolist() == []
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from typer.testing import CliRunner
+
+from playwrong.__main__ import app
+from playwrong.predicates import Predicate, check_predicates, evaluate_predicate, find_node_ids_matching, parse_predicate, parse_predicates
+from playwrong.query import find_objects_with_properties
+from playwrong.synthetic import NODE_TYPES
+
+from .snapshots import build_object_snapshot
+
+@pytest.mark.parametrize("expression, expected", [
+    ("name", Predicate(field="name")),
+    ("!name", Predicate(field="name", negate=True)),
+    ("name=value", Predicate(field="name", op="=", value="value")),
+    ("name=", Predicate(field="name", op="=", value="")),
+    ("name~^va.*e$", Predicate(field="name", op="~", value="^va.*e$")),
+    ("@constructor=Object", Predicate(field="@constructor", op="=", value="Object")),
+    ("!@type=string", Predicate(field="@type", op="=", value="string", negate=True)),
+    ("@self_size>=40", Predicate(field="@self_size", op=">=", value="40")),
+])
+def test_parse_predicate(expression, expected):
+    assert parse_predicate(expression) == expected
+    assert str(parse_predicate(expression)) == expression
+
+@pytest.mark.parametrize("expression", ["", "@unknown=1", "@type~object", "@self_size>=big", "name>=1", "name~("])
+def test_parse_predicate_errors(expression):
+    with pytest.raises(ValueError):
+        parse_predicate(expression)
+
+@pytest.mark.parametrize("expression, matches", [
+    ("café", [True, False, False, True]),
+    ("!café", [False, True, True, False]),
+    ("café=crème", [True, False, False, False]),
+    ("café~^cr", [True, False, False, False]),
+    ("count=42", [True, False, False, False]),
+    ("count~^4", [True, False, False, False]),
+    ("count=41", [False, False, False, False]),
+    ("name=inner", [False, False, True, False]),
+    ("@constructor=Array", [False, True, False, False]),
+    ("@type=object", [True, True, True, True]),
+    ("@self_size>=32", [True, True, False, False]),
+])
+def test_evaluate_predicate(object_snapshot, expression, matches):
+    # the target object, its items array, its nested object and its prototype
+    builder, _, _ = build_object_snapshot()
+    node_indexes = [node_index for node_index, node in enumerate(builder.nodes) if node[0] == NODE_TYPES["object"]]
+
+    assert evaluate_predicate(object_snapshot, parse_predicate(expression), np.asarray(node_indexes)).tolist() == matches
+
+@pytest.mark.parametrize("expressions, object_count", [
+    (["@self_size>=0"], 4),
+    (["@type=string"], 0),
+    (["@constructor=Foo"], 0),
+    (["!café"], 2),
+])
+def test_predicates_without_properties_only_match_buildable_objects(object_snapshot, expressions, object_count):
+    predicates = parse_predicates(expressions)
+
+    assert len(find_node_ids_matching(object_snapshot, [], predicates)) == object_count
+    assert len(find_objects_with_properties(object_snapshot, [], predicates=predicates)) == object_count
+
+def test_predicates_without_properties(object_snapshot):
+    _, _, expected = build_object_snapshot()
+    assert find_objects_with_properties(object_snapshot, [], predicates=parse_predicates(["count=42"])) == [expected]
+
+@pytest.mark.parametrize("properties", [[], ["count"]])
+def test_unknown_node_type_is_rejected_before_searching(object_snapshot, properties):
+    predicates = parse_predicates(["@type=foo"])
+
+    with pytest.raises(ValueError, match="Unknown node type 'foo' in predicate '@type=foo'"):
+        check_predicates(object_snapshot, predicates)
+
+    with pytest.raises(ValueError, match="Unknown node type 'foo'"):
+        find_node_ids_matching(object_snapshot, properties, predicates)
+
+def test_query_unknown_node_type_is_a_usage_error(object_snapshot_path):
+    result = CliRunner().invoke(app, ["query", "-f", object_snapshot_path, "-W", "@type=foo"])
+
+    assert result.exit_code == 2
+    assert "Unknown node type 'foo'" in result.output
+    assert not isinstance(result.exception, ValueError)
@@ -0,0 +1,164 @@
+import json
+import pytest
+from pathlib import Path
+from typer.testing import CliRunner
+
+from playwrong.__main__ import app
+from playwrong.query import load_batch_queries
+
+from .snapshots import SnapshotBuilder
+
+def write_queries(tmp_path: Path, name: str, text: str) -> Path:
+    path = tmp_path / name
+    path.write_text(text)
+    return path
+
+def test_load_batch_queries_mapping(tmp_path):
+    path = write_queries(tmp_path, "queries.json", '{"videos": {"properties": "channelId,viewCount", "where": ["viewCount=10"]}}')
+    queries = load_batch_queries(path)
+
+    assert [(query.name, query.properties, query.where) for query in queries] == [("videos", ["channelId", "viewCount"], ["viewCount=10"])]
+
+def test_load_batch_queries_yaml_list(tmp_path):
+    path = write_queries(tmp_path, "queries.yaml", "- name: videos\n  properties: [channelId]\n")
+    assert [query.name for query in load_batch_queries(path)] == ["videos"]
+
+@pytest.mark.parametrize("name,text", [
+    ("malformed.json", '{"videos": '),
+    ("malformed.yaml", "videos: [\n"),
+    ("scalar.json", '"videos"'),
+    ("query.json", '{"videos": "channelId"}'),
+    ("empty.json", '{"videos": {"properties": []}}'),
+    ("predicate.json", '{"videos": {"properties": "channelId", "where": "@bad=1"}}'),
+    ("duplicate.json", '[{"name": "videos", "properties": "a"}, {"name": "videos", "properties": "b"}]'),
+])
+def test_load_batch_queries_errors(tmp_path, name, text):
+    with pytest.raises(ValueError):
+        load_batch_queries(write_queries(tmp_path, name, text))
+
+@pytest.fixture
+def budget_snapshot(tmp_path):
+    """
+    An object with a string, an array of three strings, two nested objects and the same object twice,
+    which refers back to it. Returns the snapshot path and the node ids by name.
+    """
+    builder = SnapshotBuilder()
+    root = builder.add_node("synthetic")
+
+    target = builder.add_node("object", "Object", 16)
+    builder.add_edge(root, "element", 1, target)
+    builder.add_edge(target, "property", "marker", builder.add_string("m"))
+
+    items = builder.add_node("object", "Array", 16)
+    elements = [builder.add_string(value) for value in "abc"]
+    for index, element in enumerate(elements):
+        builder.add_edge(items, "element", index, element)
+    builder.add_edge(target, "property", "list", items)
+
+    child, leaf = builder.add_node("object", "Object", 16), builder.add_node("object", "Object", 16)
+    builder.add_edge(leaf, "property", "name", builder.add_string("leaf"))
+    builder.add_edge(child, "property", "leaf", leaf)
+    builder.add_edge(target, "property", "child", child)
+
+    shared = builder.add_node("object", "Object", 16)
+    builder.add_edge(shared, "property", "name", builder.add_string("shared"))
+    builder.add_edge(shared, "property", "owner", target)
+    builder.add_edge(target, "property", "first", shared)
+    builder.add_edge(target, "property", "second", shared)
+
+    node_ids = {name: builder.node_id(node) for name, node in {"target": target, "items": items, "b": elements[1], "leaf": leaf, "shared": shared}.items()}
+    return builder.write(str(tmp_path / "budget.heapsnapshot")), node_ids
+
+def query_ndjson(tmp_path: Path, snapshot_path: str, *args: str):
+    output = tmp_path / "output.ndjson"
+    result = CliRunner().invoke(app, ["query", "-f", snapshot_path, "-p", "marker", "--ndjson", str(output), *args])
+    assert result.exit_code == 0, result.output
+
+    return [json.loads(line) for line in output.read_text().splitlines()]
+
+def test_query_without_budget(tmp_path, budget_snapshot):
+    snapshot_path, node_ids = budget_snapshot
+
+    assert query_ndjson(tmp_path, snapshot_path) == [{"nodeId": node_ids["target"], "value": {
+        "marker": "m",
+        "list": ["a", "b", "c"],
+        "child": {"leaf": {"name": "leaf"}},
+        "first": {"name": "shared"},
+        "second": {"name": "shared"},
+    }}]
+
+@pytest.mark.parametrize("args,expected", [
+    (["--max-depth", "1"], lambda ids: {
+        "marker": "m",
+        "list": ["a", "b", "c"],
+        "child": {"leaf": {"$truncated": "depth", "nodeId": ids["leaf"]}},
+        "first": {"name": "shared"},
+        "second": {"name": "shared"},
+    }),
+    (["--max-elements", "2"], lambda ids: {
+        "marker": "m",
+        "list": ["a", "b", {"$truncated": "elements", "nodeId": ids["items"]}],
+        "child": {"leaf": {"name": "leaf"}},
+        "first": {"name": "shared"},
+        "second": {"name": "shared"},
+    }),
+    (["--max-nodes", "4"], lambda ids: {
+        "marker": "m",
+        "list": ["a", {"$truncated": "nodes", "nodeId": ids["b"]}],
+    }),
+    (["--max-bytes", "40"], lambda ids: {
+        "marker": "m",
+        "list": ["a", "b", "c"],
+        "child": {"leaf": {"$truncated": "bytes", "nodeId": ids["leaf"]}},
+    }),
+    (["--refs"], lambda ids: {
+        "marker": "m",
+        "list": ["a", "b", "c"],
+        "child": {"leaf": {"name": "leaf"}},
+        "first": {"name": "shared", "owner": {"$ref": ids["target"], "path": ""}},
+        "second": {"$ref": ids["shared"], "path": "/first"},
+    }),
+])
+def test_query_budget_markers(tmp_path, budget_snapshot, args, expected):
+    snapshot_path, node_ids = budget_snapshot
+    assert query_ndjson(tmp_path, snapshot_path, *args) == [{"nodeId": node_ids["target"], "value": expected(node_ids)}]
+
+@pytest.fixture
+def matches_snapshot(tmp_path):
+    """
+    Five objects with a marker and their index, returns the snapshot path and the node ids in search order
+    """
+    builder = SnapshotBuilder()
+    root = builder.add_node("synthetic")
+    node_ids = []
+
+    for index in range(5):
+        match = builder.add_node("object", "Object", 16)
+        builder.add_edge(root, "element", index, match)
+        builder.add_edge(match, "property", "marker", builder.add_string(f"m{index}"))
+        builder.add_edge(match, "property", "index", builder.add_number(index))
+        node_ids.append(builder.node_id(match))
+
+    return builder.write(str(tmp_path / "matches.heapsnapshot")), node_ids
+
+def test_query_ndjson(tmp_path, matches_snapshot):
+    snapshot_path, node_ids = matches_snapshot
+    documents = [{"nodeId": node_id, "value": {"marker": f"m{index}", "index": float(index)}} for index, node_id in enumerate(node_ids)]
+
+    assert query_ndjson(tmp_path, snapshot_path) == documents
+
+    result = CliRunner().invoke(app, ["query", "-f", snapshot_path, "-p", "marker,index", "--ndjson", "-"])
+    assert result.exit_code == 0
+    assert [json.loads(line) for line in result.stdout.splitlines() if line.startswith("{")] == documents
+
+def test_query_limit_stops_building(tmp_path, matches_snapshot):
+    snapshot_path, node_ids = matches_snapshot
+    stats_path = tmp_path / "stats.json"
+
+    documents = query_ndjson(tmp_path, snapshot_path, "--limit", "2", "--stats", str(stats_path))
+    assert [document["nodeId"] for document in documents] == node_ids[:2]
+
+    counters = json.loads(stats_path.read_text())["counters"]
+    assert counters["build.objects"] == 2
+    # each object visits itself, its marker and its index
+    assert counters["build.nodes_visited"] == 2 * 3
@@ -0,0 +1,107 @@
+import io
+from typing import Dict, List, Tuple
+
+from playwrong.parser import parse_heap_snapshot_file
+from playwrong.retainers import (
+    compute_immediate_dominators,
+    find_largest_retained_nodes,
+    find_shortest_retainer_path,
+    get_dominator_tree,
+    get_dominators,
+    get_retainer_graph,
+    get_retainers,
+)
+
+from .snapshots import SnapshotBuilder
+
+# the example graph of Lengauer and Tarjan's "A fast algorithm for finding dominators in a flowgraph"
+LENGAUER_TARJAN_EDGES = {
+    "R": "ABC", "A": "D", "B": "ADE", "C": "FG", "D": "L", "E": "H", "F": "I",
+    "G": "IJ", "H": "EK", "I": "K", "J": "I", "K": "IR", "L": "H",
+}
+LENGAUER_TARJAN_DOMINATORS = {
+    "A": "R", "B": "R", "C": "R", "D": "R", "E": "R", "F": "C", "G": "C",
+    "H": "R", "I": "R", "J": "G", "K": "R", "L": "D",
+}
+
+def build_graph(edges: Dict[str, str], sizes: Dict[str, int] = {}, weak: List[Tuple[str, str]] = []):
+    """
+    A snapshot with one object node per name, the first name is the root. Edges are properties named
+    after their target, weak edges are added after the strong ones.
+    """
+    builder = SnapshotBuilder()
+    names = list(dict.fromkeys([*edges, *"".join(edges.values()), *(name for edge in weak for name in edge)]))
+    nodes = {name: builder.add_node("synthetic" if not index else "object", name, sizes.get(name, 0)) for index, name in enumerate(names)}
+
+    for owner, targets in edges.items():
+        for target in targets:
+            builder.add_edge(nodes[owner], "property", target, nodes[target])
+
+    for owner, target in weak:
+        builder.add_edge(nodes[owner], "weak", target, nodes[target])
+
+    return parse_heap_snapshot_file(io.StringIO(builder.to_json())), builder, nodes
+
+def test_compute_immediate_dominators():
+    heap_snapshot, _, nodes = build_graph(LENGAUER_TARJAN_EDGES)
+    immediate_dominators, vertex = compute_immediate_dominators(get_retainer_graph(heap_snapshot))
+
+    assert immediate_dominators[nodes["R"]] == nodes["R"]
+    assert {name: immediate_dominators[node] for name, node in nodes.items() if name != "R"} == {
+        name: nodes[dominator] for name, dominator in LENGAUER_TARJAN_DOMINATORS.items()
+    }
+    assert vertex[0] == nodes["R"] and sorted(vertex.tolist()) == sorted(nodes.values())
+
+def test_weak_edges_do_not_dominate():
+    heap_snapshot, _, nodes = build_graph({"R": "AB", "A": "C", "B": "C"}, weak=[("R", "D"), ("C", "A")])
+    tree = get_dominator_tree(heap_snapshot)
+
+    assert tree.immediate_dominators[nodes["C"]] == nodes["R"]
+    assert tree.immediate_dominators[nodes["A"]] == nodes["R"]
+    assert tree.immediate_dominators[nodes["D"]] == -1
+
+def test_retained_sizes():
+    sizes = {"R": 0, "A": 10, "B": 20, "C": 30, "D": 40, "E": 50}
+    heap_snapshot, _, nodes = build_graph({"R": "AB", "A": "CE", "B": "C", "C": "D"}, sizes)
+    tree = get_dominator_tree(heap_snapshot)
+
+    assert {name: tree.retained_sizes[node] for name, node in nodes.items()} == {"R": 150, "A": 60, "B": 20, "C": 70, "D": 40, "E": 50}
+    assert [node["name"] for node in find_largest_retained_nodes(heap_snapshot, 3)] == ["C", "A", "E"]
+
+def test_dominator_intervals():
+    heap_snapshot, _, nodes = build_graph(LENGAUER_TARJAN_EDGES)
+    tree = get_dominator_tree(heap_snapshot)
+    starts, ends = tree.get_intervals()
+
+    for name, node in nodes.items():
+        dominators = {node}
+        while node != nodes["R"]:
+            node = int(tree.immediate_dominators[node])
+            dominators.add(node)
+
+        assert dominators == {
+            dominator for dominator in nodes.values()
+            if starts[dominator] <= starts[nodes[name]] < ends[dominator]
+        }
+
+def test_get_dominators():
+    heap_snapshot, builder, nodes = build_graph(LENGAUER_TARJAN_EDGES, {name: 1 for name in "RABCDEFGHIJKL"})
+
+    assert [(node["name"], node["retainedSize"]) for node in get_dominators(heap_snapshot, builder.node_id(nodes["J"]))] == [("J", 1), ("G", 2), ("C", 4), ("R", 13)]
+
+def test_shortest_retainer_path():
+    heap_snapshot, builder, nodes = build_graph({"R": "AB", "A": "C", "B": "D", "C": "E", "D": "E", "E": "F"}, weak=[("R", "F"), ("R", "G")])
+
+    path = find_shortest_retainer_path(heap_snapshot, builder.node_id(nodes["F"]))
+    assert [(step["edge"]["type"], step["edge"]["name"], step["node"]["name"]) for step in path] == [
+        ("property", "A", "A"), ("property", "C", "C"), ("property", "E", "E"), ("property", "F", "F"),
+    ]
+
+    assert find_shortest_retainer_path(heap_snapshot, builder.node_id(nodes["R"])) == []
+    assert find_shortest_retainer_path(heap_snapshot, builder.node_id(nodes["G"])) is None
+
+def test_get_retainers():
+    heap_snapshot, builder, nodes = build_graph({"R": "AB", "A": "C", "B": "C"}, weak=[("R", "C")])
+    retainers = get_retainers(heap_snapshot, builder.node_id(nodes["C"]))
+
+    assert sorted((retainer["edge"]["type"], retainer["node"]["name"]) for retainer in retainers) == [("property", "A"), ("property", "B"), ("weak", "R")]
@@ -0,0 +1,50 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from playwrong import server
+from playwrong.server import SnapshotStore
+
+from .snapshots import build_object_snapshot
+
+def write_snapshots(tmp_path, count):
+    builder, _, _ = build_object_snapshot()
+    return [builder.write(str(tmp_path / f"{index}.heapsnapshot")) for index in range(count)]
+
+def test_snapshot_store_caches_snapshots(tmp_path):
+    path, = write_snapshots(tmp_path, 1)
+    store = SnapshotStore()
+
+    assert store.get(path) is store.get(path)
+    assert len(store) == 1
+
+def test_snapshot_store_loads_outside_store_lock(tmp_path, monkeypatch):
+    slow_path, fast_path = write_snapshots(tmp_path, 2)
+    load_heap_snapshot = server.load_heap_snapshot
+    slow_started = threading.Event()
+    fast_loaded = threading.Event()
+    loads = []
+
+    def load(snapshot_path, use_cache):
+        loads.append(snapshot_path)
+
+        if snapshot_path == slow_path:
+            slow_started.set()
+            assert fast_loaded.wait(5)
+
+        return load_heap_snapshot(snapshot_path, use_cache)
+
+    monkeypatch.setattr(server, "load_heap_snapshot", load)
+    store = SnapshotStore()
+
+    with ThreadPoolExecutor(4) as executor:
+        slow = [executor.submit(store.get, slow_path) for _ in range(3)]
+        assert slow_started.wait(5)
+
+        store.get(fast_path)
+        fast_loaded.set()
+
+        snapshots = [future.result() for future in slow]
+
+    assert all(heap_snapshot is snapshots[0] for heap_snapshot in snapshots)
+    assert sorted(loads) == sorted([slow_path, fast_path])
+    assert len(store) == 2
@@ -0,0 +1,65 @@
+import asyncio
+import json
+from typer.testing import CliRunner
+
+from playwrong.__main__ import app
+from playwrong.query import afind_objects_with_properties, find_objects_with_properties
+from playwrong.stats import collect_stats, count, get_stats, timed
+
+def test_collect_stats_records_a_query(object_snapshot):
+    with collect_stats() as stats:
+        assert get_stats() is stats
+        assert len(find_objects_with_properties(object_snapshot, ["count"])) == 1
+
+    assert get_stats() is None
+    assert stats.counters["search.matches"] == 1
+    assert stats.counters["build.objects"] == 1
+    assert stats.counters["build.nodes_visited"] > 1
+    assert set(stats.timings) >= {"search", "build"}
+    assert all(seconds >= 0 for seconds in stats.timings.values())
+
+    report = stats.to_dict()
+    assert report["counters"] == dict(stats.counters) and report["timings"] == stats.timings
+    assert report["total_seconds"] >= sum(stats.timings.values())
+
+def test_collect_stats_callbacks():
+    calls = []
+
+    with collect_stats(lambda name, value: calls.append((name, value))) as stats:
+        count("objects")
+        count("objects", 2)
+
+        with timed("stage"):
+            pass
+
+    assert stats.counters == {"objects": 3}
+    assert calls[:2] == [("objects", 1), ("objects", 2)]
+    assert [name for name, _ in calls[2:]] == ["stage"] and calls[2][1] == stats.timings["stage"]
+
+def test_nothing_is_recorded_without_collect_stats(object_snapshot):
+    calls = []
+
+    with collect_stats(lambda name, value: calls.append(name)):
+        pass
+
+    count("objects")
+    with timed("stage"):
+        find_objects_with_properties(object_snapshot, ["count"])
+
+    assert calls == []
+
+def test_collect_stats_follows_threads(object_snapshot):
+    with collect_stats() as stats:
+        assert len(asyncio.run(afind_objects_with_properties(object_snapshot, ["count"]))) == 1
+
+    assert stats.counters["build.objects"] == 1
+
+def test_query_stats_report(object_snapshot_path, tmp_path):
+    stats_path = tmp_path / "stats.json"
+    result = CliRunner().invoke(app, ["query", "-f", object_snapshot_path, "-p", "count", "--stats", str(stats_path)])
+    assert result.exit_code == 0, result.output
+
+    report = json.loads(stats_path.read_text())
+    assert set(report) == {"total_seconds", "timings", "counters"}
+    assert set(report["timings"]) >= {"parse", "search", "build"}
+    assert report["counters"]["build.objects"] == 1 and report["counters"]["parse.characters"] > 0
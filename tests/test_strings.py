@@ -0,0 +1,41 @@
+import pytest
+
+from playwrong.cache import load_heap_snapshot
+from playwrong.models import HeapSnapshot
+from playwrong.query import find_objects_with_properties
+from playwrong.snapshot import find_node_ids_with_properties
+from playwrong.strings import LazyStringTable
+
+from .snapshots import build_object_snapshot
+
+STRINGS = ["a", "café", "café", "café", "\U0001F600", 'x"y', ""]
+ENCODED_STRINGS = b'{"strings":["a","caf\\u00E9","caf\\u00e9","caf\xc3\xa9","\\ud83d\\ude00","x\\"y",""]}'
+
+@pytest.fixture
+def table() -> LazyStringTable:
+    table, end = LazyStringTable.from_buffer(ENCODED_STRINGS, ENCODED_STRINGS.index(b"["))
+    assert end == len(ENCODED_STRINGS) - 1
+    return table
+
+def test_lazy_string_table_decodes_strings(table):
+    assert list(table) == STRINGS
+
+@pytest.mark.parametrize("string", sorted(set(STRINGS)))
+def test_lazy_string_table_finds_every_form(table, string):
+    assert table.find_ids(string).tolist() == [string_id for string_id, value in enumerate(STRINGS) if value == string]
+
+def test_lazy_string_table_missing_string(table):
+    assert table.find_ids("cafe").tolist() == []
+
+def test_query_non_ascii_property(tmp_path):
+    builder, target, expected = build_object_snapshot()
+    path = builder.write(str(tmp_path / "escaped.heapsnapshot"))
+
+    with open(path) as f:
+        assert "caf\\u00E9" in f.read()
+
+    baseline = HeapSnapshot.model_validate_json(builder.to_json())
+    heap_snapshot = load_heap_snapshot(path)
+
+    assert find_node_ids_with_properties(heap_snapshot, ["café"]) == find_node_ids_with_properties(baseline, ["café"])
+    assert find_objects_with_properties(heap_snapshot, ["café", "count"]) == [expected]
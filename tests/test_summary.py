@@ -0,0 +1,35 @@
+import copy
+import io
+
+from playwrong.parser import parse_heap_snapshot_file
+from playwrong.summary import get_node_type_names, summarize_snapshot
+from playwrong.synthetic import NODE_FIELD_COUNT, write_heap_snapshot
+
+from .snapshots import build_object_snapshot
+
+def reorder_node_fields(data, order):
+    """
+    The snapshot dict with its node fields in the given order, node types follow their field
+    """
+    data = copy.deepcopy(data)
+    meta = data["snapshot"]["meta"]
+    positions = [meta["node_fields"].index(field) for field in order]
+
+    meta["node_types"] = [meta["node_types"][position] for position in positions]
+    meta["node_fields"] = list(order)
+    data["nodes"] = data["nodes"].reshape(-1, NODE_FIELD_COUNT)[:, positions].ravel()
+
+    return data
+
+def test_summary_with_reordered_node_fields(object_snapshot):
+    builder, _, _ = build_object_snapshot()
+    data = builder.to_dict()
+    fields = data["snapshot"]["meta"]["node_fields"]
+
+    output = io.StringIO()
+    write_heap_snapshot(reorder_node_fields(data, [fields[1], fields[0], *fields[2:]]), output)
+    heap_snapshot = parse_heap_snapshot_file(io.StringIO(output.getvalue()))
+
+    assert heap_snapshot.snapshot.meta.node_fields[1] == "type"
+    assert get_node_type_names(heap_snapshot) == get_node_type_names(object_snapshot)
+    assert summarize_snapshot(heap_snapshot) == summarize_snapshot(object_snapshot)
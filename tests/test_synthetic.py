@@ -0,0 +1,174 @@
+import gzip
+import pytest
+from collections import deque
+from typing import Dict, List, Set
+
+from playwrong.cache import get_cache_path, load_heap_snapshot
+from playwrong.models import BatchQuery, HeapSnapshot
+from playwrong.parser import parse_heap_snapshot_file, parse_heap_snapshot_path
+from playwrong.query import find_objects_for_queries, find_objects_with_properties
+from playwrong.retainers import get_dominator_tree
+from playwrong.sharded import (
+    find_sharded_node_ids_with_properties,
+    iter_sharded_objects_with_properties,
+    load_sharded_snapshot,
+    summarize_sharded_snapshot,
+)
+from playwrong.snapshot import find_node_ids_with_properties
+from playwrong.summary import summarize_snapshot
+from playwrong.synthetic import NODE_FIELD_COUNT, write_synthetic_heap_snapshot
+
+PROPERTY_SETS = [["prop1"], ["prop1", "prop2"], ["prop3", "prop4", "prop5"], ["missing"]]
+
+@pytest.fixture(scope="module")
+def snapshot_path(tmp_path_factory) -> str:
+    path = str(tmp_path_factory.mktemp("synthetic") / "synthetic.heapsnapshot")
+    write_synthetic_heap_snapshot(path, node_count=20_000, property_names=50)
+    return path
+
+@pytest.fixture(scope="module")
+def baseline(snapshot_path) -> HeapSnapshot:
+    with open(snapshot_path) as f:
+        return HeapSnapshot.model_validate_json(f.read())
+
+@pytest.fixture(scope="module")
+def sharded_snapshot(snapshot_path, tmp_path_factory):
+    heap_snapshot = load_sharded_snapshot(snapshot_path, str(tmp_path_factory.mktemp("shards")), memory_fraction=0.01)
+    assert len(heap_snapshot.manifest.node_shards) > 1
+    return heap_snapshot
+
+def parse_in_small_chunks(path: str):
+    with open(path) as f:
+        return parse_heap_snapshot_file(f, chunk_size=4096)
+
+def parse_gzip(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+
+    with open(f"{path}.gz", "wb") as f:
+        f.write(gzip.compress(data))
+
+    return parse_heap_snapshot_path(f"{path}.gz")
+
+def load_through_cache(path: str):
+    assert load_heap_snapshot(path, use_cache=True)._cache_path is None
+    heap_snapshot = load_heap_snapshot(path, use_cache=True)
+    assert heap_snapshot._cache_path == get_cache_path(path)
+    return heap_snapshot
+
+LOADERS = {
+    "mmap": parse_heap_snapshot_path,
+    "incremental": parse_in_small_chunks,
+    "gzip": parse_gzip,
+    "cache": load_through_cache,
+}
+
+@pytest.fixture(scope="module", params=list(LOADERS))
+def heap_snapshot(request, snapshot_path):
+    return LOADERS[request.param](snapshot_path)
+
+@pytest.mark.parametrize("properties", PROPERTY_SETS)
+def test_search_matches_baseline(heap_snapshot, baseline, properties):
+    assert find_node_ids_with_properties(heap_snapshot, properties) == find_node_ids_with_properties(baseline, properties)
+
+@pytest.mark.parametrize("properties", PROPERTY_SETS[1:])
+def test_objects_match_baseline(heap_snapshot, baseline, properties):
+    assert find_objects_with_properties(heap_snapshot, properties) == find_objects_with_properties(baseline, properties)
+
+def test_batch_queries_match_single_queries(heap_snapshot, baseline):
+    queries = [BatchQuery(name=",".join(properties), properties=properties) for properties in PROPERTY_SETS]
+
+    assert find_objects_for_queries(heap_snapshot, queries) == {
+        query.name: find_objects_with_properties(baseline, query.properties)
+        for query in queries
+    }
+
+def test_summary_matches_baseline(heap_snapshot, baseline):
+    assert summarize_snapshot(heap_snapshot) == summarize_snapshot(baseline)
+    assert summarize_snapshot(heap_snapshot, retained=True) == summarize_snapshot(baseline, retained=True)
+
+@pytest.mark.parametrize("properties", PROPERTY_SETS)
+def test_sharded_search_matches_baseline(sharded_snapshot, baseline, properties):
+    assert find_sharded_node_ids_with_properties(sharded_snapshot, properties) == find_node_ids_with_properties(baseline, properties)
+
+@pytest.mark.parametrize("properties", PROPERTY_SETS[1:])
+def test_sharded_objects_match_baseline(sharded_snapshot, baseline, properties):
+    assert list(iter_sharded_objects_with_properties(sharded_snapshot, properties)) == list(zip(
+        find_node_ids_with_properties(baseline, properties),
+        find_objects_with_properties(baseline, properties),
+    ))
+
+def test_sharded_summary_matches_baseline(sharded_snapshot, baseline):
+    assert summarize_sharded_snapshot(sharded_snapshot) == summarize_snapshot(baseline)
+
+def get_successors(heap_snapshot: HeapSnapshot) -> List[List[int]]:
+    edge_field_count = len(heap_snapshot.snapshot.meta.edge_fields)
+    edge_count_field = heap_snapshot.snapshot.meta.node_fields.index("edge_count")
+    successors = []
+    edge = 0
+
+    for node in range(heap_snapshot.snapshot.node_count):
+        edge_count = heap_snapshot.nodes[node * NODE_FIELD_COUNT + edge_count_field]
+        successors.append([
+            heap_snapshot.edges[(edge + i) * edge_field_count + 2] // NODE_FIELD_COUNT
+            for i in range(edge_count)
+        ])
+        edge += edge_count
+
+    return successors
+
+def find_reachable(successors: List[List[int]], removed: int = -1) -> Set[int]:
+    reachable = {0}
+    pending = deque([0])
+
+    while pending:
+        for child in successors[pending.popleft()]:
+            if child != removed and child not in reachable:
+                reachable.add(child)
+                pending.append(child)
+
+    return reachable
+
+def test_dominators_match_brute_force(tmp_path):
+    path = str(tmp_path / "small.heapsnapshot")
+    write_synthetic_heap_snapshot(path, node_count=400, fan_out=4, property_names=20)
+
+    with open(path) as f:
+        baseline = HeapSnapshot.model_validate_json(f.read())
+
+    successors = get_successors(baseline)
+    self_sizes = baseline.nodes[baseline.snapshot.meta.node_fields.index("self_size")::NODE_FIELD_COUNT]
+    reachable = find_reachable(successors)
+
+    # a node dominates exactly the nodes that become unreachable without it
+    dominated: Dict[int, Set[int]] = {node: reachable - find_reachable(successors, node) for node in reachable if node}
+    dominated[0] = reachable
+
+    tree = get_dominator_tree(parse_heap_snapshot_path(path))
+
+    for node in reachable:
+        chain = {node}
+        dominator = node
+
+        while dominator:
+            dominator = int(tree.immediate_dominators[dominator])
+            chain.add(dominator)
+
+        assert chain == {dominator for dominator in reachable if node in dominated[dominator]}
+        assert tree.retained_sizes[node] == sum(self_sizes[dominated_node] for dominated_node in dominated[node])
+
+    assert get_dominator_tree(baseline).immediate_dominators.tolist() == tree.immediate_dominators.tolist()
+
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_objects_in_pool_match_serial(snapshot_path, baseline, use_cache):
+    # workers load the cache the snapshot was loaded from, or a temporary one written for them
+    load_heap_snapshot(snapshot_path, use_cache=use_cache)
+    heap_snapshot = load_heap_snapshot(snapshot_path, use_cache=use_cache)
+    assert (heap_snapshot._cache_path is not None) == use_cache
+
+    properties = ["prop1", "prop2"]
+    assert len(find_node_ids_with_properties(baseline, properties)) > 1
+    assert find_objects_with_properties(heap_snapshot, properties, workers=2) == find_objects_with_properties(baseline, properties)
+
+    queries = [BatchQuery(name=",".join(properties), properties=properties) for properties in PROPERTY_SETS]
+    assert find_objects_for_queries(heap_snapshot, queries, workers=2) == find_objects_for_queries(baseline, queries)